@@ -14,11 +14,12 @@ import sys
 
 from debian import deb822
 
+# Native packages have no Debian revision, hence no '-' in their version
+native = deb822.FieldExists('Version') & ~deb822.FieldMatches('Version', '-')
+
 for fname in sys.argv[1:]:
     f = open(fname)
-    for stanza in deb822.Sources.iter_paragraphs(f):
-        pieces = stanza['version'].split('-')
-        if len(pieces) < 2:
-            print(stanza['package'])
+    for stanza in deb822.Sources.iter_paragraphs(f, query=native):
+        print(stanza['package'])
     f.close()
 
@@ -0,0 +1,272 @@
+# archtable.py -- Debian architectures, wildcards and build profiles
+# Copyright (C) 2026 Debian python-debian Maintainers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Evaluation of the architecture and build profile restrictions of
+package relationships
+
+Like dpkg, an ArchTable knows each architecture as an (abi, libc, os, cpu)
+tuple, so that architecture wildcards like "linux-any", "any-amd64" or
+"musl-any-any" are matched the same way.  It can then tell whether a
+relation, as parsed by PkgRelation, applies on an architecture with a set
+of active build profiles, or reduce relationship fields to the relations
+that apply:
+
+    table = ArchTable()
+    table.matches('armhf', 'any-arm')       # True
+    rels = PkgRelation.parse_relations(src['Build-Depends'])
+    table.reduce_relations(rels, 'amd64', profiles=['nocheck'])
+"""
+
+from __future__ import absolute_import, print_function
+
+import io
+import os
+
+from debian import deb822
+
+
+# dpkg's tupletable: the tuple of each architecture, where <cpu> stands
+# for any of the CPUs of _CPUS
+_TUPLETABLE = """\
+eabi-uclibc-linux-arm		uclibc-linux-armel
+base-uclibc-linux-<cpu>		uclibc-linux-<cpu>
+eabihf-musl-linux-arm		musl-linux-armhf
+base-musl-linux-<cpu>		musl-linux-<cpu>
+ilp32-gnu-linux-arm64		arm64ilp32
+eabihf-gnu-linux-arm		armhf
+eabi-gnu-linux-arm		armel
+abin32-gnu-linux-mips64r6el	mipsn32r6el
+abin32-gnu-linux-mips64r6	mipsn32r6
+abin32-gnu-linux-mips64el	mipsn32el
+abin32-gnu-linux-mips64		mipsn32
+abi64-gnu-linux-mips64r6el	mips64r6el
+abi64-gnu-linux-mips64r6	mips64r6
+abi64-gnu-linux-mips64el	mips64el
+abi64-gnu-linux-mips64		mips64
+spe-gnu-linux-powerpc		powerpcspe
+x32-gnu-linux-amd64		x32
+base-gnu-linux-<cpu>		<cpu>
+eabihf-gnu-kfreebsd-arm		kfreebsd-armhf
+base-gnu-kfreebsd-<cpu>		kfreebsd-<cpu>
+base-gnu-knetbsd-<cpu>		knetbsd-<cpu>
+base-gnu-kopensolaris-<cpu>	kopensolaris-<cpu>
+base-gnu-hurd-<cpu>		hurd-<cpu>
+base-bsd-dragonflybsd-<cpu>	dragonflybsd-<cpu>
+base-bsd-freebsd-<cpu>		freebsd-<cpu>
+base-bsd-openbsd-<cpu>		openbsd-<cpu>
+base-bsd-netbsd-<cpu>		netbsd-<cpu>
+base-bsd-darwin-<cpu>		darwin-<cpu>
+base-sysv-aix-<cpu>		aix-<cpu>
+base-sysv-solaris-<cpu>		solaris-<cpu>
+eabi-uclibc-uclinux-arm		uclinux-armel
+base-uclibc-uclinux-<cpu>	uclinux-<cpu>
+base-tos-mint-m68k		mint-m68k
+"""
+
+# The Debian names of the CPUs in dpkg's cputable
+_CPUS = """\
+alpha amd64 arc armeb arm arm64 avr32 hppa loong64 i386 ia64 m32r m68k mips
+mipsel mipsr6 mipsr6el mips64 mips64el mips64r6 mips64r6el nios2 or1k
+powerpc powerpcel ppc64 ppc64el riscv64 s390 s390x sh3 sh3eb sh4 sh4eb
+sparc sparc64 tilegx
+""".split()
+
+
+class ArchTable(object):
+    """The Debian architectures, known by their (abi, libc, os, cpu) tuples
+
+    By default, the table is a copy of dpkg's tupletable and cputable; use
+    from_dpkg to read the tables of the installed dpkg instead.  Matches of
+    architectures against wildcards are cached.
+    """
+
+    def __init__(self, tupletable=None, cpus=None):
+        """Build the table
+
+        :param tupletable: the lines of a dpkg tupletable file.
+        :param cpus: the Debian names of the known CPUs.
+        """
+        if tupletable is None:
+            tupletable = _TUPLETABLE.splitlines()
+        if cpus is None:
+            cpus = _CPUS
+        self.__tuples = {}
+        for line in tupletable:
+            line = line.split('#', 1)[0].split()
+            if len(line) != 2:
+                continue
+            debtuple, arch = line
+            if '<cpu>' in arch:
+                for cpu in cpus:
+                    self.__tuples.setdefault(
+                        arch.replace('<cpu>', cpu),
+                        tuple(debtuple.replace('<cpu>', cpu).split('-')))
+            else:
+                self.__tuples.setdefault(arch, tuple(debtuple.split('-')))
+        self.__matches = {}
+
+    @classmethod
+    def from_dpkg(cls, directory='/usr/share/dpkg'):
+        """Build the table from the tupletable and cputable files of dpkg"""
+        with io.open(os.path.join(directory, 'tupletable'),
+                     encoding='utf-8') as f:
+            tupletable = f.read().splitlines()
+        with io.open(os.path.join(directory, 'cputable'),
+                     encoding='utf-8') as f:
+            cpus = [line.split()[0] for line in f
+                    if line.strip() and not line.startswith('#')]
+        return cls(tupletable, cpus)
+
+    def architectures(self):
+        """Return the names of all the known architectures"""
+        return sorted(self.__tuples)
+
+    def debtuple(self, arch):
+        """Return the (abi, libc, os, cpu) tuple of an architecture
+
+        ValueError is raised for unknown architectures.
+        """
+        try:
+            return self.__tuples[arch]
+        except KeyError:
+            raise ValueError("unknown architecture %r" % arch)
+
+    def __wildcard_tuple(self, wildcard):
+        """Return the tuple of a wildcard, with "any" for any value, or None
+        if it is neither a wildcard nor a known architecture
+        """
+        parts = tuple(wildcard.split('-'))
+        if 'any' in parts:
+            if len(parts) > 4:
+                return None
+            return ('any',) * (4 - len(parts)) + parts
+        return self.__tuples.get(wildcard)
+
+    def matches(self, arch, wildcard):
+        """Tell whether the architecture arch matches wildcard
+
+        wildcard may be an architecture name, "any", or a wildcard like
+        "linux-any", "any-amd64" or "gnu-any-any", which match the
+        architectures whose (abi, libc, os, cpu) tuple has the given values
+        in place of the values other than "any".
+        """
+        key = (arch, wildcard)
+        try:
+            return self.__matches[key]
+        except KeyError:
+            pass
+        if wildcard in ('any', arch):
+            result = True
+        else:
+            debtuple = self.__tuples.get(arch)
+            pattern = self.__wildcard_tuple(wildcard)
+            result = (debtuple is not None and pattern is not None and
+                      all(p in ('any', value)
+                          for p, value in zip(pattern, debtuple)))
+        self.__matches[key] = result
+        return result
+
+    def relation_applies(self, rel, architecture=None, profiles=None):
+        """Tell whether a relation (as returned by PkgRelation.parse_relations
+        or parse_relations_compact) applies on architecture, when building
+        with the build profiles named in profiles
+
+        Architecture restrictions are ignored if architecture is None, and
+        build profile restrictions if profiles is None.
+        """
+        archs = rel.get('arch')
+        if archs and architecture is not None:
+            matched = any(self.matches(architecture, a.arch) for a in archs)
+            # [a b] only applies on the listed architectures, and [!a !b]
+            # everywhere but on them
+            if matched != archs[0].enabled:
+                return False
+        restrictions = rel.get('restrictions')
+        if restrictions and profiles is not None:
+            # <a b> <c>: all the terms of at least one of the lists must hold
+            if not any(all((term.profile in profiles) == term.enabled
+                           for term in group)
+                       for group in restrictions):
+                return False
+        return True
+
+    def reduce_relations(self, rels, architecture=None, profiles=None):
+        """Return the relations of rels that apply on architecture with the
+        build profiles named in profiles, without their restrictions
+
+        rels is a list of clauses as returned by PkgRelation.parse_relations
+        (or parse_relations_compact, in which case the result is made of
+        PkgRelation.Relation objects too).  The relations which don't apply
+        are left out, and so are the clauses left empty.  If architecture
+        (or profiles) is None, architecture (or build profile) restrictions
+        are not checked, and they are kept.
+        """
+        reduced = []
+        for or_deps in rels:
+            clause = [self.__unrestricted(rel, architecture, profiles)
+                      for rel in or_deps
+                      if self.relation_applies(rel, architecture, profiles)]
+            if clause:
+                reduced.append(clause)
+        return reduced
+
+    @staticmethod
+    def __unrestricted(rel, architecture, profiles):
+        """Return rel without the restrictions that have been checked"""
+        changes = {}
+        if architecture is not None and rel.get('arch') is not None:
+            changes['arch'] = None
+        if profiles is not None and rel.get('restrictions') is not None:
+            changes['restrictions'] = None
+        if not changes:
+            return rel
+        if isinstance(rel, deb822.PkgRelation.Relation):
+            return rel._replace(**changes)
+        rel = dict(rel)
+        rel.update(changes)
+        return rel
+
+    def specialize(self, sources, architecture, profiles=(),
+                   fields=('Build-Depends', 'Build-Depends-Arch',
+                           'Build-Depends-Indep')):
+        """Reduce the build dependencies of source packages for a build on
+        architecture with the build profiles named in profiles
+
+        Iterate over (source, relations) pairs, one for each of the Sources
+        (or Dsc) objects in sources, where relations maps each of the fields
+        that the source package has to the tuple of clauses (tuples of
+        PkgRelation.Relation objects) that apply, as given by
+        reduce_relations.  Identical fields are only parsed and reduced
+        once, so that a whole Sources file is specialized in a single pass.
+        """
+        profiles = frozenset(profiles)
+        reduced = {}
+        for src in sources:
+            relations = {}
+            for field in fields:
+                raw = src.get(field)
+                if raw is None:
+                    continue
+                try:
+                    rels = reduced[raw]
+                except KeyError:
+                    rels = reduced[raw] = tuple(
+                        tuple(clause) for clause in self.reduce_relations(
+                            deb822.PkgRelation.parse_relations_compact(raw),
+                            architecture, profiles))
+                relations[field] = rels
+            yield src, relations
@@ -25,6 +25,7 @@
 
 from __future__ import absolute_import, print_function
 
+from debian.debian_support import open_compressed, version_compare
 from debian.deprecation import function_deprecated_by
 
 try:
@@ -39,9 +40,20 @@ import chardet
 import collections
 import datetime
 import email.utils
+import errno
+import hashlib
+import io
+import itertools
+import json
+import mmap
+import multiprocessing
+import multiprocessing.pool
+import os
 import re
 import subprocess
 import sys
+import tempfile
+import threading
 import warnings
 
 from io import BytesIO, StringIO
@@ -49,7 +61,6 @@ from io import BytesIO, StringIO
 import six
 
 if sys.version >= '3':
-    import io
     def _is_real_file(f):
         if not isinstance(f, io.IOBase):
             return False
@@ -58,10 +69,22 @@ if sys.version >= '3':
             return True
         except (AttributeError, io.UnsupportedOperation):
             return False
+    _intern = sys.intern
+
+    def _is_binary_file(f):
+        return isinstance(f, (io.BufferedIOBase, io.RawIOBase))
 else:
     def _is_real_file(f):
         return isinstance(f, file) and hasattr(f, 'fileno')
 
+    def _is_binary_file(f):
+        return (isinstance(f, (io.BufferedIOBase, io.RawIOBase))
+                or (isinstance(f, file) and 'b' in f.mode))
+
+    def _intern(s):
+        # intern() only takes byte strings in Python 2
+        return s
+
 
 GPGV_DEFAULT_KEYRINGS = frozenset(['/usr/share/keyrings/debian-keyring.gpg'])
 GPGV_EXECUTABLE = '/usr/bin/gpgv'
@@ -94,6 +117,11 @@ class TagSectionWrapper(collections.Mapping):
         return len([key for key in self.__section.keys()
                     if not key.startswith('#')])
 
+    def __contains__(self, key):
+        # Spare Mapping's default implementation the cost of fetching the
+        # value just to check that the field is there.
+        return key in self.__section
+
     def __getitem__(self, key):
         s = self.__section.find_raw(key)
 
@@ -109,6 +137,504 @@ class TagSectionWrapper(collections.Mapping):
         return data.lstrip(b' \t').rstrip(b'\n')
 
 
+# Paragraphs are separated by one or more blank lines; lines consisting solely
+# of whitespace count as blank too (see #715558).  Matching at the end of the
+# buffer lets the last paragraph shed its trailing newline and blank lines.
+_paragraph_sep_re = re.compile(br'\n(?:[ \t\r\f\v]*(?:\n|\Z))+')
+_leading_blank_lines_re = re.compile(br'(?:[ \t\r\f\v]*\n)*')
+_comment_line_re = re.compile(br'^#.*\n?', re.MULTILINE)
+# A field's value runs until the next line starting a field.  Like the
+# line-based parser, lines which neither start a field nor continue one are
+# skipped (see _BufferSection.__getitem__), without ending the value.
+_buffer_field_value = (br'[ \t\r\f\v]*:'
+                       br'(?P<value>[^\n]*'
+                       br'(?:\n(?![^: \t\n\r\f\v]+[ \t\r\f\v]*:)[^\n]+)*)')
+_malformed_line_re = re.compile(br'\n[^ \t\r\f\v\n][^\n]*')
+_buffer_field_re = re.compile(
+        br'^(?P<key>[^: \t\n\r\f\v#][^: \t\n\r\f\v]*)' + _buffer_field_value,
+        re.MULTILINE)
+_gpg_armor_start = b'-----BEGIN PGP '
+_gpg_armor_re = re.compile(
+        br'^-----(?P<action>BEGIN|END) PGP (?P<what>[^-]+)-----[\r\t ]*$',
+        re.MULTILINE)
+
+
+def _iter_paragraph_spans(buf, pos=0):
+    """Yield (start, end) offsets of each paragraph in a bytes-like buffer
+
+    The buffer is only scanned, never copied, so it may just as well be a
+    memory-mapped file.  The span of a paragraph includes the newline ending
+    its last line, if there is one.
+    """
+    pos = _leading_blank_lines_re.match(buf, pos).end()
+    for sep in _paragraph_sep_re.finditer(buf, pos):
+        if sep.start() > pos:
+            yield pos, sep.start() + 1
+        pos = sep.end()
+    if pos < len(buf):
+        yield pos, len(buf)
+
+
+def _last_paragraph_break(buf, pos=0):
+    """Return the offset just after the last empty line in buf[pos:]
+
+    None is returned if there is none.  Lines consisting solely of spaces or
+    tabs are not looked for: cutting buf there is just as safe, but needn't
+    be done as long as empty lines show up often enough.
+    """
+    end = -1
+    for sep in (b'\n\n', b'\n\r\n'):
+        found = buf.rfind(sep, pos)
+        if found != -1:
+            end = max(end, found + len(sep))
+    return end if end != -1 else None
+
+
+def _stream_lines(head, fileobj):
+    """Yield the lines of head, and then those of the binary stream fileobj"""
+    lines = head.splitlines(True)
+    if lines and not lines[-1].endswith(b'\n'):
+        lines[-1] += fileobj.readline()
+    for line in lines:
+        yield line
+    for line in fileobj:
+        yield line
+
+
+def _gpg_payload_spans(buf):
+    """Locate the first paragraph of buf, and its signature if it has one
+
+    Return (payload, signed) where payload is the (start, end) span of the
+    paragraph in buf, and signed the span of the whole signed message,
+    armor included, or None if the paragraph isn't signed.  This gives the
+    same paragraph as split_gpg_and_payload, without splitting buf into
+    lines; None is returned instead for the input that split_gpg_and_payload
+    treats specially (comments, carriage returns, blank lines within a
+    signed paragraph, unusual armor), which should be given to it.
+    EOFError is raised if there is no paragraph in buf.
+    """
+    if buf.startswith(b'#') or b'\n#' in buf or b'\r' in buf:
+        return None
+    pos = _leading_blank_lines_re.match(buf).end()
+    begin = _gpg_armor_re.match(buf, pos)
+    if begin is None:
+        span = next(_iter_paragraph_spans(buf, pos), None)
+        if span is None:
+            raise EOFError('only blank lines found in input')
+        if _gpg_armor_re.search(buf, *span) is not None:
+            return None
+        return span, None
+    if begin.group('action', 'what') != (b'BEGIN', b'SIGNED MESSAGE'):
+        return None
+    # The armor headers (e.g. "Hash: SHA256") end with a blank line
+    headers_end = _paragraph_sep_re.search(buf, begin.end())
+    if headers_end is None:
+        return None
+    start = headers_end.end()
+    sig = _gpg_armor_re.search(buf, start)
+    if sig is None or sig.group('action', 'what') != (b'BEGIN', b'SIGNATURE'):
+        return None
+    end = sig.start()
+    sep = _paragraph_sep_re.search(buf, start, end)
+    if sep is not None:
+        if sep.end() != end:
+            return None
+        end = sep.start() + 1
+    if end <= start:
+        raise EOFError('only blank lines found in input')
+    sig_end = _gpg_armor_re.search(buf, sig.end())
+    if sig_end is None or sig_end.group('action') != b'END':
+        return None
+    signed_end = sig_end.end()
+    if buf[signed_end:signed_end + 1] == b'\n':
+        signed_end += 1
+    return (start, end), (begin.start(), signed_end)
+
+
+def _parse_paragraph_chunk(cls, filename, start, end, fields, encoding,
+                           as_dict, query=None):
+    """Parse the paragraphs in [start, end) of filename
+
+    This is run in the worker processes of Deb822.iter_paragraphs_parallel,
+    so it must return something cheap to pickle: plain dicts, or objects
+    whose fields are still raw bytes.
+    """
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        chunk = f.read(end - start)
+    paragraphs = []
+    probe = _query_probe(query, encoding) if query is not None else None
+    for pstart, pend in _iter_paragraph_spans(chunk):
+        if probe is not None and not probe(chunk[pstart:pend]):
+            continue
+        paragraph = cls._from_buffer_section(
+            _BufferSection(chunk[pstart:pend], encoding, fields), fields,
+            encoding)
+        if paragraph:
+            paragraphs.append(dict(paragraph) if as_dict else paragraph)
+    return paragraphs
+
+
+class _BufferSection(collections.Mapping):
+    """Expose the fields of a paragraph held in a bytes-like buffer
+
+    Only the offsets of the fields are recorded when the paragraph is split;
+    field values are sliced out of the buffer (and returned as bytes, like
+    TagSectionWrapper does) when they are asked for.  Passing a memory-mapped
+    file (and the offsets of the paragraph in it) therefore avoids copying
+    fields that are never looked at.
+    """
+
+    # The same few field names appear in every paragraph; share their
+    # (immutable) case-insensitive strings instead of creating new ones.
+    __known_keys = {}
+    # Regexes only matching some fields, by frozenset of field names
+    __field_subset_res = {}
+
+    def __init__(self, buf, encoding='utf-8', fields=None, start=0, end=None):
+        """Split the paragraph in buf[start:end] into fields.
+
+        buf may be bytes, a bytearray or an mmap object: anything the re
+        module can scan, which memoryviews aren't in Python 2.
+
+        If fields is given, only the fields it names (case-insensitively) are
+        recorded.  The others are skipped by the regex engine itself: their
+        lines, however long, never get to Python code.
+        """
+        if end is None:
+            end = len(buf)
+        if _comment_line_re.search(buf, start, end) is not None:
+            # Comment lines are rare enough that it's fine to pay for a copy
+            # of the paragraph to get rid of them.
+            buf = _comment_line_re.sub(b'', bytes(buf[start:end]))
+            start, end = 0, len(buf)
+        self.__buf = buf
+        self.__start = start
+        self.__end = end
+        self.__fields = fields
+        self.__spans = {}
+        self.__keys = []
+        self.encoding = encoding
+        if fields is None:
+            field_re = _buffer_field_re
+        else:
+            field_re = self.__field_subset_re(fields)
+        for m in field_re.finditer(buf, start, end):
+            raw_key = m.group('key')
+            try:
+                key = self.__known_keys[raw_key]
+            except KeyError:
+                key = _strI(raw_key.decode(encoding))
+                if len(self.__known_keys) < 1000:
+                    self.__known_keys[raw_key] = key
+            if key not in self.__spans:
+                self.__keys.append(key)
+            self.__spans[key] = m.span('value')
+
+    @classmethod
+    def __field_subset_re(cls, fields):
+        fields = frozenset(fields)
+        try:
+            return cls.__field_subset_res[fields]
+        except KeyError:
+            pass
+        names = b'|'.join(sorted(re.escape(f.encode('utf-8')) for f in fields))
+        field_re = re.compile(
+            br'^(?P<key>' + (names or b'(?!)') + br')' + _buffer_field_value,
+            re.MULTILINE | re.IGNORECASE)
+        if len(cls.__field_subset_res) < 100:
+            cls.__field_subset_res[fields] = field_re
+        return field_re
+
+    def __iter__(self):
+        return iter(self.__keys)
+
+    def __len__(self):
+        return len(self.__keys)
+
+    def __contains__(self, key):
+        return _strI(key) in self.__spans
+
+    def __reduce__(self):
+        # Maps can't be pickled (or copied), and the rest of the buffer is
+        # not needed
+        return (_BufferSection,
+                (self.__paragraph(), self.encoding, self.__fields))
+
+    def __paragraph(self):
+        return bytes(self.__buf[self.__start:self.__end])
+
+    def raw_text(self):
+        """Return the paragraph as bytes, comments excepted"""
+        raw = self.__paragraph()
+        if not raw.endswith(b'\n'):
+            raw += b'\n'
+        return raw
+
+    def __getitem__(self, key):
+        start, end = self.__spans[_strI(key)]
+        data = bytes(self.__buf[start:end])
+
+        # Mimic the line-based parser: whitespace is stripped around the
+        # value on the first line only, continuation lines are kept verbatim.
+        nl = data.find(b'\n')
+        if nl == -1:
+            return data.strip()
+        data = data[:nl].strip() + _malformed_line_re.sub(b'', data[nl:])
+        if b'\r' in data:
+            data = b'\n'.join(line.rstrip(b'\r')
+                              for line in data.split(b'\n'))
+        return data
+
+
+class Query(object):
+    """Base class for predicates on paragraphs, as taken by iter_paragraphs
+
+    Queries are combined with the &, | and ~ operators, e.g.::
+
+        query = (FieldMatches('Maintainer', 'debian-python@')
+                 & ~FieldExists('Essential')
+                 & FieldVersion('Version', '>=', '2.0'))
+        for pkg in Packages.iter_paragraphs(f, query=query):
+            ...
+
+    iter_paragraphs calls compile() once, and then runs the resulting
+    matcher on the raw (bytes) fields of each paragraph, before any Deb822
+    object is built: only the paragraphs that match are materialized.
+    """
+
+    # Names of the fields the query looks at
+    fields = frozenset()
+
+    def compile(self, encoding='utf-8'):
+        """Return a function telling whether a paragraph matches the query
+
+        The function takes a mapping of field names to values, which may be
+        bytes (in the given encoding) or text, e.g. a Deb822 object.
+        """
+        raise NotImplementedError
+
+    def __call__(self, paragraph):
+        return self.compile()(paragraph)
+
+    def __and__(self, other):
+        return AllOf(self, other)
+
+    def __or__(self, other):
+        return AnyOf(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+
+def _query_value(paragraph, field, encoding):
+    """Return the value of field in paragraph as bytes, or None"""
+    try:
+        value = paragraph[field]
+    except KeyError:
+        return None
+    if not isinstance(value, bytes):
+        value = value.encode(encoding)
+    return value
+
+
+def _query_text(paragraph, field, encoding):
+    """Return the value of field in paragraph as text, or None"""
+    try:
+        value = paragraph[field]
+    except KeyError:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode(encoding, 'replace')
+    return value
+
+
+class FieldExists(Query):
+    """Match paragraphs having the given field"""
+
+    def __init__(self, field):
+        self.field = field
+        self.fields = frozenset([field])
+
+    def compile(self, encoding='utf-8'):
+        field = self.field
+        return lambda paragraph: field in paragraph
+
+
+class FieldEquals(Query):
+    """Match paragraphs in which field has exactly the given value
+
+    Leading and trailing whitespace is ignored, as is case if ignore_case
+    is True (in which case the value of the field is decoded to compare it,
+    so that this works beyond ASCII).
+    """
+
+    def __init__(self, field, value, ignore_case=False):
+        self.field = field
+        self.value = value
+        self.ignore_case = ignore_case
+        self.fields = frozenset([field])
+
+    def compile(self, encoding='utf-8'):
+        field = self.field
+        wanted = self.value
+        if self.ignore_case:
+            if isinstance(wanted, bytes):
+                wanted = wanted.decode(encoding)
+            wanted = wanted.strip().lower()
+
+            def match(paragraph):
+                value = _query_text(paragraph, field, encoding)
+                return value is not None and value.strip().lower() == wanted
+
+            return match
+
+        if not isinstance(wanted, bytes):
+            wanted = wanted.encode(encoding)
+        wanted = wanted.strip()
+
+        def match(paragraph):
+            value = _query_value(paragraph, field, encoding)
+            return value is not None and value.strip() == wanted
+
+        return match
+
+
+class FieldMatches(Query):
+    """Match paragraphs in which field matches the given regular expression
+
+    The regular expression (a string or a compiled one) is searched for, as
+    with re.search, in the value of the field, continuation lines included.
+    Text patterns are searched for in the decoded value, so that they behave
+    as they would on the value of a Deb822 object (e.g. \\w and re.IGNORECASE
+    apply beyond ASCII in Python 3); bytes patterns in the raw value, which
+    spares decoding it.
+    """
+
+    def __init__(self, field, pattern, flags=0):
+        self.field = field
+        self.pattern = pattern
+        self.flags = flags
+        self.fields = frozenset([field])
+
+    def compile(self, encoding='utf-8'):
+        field = self.field
+        regex = self.pattern
+        if not hasattr(regex, 'pattern'):
+            regex = re.compile(regex, self.flags)
+        search = regex.search
+        if isinstance(regex.pattern, bytes):
+            get_value = _query_value
+        else:
+            get_value = _query_text
+
+        def match(paragraph):
+            value = get_value(paragraph, field, encoding)
+            return value is not None and search(value) is not None
+
+        return match
+
+
+class FieldVersion(Query):
+    """Match paragraphs in which field compares to version as requested
+
+    The operator is one of the relations used in package dependencies:
+    '<<', '<=', '=', '>=' or '>>'.  Versions are compared with
+    debian_support.version_compare.
+    """
+
+    __ops = {
+        '<<': lambda c: c < 0,
+        '<=': lambda c: c <= 0,
+        '=': lambda c: c == 0,
+        '>=': lambda c: c >= 0,
+        '>>': lambda c: c > 0,
+    }
+
+    def __init__(self, field, operator, version):
+        if operator not in self.__ops:
+            raise ValueError('invalid version relation: %r' % (operator,))
+        self.field = field
+        self.operator = operator
+        self.version = version
+        self.fields = frozenset([field])
+
+    def compile(self, encoding='utf-8'):
+        field = self.field
+        version = self.version
+        check = self.__ops[self.operator]
+
+        def match(paragraph):
+            value = _query_value(paragraph, field, encoding)
+            if value is None:
+                return False
+            try:
+                return check(version_compare(
+                    value.strip().decode(encoding), version))
+            except ValueError:
+                # Not a valid version: it can't compare to anything
+                return False
+
+        return match
+
+
+class AllOf(Query):
+    """Match paragraphs matching all of the given queries"""
+
+    def __init__(self, *queries):
+        self.queries = queries
+        self.fields = frozenset().union(*[q.fields for q in queries])
+
+    def compile(self, encoding='utf-8'):
+        matchers = [q.compile(encoding) for q in self.queries]
+        return lambda paragraph: all(m(paragraph) for m in matchers)
+
+    def __and__(self, other):
+        return AllOf(*(self.queries + (other,)))
+
+
+class AnyOf(Query):
+    """Match paragraphs matching at least one of the given queries"""
+
+    def __init__(self, *queries):
+        self.queries = queries
+        self.fields = frozenset().union(*[q.fields for q in queries])
+
+    def compile(self, encoding='utf-8'):
+        matchers = [q.compile(encoding) for q in self.queries]
+        return lambda paragraph: any(m(paragraph) for m in matchers)
+
+    def __or__(self, other):
+        return AnyOf(*(self.queries + (other,)))
+
+
+class Not(Query):
+    """Match paragraphs not matching the given query"""
+
+    def __init__(self, query):
+        self.query = query
+        self.fields = query.fields
+
+    def compile(self, encoding='utf-8'):
+        matcher = self.query.compile(encoding)
+        return lambda paragraph: not matcher(paragraph)
+
+    def __invert__(self):
+        return self.query
+
+
+def _query_probe(query, encoding):
+    """Return a function telling whether the paragraph in a buffer matches
+
+    Only the fields the query looks at are split out of the buffer for this,
+    which is much cheaper than parsing the whole paragraph.
+    """
+    matcher = query.compile(encoding)
+    fields = query.fields or None
+    return lambda buf, start=0, end=None: matcher(
+        _BufferSection(buf, encoding, fields, start, end))
+
+
 class OrderedSet(object):
     """A set-like object that preserves order when iterating over it
 
@@ -173,11 +699,17 @@ class Deb822Dict(collections.MutableMapping):
 
     # See the end of the file for the definition of _strI
 
+    # Whether dump and write_paragraphs may output the text the paragraph
+    # was parsed from (see Deb822's keep_raw)
+    _keep_raw = False
+
     def __init__(self, _dict=None, _parsed=None, _fields=None,
                  encoding="utf-8"):
         self.__dict = {}
         self.__keys = OrderedSet()
         self.__parsed = None
+        # Whether the paragraph may differ from what __parsed holds
+        self.__modified = _fields is not None
         self.encoding = encoding
 
         if _dict is not None:
@@ -240,7 +772,8 @@ class Deb822Dict(collections.MutableMapping):
         key = _strI(key)
         self.__keys.add(key)
         self.__dict[key] = value
-        
+        self.__modified = True
+
     def __getitem__(self, key):
         key = _strI(key)
         try:
@@ -251,16 +784,20 @@ class Deb822Dict(collections.MutableMapping):
             else:
                 raise
 
-        # TODO(jsw): Move the decoding logic into __setitem__ so that we decode
-        # it once instead of every time somebody asks for it.  Even better if
-        # Deb822* classes dealt in pure unicode and didn't care about the
-        # encoding of the files they came from...but I don't know how to fix
-        # that without breaking a bunch of users.
-        return self._detect_encoding(value)
+        if isinstance(value, bytes):
+            # Raw values are decoded the first time somebody asks for them,
+            # and only then: fields that are never looked at are never
+            # decoded at all.  Values that are already unicode (e.g. when
+            # _parsed is another Deb822Dict) are not cached, so that they
+            # keep tracking their source.
+            value = self._detect_encoding(value)
+            self.__dict[key] = value
+        return value
 
     def __delitem__(self, key):
         key = _strI(key)
         self.__keys.remove(key)
+        self.__modified = True
         try:
             del self.__dict[key]
         except KeyError:
@@ -277,6 +814,32 @@ class Deb822Dict(collections.MutableMapping):
 
     ### END collections.MutableMapping methods
 
+    def _use_parsed(self, parsed, fields=None):
+        """Pull the values of the keys in parsed from it as needed.
+
+        This is like passing _parsed and _fields to the constructor, except
+        that the keys are kept in the order (and case) they have in parsed.
+        """
+        self.__parsed = parsed
+        self.__keys.extend([_strI(k) for k in parsed
+                            if fields is None or k in fields])
+        if fields is not None:
+            self.__modified = True
+
+    def _get_raw_text(self, encoding):
+        """Return the paragraph as it was parsed, as bytes in encoding
+
+        This is only possible if the paragraph was parsed from raw bytes in
+        that encoding, with all its fields and keep_raw set, and has not been
+        modified since.  Otherwise, None is returned.
+        """
+        parsed = self.__parsed
+        if (not self._keep_raw or self.__modified
+                or not hasattr(parsed, 'raw_text')
+                or parsed.encoding != encoding):
+            return None
+        return parsed.raw_text()
+
     def __repr__(self):
         return '{%s}' % ', '.join(['%r: %r' % (k, v) for k, v in self.items()])
 
@@ -308,7 +871,7 @@ class Deb822Dict(collections.MutableMapping):
 class Deb822(Deb822Dict):
 
     def __init__(self, sequence=None, fields=None, _parsed=None,
-                 encoding="utf-8"):
+                 encoding="utf-8", keep_raw=False):
         """Create a new Deb822 instance.
 
         :param sequence: a string, or any any object that returns a line of
@@ -323,6 +886,10 @@ class Deb822(Deb822Dict):
         :param encoding: When parsing strings, interpret them in this encoding.
             (All values are given back as unicode objects, so an encoding is
             necessary in order to properly interpret the strings.)
+
+        :param keep_raw: if True, dump the paragraph as it was parsed (less
+            comments) as long as it isn't modified, rather than normalizing
+            the spacing and line endings of its fields.
         """
 
         if hasattr(sequence, 'items'):
@@ -332,6 +899,7 @@ class Deb822(Deb822Dict):
             _dict = None
         Deb822Dict.__init__(self, _dict=_dict, _parsed=_parsed, _fields=fields,
                             encoding=encoding)
+        self._keep_raw = keep_raw
 
         if sequence is not None:
             try:
@@ -343,10 +911,16 @@ class Deb822(Deb822Dict):
 
     @classmethod
     def iter_paragraphs(cls, sequence, fields=None, use_apt_pkg=False,
-                        shared_storage=False, encoding="utf-8"):
+                        shared_storage=False, encoding="utf-8",
+                        use_mmap=False, threaded_decompression=False,
+                        query=None, keep_raw=False):
         """Generator that yields a Deb822 object for each paragraph in sequence.
 
-        :param sequence: same as in __init__.
+        :param sequence: same as in __init__.  In addition, files compressed
+            with gzip, xz, bzip2 or zstd are decompressed on the fly if they
+            are opened in binary mode, and sequence may also be the path of
+            a (possibly compressed) file given as a path-like object, e.g. a
+            pathlib.Path (plain strings are always taken as the data itself).
 
         :param fields: likewise.
 
@@ -363,9 +937,58 @@ class Deb822(Deb822Dict):
         :param encoding: Interpret the paragraphs in this encoding.
             (All values are given back as unicode objects, so an encoding is
             necessary in order to properly interpret the strings.)
+        :param use_mmap: if sequence is a file, map it into memory and find
+            paragraphs and fields by scanning the mapped bytes instead of
+            reading it line by line.  Field values are only copied out of the
+            mapping when they are accessed.  This does not need apt_pkg, is
+            as tolerant as the default parser regarding whitespace and
+            comments, and takes precedence over use_apt_pkg.  The yielded
+            objects keep the mapping alive until they are all discarded.
+            Bytes (or bytearray, or memoryview) sequences are always parsed
+            this way.  So are binary streams that apt_pkg can't be used for
+            if either use_mmap or use_apt_pkg is set: files are mapped, and
+            streams that can't be (e.g. compressed files, or HTTP responses)
+            are scanned a chunk at a time, so that memory use doesn't grow
+            with their size.
+        :param threaded_decompression: decompress compressed input in a
+            background thread, overlapping it with parsing.
+        :param query: a Query object; if given, only the paragraphs matching
+            it are yielded.  The others are rejected by looking at their raw
+            fields, without building objects for them.
+        :param keep_raw: same as in __init__.  Unmodified paragraphs are
+            then dumped, and written by write_paragraphs, exactly as they are
+            in sequence.  This doesn't apply to those parsed by apt_pkg.
         """
 
-        if _have_apt_pkg and use_apt_pkg and _is_real_file(sequence):
+        if hasattr(sequence, '__fspath__'):
+            with open_compressed(sequence.__fspath__(),
+                                 threaded_decompression) as f:
+                for paragraph in cls.iter_paragraphs(
+                        f, fields, use_apt_pkg, shared_storage, encoding,
+                        use_mmap, query=query, keep_raw=keep_raw):
+                    yield paragraph
+            return
+
+        if _is_binary_file(sequence):
+            decompressed = open_compressed(sequence, threaded_decompression)
+            if decompressed is not sequence:
+                # Close the decompressing stream (stopping its thread, if
+                # any) even if the caller stops iterating early.
+                with decompressed:
+                    for paragraph in cls.iter_paragraphs(
+                            decompressed, fields, use_apt_pkg, shared_storage,
+                            encoding, use_mmap, query=query,
+                            keep_raw=keep_raw):
+                        yield paragraph
+                return
+
+        if use_mmap and _is_real_file(sequence):
+            for paragraph in cls._iter_paragraphs_mmap(sequence, fields,
+                                                       encoding, query,
+                                                       keep_raw):
+                yield paragraph
+
+        elif _have_apt_pkg and use_apt_pkg and _is_real_file(sequence):
             kwargs = {}
             if sys.version >= '3':
                 # bytes=True is supported for both Python 2 and 3, but we
@@ -375,23 +998,299 @@ class Deb822(Deb822Dict):
                 # handling, which is more tolerant of mixed-encoding files.
                 kwargs['bytes'] = True
             parser = apt_pkg.TagFile(sequence, **kwargs)
+            matcher = query.compile(encoding) if query is not None else None
             for section in parser:
-                paragraph = cls(fields=fields,
-                                _parsed=TagSectionWrapper(section),
-                                encoding=encoding)
+                section = TagSectionWrapper(section)
+                if matcher is not None and not matcher(section):
+                    continue
+                paragraph = cls(fields=fields, _parsed=section,
+                                encoding=encoding, keep_raw=keep_raw)
                 if paragraph:
                     yield paragraph
 
+        elif isinstance(sequence, (bytes, bytearray, memoryview)):
+            # Data already in memory: scan the bytes like the mmap parser
+            # does.
+            if sys.version < '3' and not isinstance(sequence, bytes):
+                # Python 2's re can't scan memoryviews, and gives slices of
+                # bytearrays (unhashable) for matches in them
+                sequence = (sequence.tobytes()
+                            if isinstance(sequence, memoryview)
+                            else bytes(sequence))
+            for paragraph in cls._iter_paragraphs_buffer(
+                    sequence, fields, encoding, query, keep_raw=keep_raw):
+                yield paragraph
+
+        elif (use_apt_pkg or use_mmap) and _is_binary_file(sequence):
+            # Binary streams for which a fast parser was asked for, but
+            # apt_pkg can't be used: map files, and scan the others (e.g.
+            # data being decompressed or downloaded) a chunk at a time.
+            if _is_real_file(sequence):
+                paragraphs = cls._iter_paragraphs_mmap(sequence, fields,
+                                                       encoding, query,
+                                                       keep_raw)
+            else:
+                paragraphs = cls._iter_paragraphs_stream(sequence, fields,
+                                                         encoding, query,
+                                                         keep_raw)
+            for paragraph in paragraphs:
+                yield paragraph
+
         else:
             if isinstance(sequence, six.string_types + (six.binary_type,)):
                 sequence = sequence.splitlines()
             iterable = iter(sequence)
+            if query is not None:
+                for paragraph in cls._iter_paragraphs_query(
+                        iterable, fields, encoding, query, keep_raw):
+                    yield paragraph
+                return
             while True:
-                x = cls(iterable, fields, encoding=encoding)
+                x = cls(iterable, fields, encoding=encoding,
+                        keep_raw=keep_raw)
                 if not x:
                     break
                 yield x
 
+    @classmethod
+    def _iter_paragraphs_query(cls, iterable, fields, encoding, query,
+                               keep_raw=False):
+        """Line-based iter_paragraphs(..., query=query)
+
+        Paragraphs are only parsed once they have matched, from the lines
+        they were read from, so that signed ones keep their signature.
+        """
+        probe = _query_probe(query, encoding)
+
+        def recorded(read):
+            for line in iterable:
+                read.append(line)
+                yield line
+
+        while True:
+            read = []
+            try:
+                lines = cls.gpg_stripped_paragraph(
+                    cls._skip_useless_lines(recorded(read)))
+            except EOFError:
+                break
+            lines = [line.encode(encoding)
+                     if isinstance(line, six.text_type) else line
+                     for line in lines]
+            if probe(b'\n'.join(lines)):
+                paragraph = cls(read, fields, encoding=encoding,
+                                keep_raw=keep_raw)
+                if paragraph:
+                    yield paragraph
+
+    @classmethod
+    def _iter_paragraphs_mmap(cls, fileobj, fields, encoding, query=None,
+                              keep_raw=False):
+        """Implementation of iter_paragraphs(..., use_mmap=True)"""
+        try:
+            offset = fileobj.tell()
+        except (IOError, OSError, ValueError):
+            offset = 0
+        try:
+            mapped = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be mapped.
+            return
+        except EnvironmentError:
+            # Nor can pipes or terminals.
+            for paragraph in cls._iter_paragraphs_stream(fileobj, fields,
+                                                         encoding, query,
+                                                         keep_raw):
+                yield paragraph
+            return
+
+        for paragraph in cls._iter_paragraphs_buffer(
+                mapped, fields, encoding, query, offset, keep_raw):
+            yield paragraph
+        fileobj.seek(0, 2)
+
+    @classmethod
+    def _iter_paragraphs_stream(cls, fileobj, fields, encoding, query=None,
+                                keep_raw=False, chunk_size=64 * 1024):
+        """Yield the paragraphs of a binary stream, reading it in chunks
+
+        Each chunk is cut after the last empty line in it; the paragraphs
+        before the cut are scanned like those of a buffer, and the rest is
+        carried over to the next chunk.  Only about chunk_size bytes (or the
+        longest paragraph) are held at a time, however long the stream is,
+        besides the chunks the yielded objects still hold on to.
+        """
+        carry = b''
+        while True:
+            data = fileobj.read(chunk_size)
+            if data:
+                buf = carry + data
+                cut = _last_paragraph_break(buf, max(len(carry) - 2, 0))
+                if cut is None:
+                    carry = buf
+                    continue
+            else:
+                buf = carry
+                cut = len(buf)
+            chunk, carry = buf[:cut], buf[cut:]
+            if _gpg_armor_start in chunk:
+                # Signed input: leave it, and everything after it, to the
+                # line-based parser.
+                lines = itertools.chain(chunk.splitlines(),
+                                        _stream_lines(carry, fileobj))
+                for paragraph in cls.iter_paragraphs(lines, fields,
+                                                     encoding=encoding,
+                                                     query=query,
+                                                     keep_raw=keep_raw):
+                    yield paragraph
+                return
+            for paragraph in cls._iter_paragraphs_buffer(
+                    chunk, fields, encoding, query, keep_raw=keep_raw):
+                yield paragraph
+            if not data:
+                return
+
+    @classmethod
+    def _iter_paragraphs_buffer(cls, buf, fields, encoding, query=None,
+                                offset=0, keep_raw=False):
+        """Yield the paragraphs found in buf (bytes, a bytearray or an mmap
+        object) from offset on
+        """
+        armor_len = len(_gpg_armor_start)
+        probe = _query_probe(query, encoding) if query is not None else None
+        for start, end in _iter_paragraph_spans(buf, offset):
+            if buf[start:start + armor_len] == _gpg_armor_start:
+                # Signed input: leave the dissection of the armor to the
+                # line-based parser.
+                lines = bytes(buf[start:]).splitlines()
+                for paragraph in cls.iter_paragraphs(lines, fields,
+                                                     encoding=encoding,
+                                                     query=query,
+                                                     keep_raw=keep_raw):
+                    yield paragraph
+                return
+            if probe is not None and not probe(buf, start, end):
+                continue
+            paragraph = cls._from_buffer_section(
+                _BufferSection(buf, encoding, fields, start, end), fields,
+                encoding, keep_raw)
+            if paragraph:
+                yield paragraph
+
+    @classmethod
+    def _from_buffer_section(cls, section, fields, encoding, keep_raw=False):
+        """Build an object pulling its values from a _BufferSection
+
+        The section only holds the wanted fields already; giving them as
+        fields (rather than the fields argument itself) keeps them in the
+        order in which they are in the paragraph, like the line-based parser
+        does.
+        """
+        if fields is not None:
+            fields = list(section)
+        return cls(fields=fields, _parsed=section, encoding=encoding,
+                   keep_raw=keep_raw)
+
+    @classmethod
+    def iter_paragraphs_parallel(cls, filename, fields=None,
+                                 encoding="utf-8", max_workers=None,
+                                 chunk_size=2 * 1024 * 1024, ordered=True,
+                                 as_dict=False, executor=None, query=None):
+        """Generator that parses the paragraphs of a file in parallel.
+
+        The file is cut into chunks of about chunk_size bytes at paragraph
+        boundaries, and the chunks are parsed in a pool of worker processes.
+        Signed files are parsed sequentially with iter_paragraphs.  On
+        Python 2, this needs the backport of the concurrent.futures module.
+
+        :param filename: name of the file to parse.
+        :param fields: same as in iter_paragraphs.
+        :param encoding: likewise.
+        :param max_workers: number of worker processes (default: the number
+            of CPUs).  If executor is given, this only limits the number of
+            chunks submitted to it at a time.
+        :param chunk_size: approximate size in bytes of the chunks handed to
+            the workers.
+        :param ordered: if True, paragraphs are yielded in the order in which
+            they appear in the file; otherwise the paragraphs of each chunk
+            are yielded as soon as the chunk has been parsed.
+        :param as_dict: if True, yield plain dicts mapping field names to
+            (unicode) values instead of objects of this class.  They are
+            cheaper to send back from the workers.
+        :param executor: a concurrent.futures.Executor to use instead of
+            creating (and shutting down) a process pool, e.g. to share one
+            pool between several files.
+        :param query: same as in iter_paragraphs.  The paragraphs are
+            filtered in the workers.
+        """
+        import concurrent.futures
+
+        with open(filename, 'rb') as f:
+            head = f.read(4096).lstrip()
+            f.seek(0, 2)
+            size = f.tell()
+            if head.startswith(_gpg_armor_start):
+                f.seek(0)
+                for paragraph in cls.iter_paragraphs(f, fields,
+                                                     encoding=encoding,
+                                                     query=query):
+                    yield dict(paragraph) if as_dict else paragraph
+                return
+            if not size:
+                return
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # Move each cut forward to the end of the next paragraph separator.
+        chunks = []
+        start = 0
+        while start < size:
+            end = start + max(chunk_size, 1)
+            if end < size:
+                sep = _paragraph_sep_re.search(mapped, end - 1)
+                end = sep.end() if sep is not None else size
+            end = min(end, size)
+            chunks.append((start, end))
+            start = end
+        mapped.close()
+
+        own_executor = executor is None
+        if own_executor:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers)
+        # Keep a bounded number of chunks in flight, so that memory use
+        # doesn't depend on the size of the file.
+        max_pending = 2 * (max_workers or multiprocessing.cpu_count())
+        chunks = iter(chunks)
+        pending = collections.deque()
+
+        def submit():
+            for start, end in chunks:
+                pending.append(executor.submit(
+                    _parse_paragraph_chunk, cls, filename, start, end,
+                    fields, encoding, as_dict, query))
+                if len(pending) >= max_pending:
+                    break
+
+        try:
+            submit()
+            while pending:
+                if ordered:
+                    future = pending.popleft()
+                else:
+                    done, _ = concurrent.futures.wait(
+                        pending,
+                        return_when=concurrent.futures.FIRST_COMPLETED)
+                    future = done.pop()
+                    pending.remove(future)
+                paragraphs = future.result()
+                submit()
+                for paragraph in paragraphs:
+                    yield paragraph
+        finally:
+            for future in pending:
+                future.cancel()
+            if own_executor:
+                executor.shutdown()
+
     ###
 
     @staticmethod
@@ -424,57 +1323,28 @@ class Deb822(Deb822Dict):
             yield line
 
     def _internal_parser(self, sequence, fields=None):
-        # The key is non-whitespace, non-colon characters before any colon.
-        key_part = r"^(?P<key>[^: \t\n\r\f\v]+)\s*:\s*"
-        single = re.compile(key_part + r"(?P<data>\S.*?)\s*$")
-        multi = re.compile(key_part + r"$")
-        multidata = re.compile(r"^\s(?P<data>.+?)\s*$")
-
-        wanted_field = lambda f: fields is None or f in fields
+        if isinstance(sequence, bytes):
+            spans = _gpg_payload_spans(sequence)
+            if spans is not None:
+                # Parse the paragraph where it is, without splitting it
+                # into lines and joining them back
+                start, end = spans[0]
+                self._use_parsed(_BufferSection(
+                    sequence, self.encoding, fields, start, end), fields)
+                return
 
         if isinstance(sequence, (six.string_types, bytes)):
             sequence = sequence.splitlines()
 
-        curkey = None
-        content = ""
-
-        for line in self.gpg_stripped_paragraph(
-                self._skip_useless_lines(sequence)):
-            line = self._detect_encoding(line)
-
-            m = single.match(line)
-            if m:
-                if curkey:
-                    self[curkey] = content
-
-                if not wanted_field(m.group('key')):
-                    curkey = None
-                    continue
-
-                curkey = m.group('key')
-                content = m.group('data')
-                continue
-
-            m = multi.match(line)
-            if m:
-                if curkey:
-                    self[curkey] = content
-
-                if not wanted_field(m.group('key')):
-                    curkey = None
-                    continue
-
-                curkey = m.group('key')
-                content = ""
-                continue
-
-            m = multidata.match(line)
-            if m:
-                content += '\n' + line # XXX not m.group('data')?
-                continue
-
-        if curkey:
-            self[curkey] = content
+        # Keep the paragraph as raw bytes, with just the offsets of its
+        # fields; values are decoded by Deb822Dict when they are first used.
+        lines = self.gpg_stripped_paragraph(self._skip_useless_lines(sequence))
+        # split_gpg_and_payload only encodes lines of text on Python 3
+        lines = [line.encode(self.encoding)
+                 if isinstance(line, six.text_type) else line
+                 for line in lines]
+        self._use_parsed(_BufferSection(b'\n'.join(lines), self.encoding,
+                                        fields), fields)
 
     def __str__(self):
         return self.dump()
@@ -510,23 +1380,53 @@ class Deb822(Deb822Dict):
         object was initialized with (utf-8 by default).  This will raise
         UnicodeEncodeError if the encoding can't support all the characters in
         the Deb822Dict values.
+
+        If the object was parsed with keep_raw set, and has not been
+        modified since, its original text (less comments) is output as is.
         """
         # Ideally this would never try to encode (that should be up to the
         # caller when opening the file), but we may still have users who rely
         # on the binary mode encoding.  But...might it be better to break them
         # than to introduce yet another parameter relating to encoding?
 
+        if encoding is None:
+            # Use the encoding we've been using to decode strings with if none
+            # was explicitly specified
+            encoding = self.encoding
+
+        raw = self._get_raw_text(self.encoding)
+        if raw is not None:
+            if fd is not None and not text_mode:
+                if encoding == self.encoding:
+                    fd.write(raw)
+                    return
+            else:
+                try:
+                    text = raw.decode(self.encoding)
+                except UnicodeDecodeError:
+                    pass
+                else:
+                    if fd is None:
+                        return text
+                    fd.write(text)
+                    return
+
         if fd is None:
             fd = StringIO()
             return_string = True
         else:
             return_string = False
 
-        if encoding is None:
-            # Use the encoding we've been using to decode strings with if none
-            # was explicitly specified
-            encoding = self.encoding
+        for entry in self._dump_entries():
+            if not return_string and not text_mode:
+                fd.write(entry.encode(encoding))
+            else:
+                fd.write(entry)
+        if return_string:
+            return fd.getvalue()
 
+    def _dump_entries(self):
+        """Generate the "Field: value" lines dump writes, as unicode"""
         for key in self:
             value = self.get_as_string(key)
             if not value or value[0] == '\n':
@@ -534,15 +1434,9 @@ class Deb822(Deb822Dict):
                 # line or the value is empty.  We don't have to worry about the
                 # case where value == '\n', since we ensure that is not the
                 # case in __setitem__.
-                entry = '%s:%s\n' % (key, value)
+                yield '%s:%s\n' % (key, value)
             else:
-                entry = '%s: %s\n' % (key, value)
-            if not return_string and not text_mode:
-                fd.write(entry.encode(encoding))
-            else:
-                fd.write(entry)
-        if return_string:
-            return fd.getvalue()
+                yield '%s: %s\n' % (key, value)
 
     ###
 
@@ -641,9 +1535,6 @@ class Deb822(Deb822Dict):
         gpg_post_lines = []
         state = b'SAFE'
         gpgre = re.compile(br'^-----(?P<action>BEGIN|END) PGP (?P<what>[^-]+)-----[\r\t ]*$')
-        # Include whitespace-only lines in blank lines to split paragraphs.
-        # (see #715558)
-        blank_line = re.compile(b'^\s*$')
         first_line = True
 
         for line in sequence:
@@ -655,19 +1546,23 @@ class Deb822(Deb822Dict):
                 line = line.encode()
 
             line = line.strip(b'\r\n')
+            # Include whitespace-only lines in blank lines to split
+            # paragraphs (see #715558).
+            blank = not line.strip()
 
             # skip initial blank lines, if any
             if first_line:
-                if blank_line.match(line):
+                if blank:
                     continue
                 else:
                     first_line = False
 
-            m = gpgre.match(line)
+            # Only armor lines can match, so don't bother the regex otherwise
+            m = line.startswith(b'-----') and gpgre.match(line)
 
             if not m:
                 if state == b'SAFE':
-                    if not blank_line.match(line):
+                    if not blank:
                         lines.append(line)
                     else:
                         if not gpg_pre_lines:
@@ -675,7 +1570,7 @@ class Deb822(Deb822Dict):
                             # this blank line
                             break
                 elif state == b'SIGNED MESSAGE':
-                    if blank_line.match(line):
+                    if blank:
                         state = b'SAFE'
                     else:
                         gpg_pre_lines.append(line)
@@ -687,7 +1582,7 @@ class Deb822(Deb822Dict):
                 elif m.group('action') == b'END':
                     gpg_post_lines.append(line)
                     break
-                if not blank_line.match(line):
+                if not blank:
                     if not lines:
                         gpg_pre_lines.append(line)
                     else:
@@ -705,13 +1600,15 @@ class Deb822(Deb822Dict):
 
     gpg_stripped_paragraph = classmethod(gpg_stripped_paragraph)
 
-    def get_gpg_info(self, keyrings=None):
+    def get_gpg_info(self, keyrings=None, verifier=None):
         """Return a GpgInfo object with GPG signature information
 
         This method will raise ValueError if the signature is not available
         (e.g. the original text cannot be found).
 
         :param keyrings: list of keyrings to use (see GpgInfo.from_sequence)
+        :param verifier: a GpgVerifier to check the signature with (and
+            whose keyrings are used), instead of running gpgv directly
         """
 
         # raw_text is saved (as a string) only for Changes and Dsc (see
@@ -721,8 +1618,11 @@ class Deb822(Deb822Dict):
             raise ValueError("original text cannot be found")
 
         if self.gpg_info is None:
-            self.gpg_info = GpgInfo.from_sequence(self.raw_text,
-                                                  keyrings=keyrings)
+            if verifier is not None:
+                self.gpg_info = verifier.verify(self.raw_text)
+            else:
+                self.gpg_info = GpgInfo.from_sequence(self.raw_text,
+                                                      keyrings=keyrings)
 
         return self.gpg_info
 
@@ -752,6 +1652,69 @@ class Deb822(Deb822Dict):
         Deb822Dict.__setitem__(self, key, value)
 
 
+def _encoded_paragraphs(paragraphs, encoding, batch_size=256):
+    """Generate the output of write_paragraphs in blocks of bytes
+
+    Each block holds one or more paragraphs, separated by blank lines.
+    """
+    texts = []
+    for paragraph in paragraphs:
+        if isinstance(paragraph, Deb822Dict):
+            raw = paragraph._get_raw_text(encoding)
+            if raw is not None:
+                if texts:
+                    yield '\n'.join(texts).encode(encoding)
+                    del texts[:]
+                yield raw
+                continue
+        if isinstance(paragraph, Deb822):
+            text = ''.join(paragraph._dump_entries())
+        else:
+            text = paragraph.dump()
+        if text:
+            texts.append(text)
+            if len(texts) >= batch_size:
+                yield '\n'.join(texts).encode(encoding)
+                del texts[:]
+    if texts:
+        yield '\n'.join(texts).encode(encoding)
+
+
+def write_paragraphs(paragraphs, fd, encoding="utf-8",
+                     buffer_size=1024 * 1024):
+    """Write paragraphs to fd, separated by blank lines
+
+    The output is the same as if the dump of each paragraph was written in
+    turn, but it is produced much faster when there are many paragraphs: the
+    text of consecutive paragraphs is encoded in one go, and written to fd
+    in blocks of about buffer_size bytes.  Moreover, paragraphs parsed in
+    this encoding with keep_raw set, and not modified since, are written back
+    as they were read (comments excepted) without going through their
+    fields.
+
+    :param paragraphs: an iterable of Deb822 objects, or of other objects
+        with a dump method returning unicode (e.g. RestrictedWrapper).
+    :param fd: a file-like object opened in binary mode.
+    :param encoding: the encoding of the output.
+    :param buffer_size: approximate number of bytes to gather before each
+        write to fd.
+    """
+    block = []
+    size = 0
+    separator = b''
+    for data in _encoded_paragraphs(paragraphs, encoding):
+        block.append(separator)
+        block.append(data)
+        separator = b'\n'
+        size += len(data)
+        if size >= buffer_size:
+            fd.write(b''.join(block))
+            del block[:]
+            size = 0
+    if block:
+        fd.write(b''.join(block))
+
+
 # XXX check what happens if input contains more that one signature
 class GpgInfo(dict):
     """A wrapper around gnupg parsable output obtained via --status-fd
@@ -831,6 +1794,18 @@ class GpgInfo(dict):
             being the gpgv executable (default: ['/usr/bin/gpgv'])
         """
 
+        args = cls._gpgv_args(keyrings, executable)
+
+        if isinstance(sequence, bytes):
+            inp = sequence
+        else:
+            inp = cls._get_full_bytes(sequence)
+
+        return cls.from_output(*cls._run_gpgv(args, inp))
+
+    @staticmethod
+    def _gpgv_args(keyrings=None, executable=None):
+        """Return the command line to run gpgv with (see from_sequence)"""
         keyrings = keyrings or GPGV_DEFAULT_KEYRINGS
         executable = executable or [GPGV_EXECUTABLE]
 
@@ -843,20 +1818,19 @@ class GpgInfo(dict):
         
         if "--keyring" not in args:
             raise IOError("cannot access any of the given keyrings")
+        return args
 
+    @staticmethod
+    def _run_gpgv(args, inp):
+        """Run gpgv (as given by args) on the bytes inp, and return its
+        output and error output, as strings
+        """
         p = subprocess.Popen(args, stdin=subprocess.PIPE,
                              stdout=subprocess.PIPE, stderr=subprocess.PIPE,
                              universal_newlines=False)
         # XXX what to do with exit code?
-
-        if isinstance(sequence, bytes):
-            inp = sequence
-        else:
-            inp = cls._get_full_bytes(sequence)
         out, err = p.communicate(inp)
-
-        return cls.from_output(out.decode('utf-8'),
-                               err.decode('utf-8'))
+        return out.decode('utf-8'), err.decode('utf-8')
 
     @staticmethod
     def _get_full_bytes(sequence):
@@ -886,6 +1860,241 @@ class GpgInfo(dict):
             return cls.from_sequence(target_file, *args, **kwargs)
 
 
+class GpgVerifier(object):
+    """Verify many GPG signatures, concurrently, and caching the results
+
+    Each verification runs gpgv (like GpgInfo.from_sequence), with up to
+    workers of them running at the same time in verify_many.  Results are
+    cached by the SHA-256 digests of the signed data and of the keyrings,
+    so that checking the same data again with the same keyrings costs
+    nothing.  The cache keeps the most recently used results, and can be
+    saved to a file, to be reused by later verifiers:
+
+        verifier = GpgVerifier(keyrings, cache_file='gpg-cache.json')
+        for changes, info in zip(uploads, verifier.verify_many(uploads)):
+            ...
+        verifier.save()
+
+    Note that the results of cached verifications don't change with time,
+    e.g. when a key expires; use cache_clear to check everything again.
+    """
+
+    def __init__(self, keyrings=None, executable=None, workers=None,
+                 cache_size=4096, cache_file=None):
+        """Create a verifier
+
+        :param keyrings: list of keyrings to use (see
+            GpgInfo.from_sequence)
+        :param executable: list of args for subprocess.Popen, the first
+            element being the gpgv executable (see GpgInfo.from_sequence)
+        :param workers: the maximum number of gpgv processes run at the
+            same time by verify_many (default: the number of CPUs)
+        :param cache_size: the maximum number of results kept in the cache
+        :param cache_file: a file where the cache is saved by save, and
+            from which it is loaded now if it exists
+        """
+        self.keyrings = list(keyrings or GPGV_DEFAULT_KEYRINGS)
+        self.executable = list(executable or [GPGV_EXECUTABLE])
+        self.workers = workers or multiprocessing.cpu_count()
+        self.cache_file = cache_file
+        self.__args = GpgInfo._gpgv_args(self.keyrings, self.executable)
+        self.__cache = _LRUCache(cache_size)
+        self.__lock = threading.Lock()
+        self.__keyrings_stat = None
+        self.__keyrings_digest = None
+        if cache_file is not None and os.path.exists(cache_file):
+            self.load(cache_file)
+
+    def __keyrings_id(self):
+        """Return a digest of the contents of the keyrings
+
+        It is only computed again when the keyrings change on disk.
+        """
+        stat = []
+        for keyring in self.keyrings:
+            try:
+                st = os.stat(keyring)
+                stat.append((st.st_size, st.st_mtime))
+            except OSError:
+                stat.append(None)
+        with self.__lock:
+            if stat == self.__keyrings_stat:
+                return self.__keyrings_digest
+        digest = hashlib.sha256()
+        for keyring in self.keyrings:
+            digest.update(keyring.encode('utf-8') + b'\0')
+            try:
+                with open(keyring, 'rb') as f:
+                    digest.update(hashlib.sha256(f.read()).digest())
+            except IOError:
+                digest.update(b'\0')
+        with self.__lock:
+            self.__keyrings_stat = stat
+            self.__keyrings_digest = digest.hexdigest()
+            return self.__keyrings_digest
+
+    @staticmethod
+    def __bytes(data):
+        """Return the signed bytes of data: a byte string, a sequence of
+        lines of bytes, or an object with a raw_text attribute (like Changes
+        or Dsc objects)
+        """
+        if hasattr(data, 'raw_text'):
+            data = data.raw_text
+        if isinstance(data, bytes):
+            return data
+        return GpgInfo._get_full_bytes(data)
+
+    def __key(self, data):
+        return '%s:%s' % (hashlib.sha256(data).hexdigest(),
+                          self.__keyrings_id())
+
+    def __cached(self, key):
+        with self.__lock:
+            return self.__cache.get(key)
+
+    def __run(self, key, data):
+        result = GpgInfo._run_gpgv(self.__args, data)
+        with self.__lock:
+            self.__cache.put(key, result)
+        return result
+
+    def verify(self, data):
+        """Return a GpgInfo object with the result of the verification of
+        data (a byte string, a sequence of lines of bytes, or an object with
+        a raw_text attribute, like Changes or Dsc objects)
+        """
+        data = self.__bytes(data)
+        key = self.__key(data)
+        result = self.__cached(key)
+        if result is None:
+            result = self.__run(key, data)
+        return GpgInfo.from_output(*result)
+
+    def verify_many(self, items):
+        """Verify each of items (as for verify), running up to workers gpgv
+        processes at the same time, and return the list of their GpgInfo
+        objects
+        """
+        keys = []
+        results = {}
+        todo = {}       # the data to run gpgv on, by key
+        for data in items:
+            data = self.__bytes(data)
+            key = self.__key(data)
+            keys.append(key)
+            if key not in results and key not in todo:
+                result = self.__cached(key)
+                if result is None:
+                    todo[key] = data
+                else:
+                    results[key] = result
+        if todo:
+            pool = multiprocessing.pool.ThreadPool(
+                min(self.workers, len(todo)))
+            try:
+                todo_keys = list(todo)
+                results.update(zip(todo_keys, pool.map(
+                    lambda key: self.__run(key, todo[key]), todo_keys)))
+            finally:
+                pool.close()
+                pool.join()
+        return [GpgInfo.from_output(*results[key]) for key in keys]
+
+    def cache_info(self):
+        """Return the (hits, misses, maxsize, currsize) statistics of the
+        cache, as a named tuple
+        """
+        with self.__lock:
+            return self.__cache.info()
+
+    def cache_clear(self):
+        """Empty the cache and reset its statistics"""
+        with self.__lock:
+            self.__cache.clear()
+
+    def load(self, filename):
+        """Add the results saved in filename (see save) to the cache"""
+        with io.open(filename, encoding='utf-8') as f:
+            entries = json.load(f)
+        with self.__lock:
+            for key, out, err in entries:
+                self.__cache.put(key, (out, err))
+
+    def save(self, filename=None):
+        """Save the cache to filename (by default, the cache_file given to
+        the constructor)
+        """
+        filename = filename or self.cache_file
+        if filename is None:
+            raise ValueError("no file to save the cache to")
+        with self.__lock:
+            entries = [[key, out, err]
+                       for key, (out, err) in self.__cache.items()]
+        # Write to a temporary file first, so that readers never find it
+        # half-written
+        fd, tmp = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(filename)))
+        try:
+            with io.open(fd, 'w', encoding='utf-8') as f:
+                f.write(six.text_type(json.dumps(entries)))
+            os.rename(tmp, filename)
+        except Exception:
+            os.remove(tmp)
+            raise
+
+
+class _LRUCache(object):
+    """A dictionary-like cache keeping at most maxsize entries
+
+    When full, the least recently used entry is dropped to make room for new
+    ones.  A maxsize of 0 disables the cache.
+    """
+
+    CacheInfo = collections.namedtuple('CacheInfo',
+            ['hits', 'misses', 'maxsize', 'currsize'])
+
+    def __init__(self, maxsize):
+        self.__data = collections.OrderedDict()
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+
+    def get(self, key, default=None):
+        try:
+            # Move the entry to the most recently used end
+            value = self.__data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self.__data[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self.__data[key] = value
+        while len(self.__data) > self.maxsize:
+            self.__data.popitem(last=False)
+
+    def resize(self, maxsize):
+        self.maxsize = maxsize
+        while len(self.__data) > max(maxsize, 0):
+            self.__data.popitem(last=False)
+
+    def clear(self):
+        self.__data.clear()
+        self.hits = self.misses = 0
+
+    def items(self):
+        """Return the (key, value) pairs, from the least recently used"""
+        return list(self.__data.items())
+
+    def info(self):
+        return self.CacheInfo(self.hits, self.misses, self.maxsize,
+                              len(self.__data))
+
+
 class PkgRelation(object):
     """Inter-package relationships
 
@@ -918,73 +2127,241 @@ class PkgRelation(object):
     BuildRestriction = collections.namedtuple('BuildRestriction',
             ['enabled', 'profile'])
 
+    class Relation(collections.namedtuple('Relation',
+            ['name', 'archqual', 'version', 'arch', 'restrictions'])):
+        """A single package relationship, as returned by
+        parse_relations_compact
+
+        Relations are immutable and hashable: arch is a tuple of
+        ArchRestriction and restrictions a tuple of tuples of
+        BuildRestriction (or None for either).  For compatibility with
+        parse_relations, they behave like read-only dictionaries of their
+        fields: rel['name'], 'version' in rel, iterating over the field
+        names, and comparing equal to the dictionary as_dict returns.
+        """
+
+        __slots__ = ()
+
+        def __getitem__(self, key):
+            if isinstance(key, six.string_types):
+                if key not in self._fields:
+                    raise KeyError(key)
+                return getattr(self, key)
+            return tuple.__getitem__(self, key)
+
+        def __contains__(self, key):
+            return key in self._fields
+
+        def __iter__(self):
+            return iter(self._fields)
+
+        def __len__(self):
+            return len(self._fields)
+
+        def __eq__(self, other):
+            if isinstance(other, dict):
+                return self.as_dict() == other
+            return tuple.__eq__(self, other)
+
+        def __ne__(self, other):
+            return not self == other
+
+        __hash__ = tuple.__hash__
+
+        # Iterating over a Relation gives its field names, so the namedtuple
+        # methods relying on iterating over the values are redone here.
+
+        def _values(self):
+            return tuple.__iter__(self)
+
+        def __getnewargs__(self):
+            return tuple(self._values())
+
+        def _replace(self, **changes):
+            values = [changes.pop(field, value)
+                      for field, value in zip(self._fields, self._values())]
+            if changes:
+                raise ValueError('Got unexpected field names: %r'
+                                 % list(changes))
+            return self._make(values)
+
+        def _asdict(self):
+            return collections.OrderedDict(self.items())
+
+        def get(self, key, default=None):
+            try:
+                return self[key]
+            except KeyError:
+                return default
+
+        def keys(self):
+            return list(self._fields)
+
+        def values(self):
+            return list(self._values())
+
+        def items(self):
+            return list(zip(self._fields, self._values()))
+
+        def as_dict(self):
+            """Return the relation in the format used by parse_relations"""
+            return {
+                'name': self.name,
+                'archqual': self.archqual,
+                'version': self.version,
+                'arch': list(self.arch) if self.arch is not None else None,
+                'restrictions': [list(group) for group in self.restrictions]
+                                if self.restrictions is not None else None,
+            }
+
+    # The same relationship strings (e.g. "libc6 (>= 2.14)") are found over
+    # and over in Packages files, so the results of parse_relations are
+    # cached by raw string.  Single relationships are cached as well, so
+    # that equal relations found in different strings share their memory.
+    __cache = _LRUCache(8192)
+    __rel_cache = _LRUCache(16384)
+
+    @classmethod
+    def set_cache_size(cls, maxsize):
+        """Set the number of relationship strings whose parsing is cached
+
+        Least recently used entries are dropped when there are more.  A size
+        of 0 disables the cache.
+        """
+        cls.__cache.resize(maxsize)
+        cls.__rel_cache.resize(2 * maxsize)
+
+    @classmethod
+    def cache_info(cls):
+        """Return the (hits, misses, maxsize, currsize) statistics of the
+        cache used by parse_relations, as a named tuple
+        """
+        return cls.__cache.info()
+
+    @classmethod
+    def cache_clear(cls):
+        """Empty the cache used by parse_relations and reset its statistics"""
+        cls.__cache.clear()
+        cls.__rel_cache.clear()
+
     @classmethod
     def parse_relations(cls, raw):
         """Parse a package relationship string (i.e. the value of a field like
         Depends, Recommends, Build-Depends ...)
+
+        The results are cached (see set_cache_size), but each call returns
+        new lists and dictionaries, which the caller is free to modify.
         """
-        def parse_archs(raw):
-            # assumption: no space between '!' and architecture name
-            archs = []
-            for arch in cls.__blank_sep_RE.split(raw.strip()):
-                disabled = arch[0] == '!'
-                if disabled:
-                    arch = arch[1:]
-                archs.append(cls.ArchRestriction(not disabled, arch))
-            return archs
-
-        def parse_restrictions(raw):
-            """ split a restriction formula into a list of restriction lists
-
-            Each term in the restriction list is a namedtuple of form:
-
-                (enabled, label)
-
-            where
-                enabled: boolean: whether the restriction is positive or negative
-                profile: the profile name of the term e.g. 'stage1'
-            """
-            restrictions = []
-            for rgrp in cls.__restriction_sep_RE.split(raw.lower().strip('<> ')):
-                group = []
-                for restriction in cls.__blank_sep_RE.split(rgrp):
-                    match = cls.__restriction_RE.match(restriction)
-                    if match:
-                        parts = match.groupdict()
-                        group.append(cls.BuildRestriction(
-                                        parts['enabled'] != '!',
-                                        parts['profile'],
-                                    ))
-                restrictions.append(group)
-            return restrictions
-
-
-        def parse_rel(raw):
-            match = cls.__dep_RE.match(raw)
-            if match:
-                parts = match.groupdict()
-                d = {
-                        'name': parts['name'],
-                        'archqual': parts['archqual'],
-                        'version': None,
-                        'arch': None,
-                        'restrictions': None,
-                    }
-                if parts['relop'] or parts['version']:
-                    d['version'] = (parts['relop'], parts['version'])
-                if parts['archs']:
-                    d['arch'] = parse_archs(parts['archs'])
-                if parts['restrictions']:
-                    d['restrictions'] = parse_restrictions(parts['restrictions'])
-                return d
-            else:
-                warnings.warn('cannot parse package' \
-                      ' relationship "%s", returning it raw' % raw)
-                return { 'name': raw, 'version': None, 'arch': None }
+        rels, unparsed = cls.__parse_relations(raw)
+        return [[cls.__rel_dict(rel, unparsed) for rel in or_deps]
+                for or_deps in rels]
 
-        tl_deps = cls.__comma_sep_RE.split(raw.strip()) # top-level deps
-        cnf = map(cls.__pipe_sep_RE.split, tl_deps)
-        return [[parse_rel(or_dep) for or_dep in or_deps] for or_deps in cnf]
+    @staticmethod
+    def __rel_dict(rel, unparsed):
+        for u in unparsed:
+            if rel is u:
+                return { 'name': rel.name, 'version': None, 'arch': None }
+        return rel.as_dict()
+
+    @classmethod
+    def parse_relations_compact(cls, raw):
+        """Parse a package relationship string into immutable objects
+
+        This is like parse_relations, except that the result is a tuple
+        (AND) of tuples (OR) of Relation objects, rather than lists of lists
+        of dictionaries.  It takes several times less memory, and the same
+        objects are returned for the same strings, so they can be shared by
+        all the packages having the same relationships.
+        """
+        return cls.__parse_relations(raw)[0]
+
+    @classmethod
+    def __parse_relations(cls, raw):
+        """Parse raw, returning (relations, unparsed)
+
+        unparsed lists the Relation objects for relationships that could not
+        be parsed, and only have the raw text as their name.
+        """
+        rels = cls.__cache.get(raw)
+        if rels is not None:
+            return rels, ()
+
+        unparsed = []
+        rels = tuple(tuple(cls.__parse_rel(or_dep, unparsed)
+                           for or_dep in or_deps)
+                     for or_deps in map(cls.__pipe_sep_RE.split,
+                                        cls.__comma_sep_RE.split(raw.strip())))
+        if not unparsed:
+            # Relationships that could not be parsed aren't cached, so that
+            # the warning is issued every time.
+            cls.__cache.put(raw, rels)
+        return rels, unparsed
+
+    @classmethod
+    def __parse_rel(cls, raw, unparsed):
+        rel = cls.__rel_cache.get(raw)
+        if rel is not None:
+            return rel
+
+        match = cls.__dep_RE.match(raw)
+        if not match:
+            warnings.warn('cannot parse package' \
+                  ' relationship "%s", returning it raw' % raw)
+            rel = cls.Relation(raw, None, None, None, None)
+            unparsed.append(rel)
+            return rel
+
+        parts = match.groupdict()
+        version = None
+        arch = None
+        restrictions = None
+        if parts['relop'] or parts['version']:
+            version = (_intern(parts['relop']), parts['version'])
+        if parts['archs']:
+            arch = cls.__parse_archs(parts['archs'])
+        if parts['restrictions']:
+            restrictions = cls.__parse_restrictions(parts['restrictions'])
+        rel = cls.Relation(_intern(parts['name']), parts['archqual'],
+                           version, arch, restrictions)
+        cls.__rel_cache.put(raw, rel)
+        return rel
+
+    @classmethod
+    def __parse_archs(cls, raw):
+        # assumption: no space between '!' and architecture name
+        archs = []
+        for arch in cls.__blank_sep_RE.split(raw.strip()):
+            disabled = arch[0] == '!'
+            if disabled:
+                arch = arch[1:]
+            archs.append(cls.ArchRestriction(not disabled, _intern(arch)))
+        return tuple(archs)
+
+    @classmethod
+    def __parse_restrictions(cls, raw):
+        """ split a restriction formula into a list of restriction lists
+
+        Each term in the restriction list is a namedtuple of form:
+
+            (enabled, label)
+
+        where
+            enabled: boolean: whether the restriction is positive or negative
+            profile: the profile name of the term e.g. 'stage1'
+        """
+        restrictions = []
+        for rgrp in cls.__restriction_sep_RE.split(raw.lower().strip('<> ')):
+            group = []
+            for restriction in cls.__blank_sep_RE.split(rgrp):
+                match = cls.__restriction_RE.match(restriction)
+                if match:
+                    parts = match.groupdict()
+                    group.append(cls.BuildRestriction(
+                                    parts['enabled'] != '!',
+                                    _intern(parts['profile']),
+                                ))
+            restrictions.append(tuple(group))
+        return tuple(restrictions)
 
     @staticmethod
     def str(rels):
@@ -1023,11 +2400,43 @@ class PkgRelation(object):
         return ', '.join(map(pp_or_dep, rels))
 
 
-class _lowercase_dict(dict):
-    """Dictionary wrapper which lowercase keys upon lookup."""
+class _LazyRelations(collections.MutableMapping):
+    """The relations of a package, by lowercase field name
+
+    Fields are only parsed (with PkgRelation.parse_relations) the first time
+    they are looked up.  Keys are case-insensitive, like those of Deb822
+    objects.
+    """
+
+    def __init__(self, paragraph, names):
+        self.__paragraph = paragraph
+        self.__relations = {}
+        for name in names:
+            # None stands for a field not parsed yet
+            self.__relations[name.lower()] = None if name in paragraph else []
 
     def __getitem__(self, key):
-        return dict.__getitem__(self, key.lower())
+        key = key.lower()
+        value = self.__relations[key]
+        if value is None:
+            value = PkgRelation.parse_relations(self.__paragraph[key])
+            self.__relations[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self.__relations[key.lower()] = value
+
+    def __delitem__(self, key):
+        del self.__relations[key.lower()]
+
+    def __iter__(self):
+        return iter(self.__relations)
+
+    def __len__(self):
+        return len(self.__relations)
+
+    def __repr__(self):
+        return repr(dict(self))
 
 
 class _PkgRelationMixin(object):
@@ -1041,32 +2450,32 @@ class _PkgRelationMixin(object):
 
     To use, subclass _PkgRelationMixin from a class with a _relationship_fields
     attribute. It should be a list of field names for which structured access
-    is desired; for each of them a method wild be added to the inherited class.
-    The method name will be the lowercase version of field name; '-' will be
-    mangled as '_'. The method would return relationships in the same format of
-    the PkgRelation' relations property.
+    is desired; for each of them a property can be added to the inherited
+    class with _add_relation_properties.  The property name will be the
+    lowercase version of field name; '-' will be mangled as '_'. The property
+    returns relationships in the same format of the PkgRelation' relations
+    property.
 
     See Packages and Sources as examples.
     """
 
     def __init__(self, *args, **kwargs):
-        self.__relations = _lowercase_dict({})
-        self.__parsed_relations = False
-        for name in self._relationship_fields:
-            # To avoid reimplementing Deb822 key lookup logic we use a really
-            # simple dict subclass which just lowercase keys upon lookup. Since
-            # dictionary building happens only here, we ensure that all keys
-            # are in fact lowercase.
-            # With this trick we enable users to use the same key (i.e. field
-            # name) of Deb822 objects on the dictionary returned by the
-            # relations property.
-            keyname = name.lower()
-            if name in self:
-                self.__relations[keyname] = None   # lazy value
-                    # all lazy values will be expanded before setting
-                    # __parsed_relations to True
-            else:
-                self.__relations[keyname] = []
+        # Each field is parsed when it is first looked up in the relations
+        # mapping, so that users of a single field don't pay for the others.
+        # The mapping itself is only made when it's first asked for: it
+        # refers back to the paragraph, and until then, the paragraph can be
+        # freed as soon as it's dropped rather than by the garbage collector.
+        self.__relations = None
+
+    @classmethod
+    def _add_relation_properties(cls):
+        """Add a property for each of the _relationship_fields of cls"""
+        def make_property(name):
+            return property(lambda self: self.relations[name], None, None,
+                            'The parsed %s field (see relations)' % name)
+
+        for name in cls._relationship_fields:
+            setattr(cls, name.lower().replace('-', '_'), make_property(name))
 
     @property
     def relations(self):
@@ -1127,16 +2536,107 @@ class _PkgRelationMixin(object):
           "texlive <!cross>"                                becomes
           [ [ {'name': 'texlive',
                     'restriction': [[(false, 'cross')]]} ] ]
+
+        Each field is only parsed when it is first looked up in the
+        dictionary.  Its value can also be obtained with the property named
+        after the field, e.g. pkg.depends or src.build_depends_indep.
         """
-        if not self.__parsed_relations:
-            lazy_rels = filter(lambda n: self.__relations[n] is None,
-                    self.__relations.keys())
-            for n in lazy_rels:
-                self.__relations[n] = PkgRelation.parse_relations(self[n])
-            self.__parsed_relations = True
+        if self.__relations is None:
+            self.__relations = _LazyRelations(self, self._relationship_fields)
         return self.__relations
 
 
+class ChecksumTable(object):
+    """The lines of a multivalued field, like the SHA256 field of a Release
+    file or the Files field of a .dsc, stored column by column
+
+    The table has a list of values for each of its fields (e.g. "sha256",
+    "size" and "name"), with one value per line, instead of a Deb822Dict per
+    line.  Values are the strings they were parsed from, or None for the
+    fields missing from short lines.  Iterating over the table gives a tuple
+    of values for each line, in the order of fields.
+
+    Tables are read-only: the multivalued fields of _multivalued objects
+    are modified through the lists of Deb822Dicts they give as values.
+    """
+
+    def __init__(self, fields, rows=()):
+        """Build a table
+
+        :param fields: the names of the fields, in the order of the values
+            on each line.
+        :param rows: sequences of values, one for each line.
+        """
+        self.fields = tuple(fields)
+        self.__positions = dict((_strI(f), i)
+                                for i, f in enumerate(self.fields))
+        self.__columns = tuple(list(column) for column in
+                               self.__transpose(rows, len(self.fields)))
+        self.__names = None
+
+    @staticmethod
+    def __transpose(rows, width):
+        """Return the columns of rows, padded with None to width values"""
+        padding = [None] * width
+        rows = [(list(row) + padding)[:width] for row in rows]
+        if not rows:
+            return [[] for _ in range(width)]
+        return six.moves.zip(*rows)
+
+    @classmethod
+    def from_string(cls, contents, fields):
+        """Build the table of the lines of contents, the value of a
+        multivalued field with the given fields
+        """
+        return cls(fields, [line.split() for line in contents.splitlines()
+                            if line.strip()])
+
+    def __len__(self):
+        return len(self.__columns[0]) if self.__columns else 0
+
+    def __iter__(self):
+        return iter(six.moves.zip(*self.__columns))
+
+    def __getitem__(self, index):
+        """Return the values of the line at index, as a tuple"""
+        return tuple(column[index] for column in self.__columns)
+
+    def __repr__(self):
+        return 'ChecksumTable(%r, %r)' % (self.fields, list(self))
+
+    def column(self, field):
+        """Return the list of the values of field (case-insensitive), which
+        must not be modified
+
+        KeyError is raised if the table has no such field.
+        """
+        return self.__columns[self.__positions[_strI(field)]]
+
+    def index(self, name):
+        """Return the index of the (first) line for the file name
+
+        ValueError is raised if no line has that name.  The index of the
+        names is built the first time it is needed.
+        """
+        if self.__names is None:
+            names = {}
+            for i, value in enumerate(self.column('name')):
+                names.setdefault(value, i)
+            self.__names = names
+        try:
+            return self.__names[name]
+        except KeyError:
+            raise ValueError('%r is not in table' % name)
+
+    def to_list(self):
+        """Return the lines as a list of Deb822Dicts, like the ones that
+        _multivalued objects give for multi-line fields
+        """
+        return [Deb822Dict([(f, v) for f, v in zip(self.fields, row)
+                            if v is not None])
+                for row in self]
+
+
 class _multivalued(Deb822):
     """A class with (R/W) support for multivalued fields.
 
@@ -1146,24 +2646,114 @@ class _multivalued(Deb822):
     PdiffIndex as examples.
     """
 
+    # Multivalued fields are only split (into a list of Deb822Dicts, or a
+    # single Deb822Dict) when they are first looked up: paragraphs in which
+    # nobody looks at them can be dumped as they were parsed.  Until then,
+    # checksum_table and get_as_string use a ChecksumTable of their lines,
+    # kept in __tables.
+
     def __init__(self, *args, **kwargs):
+        self.__tables = {}
         Deb822.__init__(self, *args, **kwargs)
 
-        for field, fields in self._multivalued_fields.items():
+    def __getitem__(self, key):
+        value = Deb822.__getitem__(self, key)
+        if isinstance(value, six.string_types):
             try:
-                contents = self[field]
+                fields = self._multivalued_fields[key.lower()]
             except KeyError:
-                continue
+                return value
+            value = self._split_multivalued(value, fields)
+            # The value can be modified in place from now on, so the
+            # paragraph has to be assumed modified.
+            Deb822.__setitem__(self, key, value)
+            self.__tables.pop(_strI(key), None)
+        return value
 
-            if self.is_multi_line(contents):
-                self[field] = []
-                updater_method = self[field].append
-            else:
-                self[field] = Deb822Dict()
-                updater_method = self[field].update
+    def __setitem__(self, key, value):
+        self.__tables.pop(_strI(key), None)
+        Deb822.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self.__tables.pop(_strI(key), None)
+        Deb822.__delitem__(self, key)
+
+    def _split_multivalued(self, contents, fields):
+        if self.is_multi_line(contents):
+            value = []
+            updater_method = value.append
+        else:
+            value = Deb822Dict()
+            updater_method = value.update
+
+        for line in filter(None, contents.splitlines()):
+            updater_method(Deb822Dict(zip(fields, line.split())))
+        return value
 
-            for line in filter(None, contents.splitlines()):
-                updater_method(Deb822Dict(zip(fields, line.split())))
+    def checksum_table(self, key):
+        """Return the lines of the multivalued field key as a ChecksumTable
+
+        As long as the field has not been looked up as self[key], the table
+        is built from its text without a Deb822Dict per line, and kept for
+        the next calls.  Otherwise, it is a copy of the current contents of
+        the list (or Deb822Dict) that self[key] gives.  KeyError is raised
+        if key is not a multivalued field of the paragraph.
+        """
+        fields = self._multivalued_fields[key.lower()]
+        value = Deb822.__getitem__(self, key)
+        if isinstance(value, six.string_types):
+            key = _strI(key)
+            try:
+                return self.__tables[key]
+            except KeyError:
+                table = self.__tables[key] = ChecksumTable.from_string(
+                    value, fields)
+                return table
+        if hasattr(value, 'keys'):
+            value = [value]
+        return ChecksumTable(fields, ([item.get(f) for f in fields]
+                                      for item in value))
+
+    def checksums_for(self, name):
+        """Return what the multivalued fields say about the file name
+
+        The result is a Deb822Dict with the name, size and digests (and,
+        for Changes, section and priority) of the file, gathered from all
+        the multivalued fields listing it, e.g. {'name': ..., 'size': ...,
+        'md5sum': ..., 'sha256': ...} for a file of a Release file.  Files
+        are found through the name index of the checksum_table of each
+        field; the fields that have been looked up as self[key] (and may
+        have been modified since) are searched instead.  KeyError is raised
+        if no field lists the file.
+        """
+        result = Deb822Dict()
+        for key in self:
+            fields = self._multivalued_fields.get(key.lower())
+            if fields is None or 'name' not in fields:
+                continue
+            value = Deb822.__getitem__(self, key)
+            if isinstance(value, six.string_types):
+                table = self.checksum_table(key)
+                try:
+                    row = table[table.index(name)]
+                except ValueError:
+                    continue
+                found = zip(table.fields, row)
+            else:
+                if hasattr(value, 'keys'):
+                    value = [value]
+                for item in value:
+                    if item.get('name') == name:
+                        found = item.items()
+                        break
+                else:
+                    continue
+            for field, v in found:
+                if v is not None and field not in result:
+                    result[field] = v
+        if not result:
+            raise KeyError(name)
+        return result
 
     def validate_input(self, key, value):
         if key.lower() in self._multivalued_fields:
@@ -1179,20 +2769,30 @@ class _multivalued(Deb822):
         keyl = key.lower()
         if keyl in self._multivalued_fields:
             fd = StringIO()
-            if hasattr(self[key], 'keys'): # single-line
-                array = [ self[key] ]
-            else: # multi-line
+            value = Deb822.__getitem__(self, key)
+            if isinstance(value, six.string_types):
+                # Not split yet: write the lines of the table
+                multi_line = self.is_multi_line(value)
+                table = self.checksum_table(key)
+                order = table.fields
+                rows = iter(table)
+            else:
+                multi_line = not hasattr(value, 'keys')
+                array = value if multi_line else [value]
+                order = self._multivalued_fields[keyl]
+                rows = ([item[x] for x in order] for item in array)
+            if multi_line:
                 fd.write(six.u("\n"))
-                array = self[key]
 
-            order = self._multivalued_fields[keyl]
             try:
                 field_lengths = self._fixed_field_lengths
             except AttributeError:
                 field_lengths = {}
-            for item in array:
-                for x in order:
-                    raw_value = six.text_type(item[x])
+            for row in rows:
+                for x, raw_value in zip(order, row):
+                    if raw_value is None:
+                        raise KeyError(x)
+                    raw_value = six.text_type(raw_value)
                     try:
                         length = field_lengths[keyl][x]
                     except KeyError:
@@ -1218,7 +2818,8 @@ class _gpg_multivalued(_multivalued):
 
     This class only stores raw text if it is given a raw string, or if it
     detects a gpg signature when given a file or sequence of lines (see
-    Deb822.split_gpg_and_payload for details).
+    Deb822.split_gpg_and_payload for details).  The exact bytes of signed
+    messages read from files opened in binary mode are kept.
     """
 
     def __init__(self, *args, **kwargs):
@@ -1227,6 +2828,13 @@ class _gpg_multivalued(_multivalued):
         except IndexError:
             sequence = kwargs.get("sequence", None)
 
+        if isinstance(sequence, (io.BufferedIOBase, io.RawIOBase)):
+            sequence = self._read_if_signed(sequence)
+            if args:
+                args = (sequence,) + tuple(args[1:])
+            else:
+                kwargs["sequence"] = sequence
+
         if sequence is not None:
             # If the input is a unicode object or a file opened in text mode,
             # we'll need to encode it back to bytes for gpg.  If it's not
@@ -1268,6 +2876,30 @@ class _gpg_multivalued(_multivalued):
 
         _multivalued.__init__(self, *args, **kwargs)
 
+    @staticmethod
+    def _read_if_signed(f):
+        """Return the signed message at the start of the binary file f as
+        bytes, or an iterator over its lines if it doesn't start with one
+
+        Only the lines up to the first non-blank one are read to tell, so
+        that unsigned paragraphs are still read one at a time.  Signed
+        messages are read up to the end of their signature (like
+        split_gpg_and_payload does), leaving the paragraphs after them in f.
+        """
+        head = []
+        for line in iter(f.readline, b''):
+            head.append(line)
+            if line.strip():
+                break
+        if not head or not head[-1].startswith(_gpg_armor_start):
+            return itertools.chain(head, f)
+        for line in iter(f.readline, b''):
+            head.append(line)
+            m = line.startswith(b'-----') and _gpg_armor_re.match(line)
+            if m and m.group('action') == b'END':
+                break
+        return b''.join(head)
+
     @staticmethod
     def _bytes(s, encoding):
         """Converts s to bytes if necessary, using encoding.
@@ -1377,6 +3009,8 @@ class Release(_multivalued):
     def _fixed_field_lengths(self):
         fixed_field_lengths = {}
         for key in self._multivalued_fields:
+            if key not in self:
+                continue
             length = self._get_size_field_length(key)
             fixed_field_lengths[key] = {"size": length}
         return fixed_field_lengths
@@ -1385,11 +3019,330 @@ class Release(_multivalued):
         if self.size_field_behavior == "apt-ftparchive":
             return 16
         elif self.size_field_behavior == "dak":
-            lengths = [len(str(item['size'])) for item in self[key]]
+            lengths = [len(str(size))
+                       for size in self.checksum_table(key).column('size')]
             return max(lengths)
 
 
-class Sources(Dsc, _PkgRelationMixin):
+class FileCheck(collections.namedtuple(
+        'FileCheck', 'name path status size mismatched error')):
+    """The result of the check of a file by ChecksumVerifier
+
+    status is one of "ok", "missing", "size" (the size of the file isn't the
+    expected one, and it wasn't hashed), "checksum" (mismatched is then
+    the tuple of the names of the fields, e.g. "sha256", whose digests
+    differ) or "error" (the file couldn't be read, e.g. for lack of
+    permission or because it is a directory; error is then the message of
+    the exception, and is None otherwise).  size is the actual size of the
+    file, or None if it is missing or couldn't be read.
+    """
+
+    __slots__ = ()
+
+
+class ChecksumVerifier(object):
+    """Check the files listed in Changes, Dsc or Release objects against
+    their sizes and checksums
+
+    Each file is read once, in blocks of buffer_size bytes, and all its
+    digests (among md5sum, sha1, sha256 and sha512) are computed in that
+    single pass.  Files whose size isn't the expected one aren't read at
+    all.  Up to workers files are checked at the same time, hashlib
+    releasing the GIL while hashing large blocks:
+
+        verifier = ChecksumVerifier()
+        results = verifier.verify(release, 'dists/sid')
+        failed = [r for r in results if r.status != 'ok']
+    """
+
+    # The hashlib names of the fields of _multivalued_fields
+    hash_names = {
+        'md5sum': 'md5',
+        'sha1': 'sha1',
+        'sha256': 'sha256',
+        'sha512': 'sha512',
+    }
+
+    def __init__(self, workers=None, buffer_size=1024 * 1024):
+        """Create a verifier
+
+        :param workers: the maximum number of files checked at the same
+            time (default: the number of CPUs)
+        :param buffer_size: the size of the blocks files are read in
+        """
+        self.workers = workers or multiprocessing.cpu_count()
+        self.buffer_size = buffer_size
+
+    def check_file(self, path, expected, name=None):
+        """Check the file at path, and return a FileCheck
+
+        :param expected: a mapping (like the ones returned by
+            _multivalued.checksums_for) of the expected size and digests
+            of the file, under the names of their multivalued fields (e.g.
+            "size" and "sha256"); other keys are ignored.
+        :param name: the name of the file in the FileCheck (default: path)
+        """
+        if name is None:
+            name = path
+        try:
+            return self.__check_file(path, expected, name)
+        except EnvironmentError as e:
+            if e.errno == errno.ENOENT:
+                return FileCheck(name, path, 'missing', None, (), None)
+            return FileCheck(name, path, 'error', None, (), str(e))
+
+    def __check_file(self, path, expected, name):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            expected_size = expected.get('size')
+            if expected_size is not None and int(expected_size) != size:
+                return FileCheck(name, path, 'size', size, (), None)
+            hashes = []
+            for field in expected:
+                hash_name = self.hash_names.get(field.lower())
+                if hash_name is not None:
+                    hashes.append((field, hashlib.new(hash_name)))
+            if hashes:
+                buf = bytearray(self.buffer_size)
+                view = memoryview(buf)
+                updates = [h.update for _, h in hashes]
+                while True:
+                    n = f.readinto(buf)
+                    if not n:
+                        break
+                    block = view[:n]
+                    for update in updates:
+                        update(block)
+        mismatched = tuple(field for field, h in hashes
+                           if h.hexdigest() != expected[field].lower())
+        if mismatched:
+            return FileCheck(name, path, 'checksum', size, mismatched, None)
+        return FileCheck(name, path, 'ok', size, (), None)
+
+    def verify(self, paragraph, directory='.'):
+        """Check the files listed in the multivalued fields of paragraph (a
+        Changes, Dsc or Release object), whose names are relative to
+        directory
+
+        Return the list of their FileCheck tuples, in the order in which
+        the files are first listed.
+        """
+        names = []
+        seen = set()
+        for key in paragraph:
+            fields = paragraph._multivalued_fields.get(key.lower())
+            if fields is None or 'name' not in fields:
+                continue
+            for name in paragraph.checksum_table(key).column('name'):
+                if name is not None and name not in seen:
+                    seen.add(name)
+                    names.append(name)
+        todo = [(name, os.path.join(directory, name),
+                 paragraph.checksums_for(name)) for name in names]
+        if not todo:
+            return []
+        pool = multiprocessing.pool.ThreadPool(min(self.workers, len(todo)))
+        try:
+            return pool.map(
+                lambda item: self.check_file(item[1], item[2], item[0]),
+                todo, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+
+class ParagraphIndex(object):
+    """Byte-offset index of the paragraphs of a Packages or Sources file
+
+    The index maps each (Package, Version, Architecture) triple found in the
+    file to the offset and length of its paragraph, so that a single
+    paragraph can be parsed without scanning the file.  It can be saved to a
+    small sidecar file (by default the indexed file's name with ".idx"
+    appended) along with the size, modification time and SHA-256 digest of
+    the indexed file.  A saved index is considered stale when the size
+    differs, or when the modification time differs and the digest does too.
+    """
+
+    FORMAT_VERSION = 1
+
+    # The indexes most recently used in this process, by (filename,
+    # index_filename)
+    __cache = _LRUCache(64)
+
+    def __init__(self, filename, entries, size, mtime, digest):
+        self.filename = filename
+        self.size = size
+        self.mtime = mtime
+        self.digest = digest
+        self.entries = entries
+        self.__by_name = {}
+        for entry in entries:
+            self.__by_name.setdefault(entry[0], []).append(entry)
+
+    @classmethod
+    def build(cls, filename, encoding="utf-8"):
+        """Scan filename and return a new index of its paragraphs"""
+        entries = []
+        with open(filename, 'rb') as f:
+            st = os.fstat(f.fileno())
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files can't be mapped.
+                return cls(filename, entries, st.st_size, st.st_mtime,
+                           hashlib.sha256().hexdigest())
+        for start, end in _iter_paragraph_spans(mapped):
+            section = _BufferSection(mapped, encoding,
+                                     ('Package', 'Version', 'Architecture'),
+                                     start, end)
+            if 'Package' not in section:
+                continue
+            key = [section[k].decode(encoding) if k in section else None
+                   for k in ('Package', 'Version', 'Architecture')]
+            entries.append(tuple(key) + (start, end - start))
+        digest = hashlib.sha256(mapped).hexdigest()
+        return cls(filename, entries, st.st_size, st.st_mtime, digest)
+
+    @staticmethod
+    def _default_index_filename(filename):
+        return filename + '.idx'
+
+    @staticmethod
+    def _file_digest(filename):
+        digest = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def is_current(self):
+        """Return whether the indexed file is unchanged since indexing"""
+        try:
+            st = os.stat(self.filename)
+        except OSError:
+            return False
+        if st.st_size != self.size:
+            return False
+        if st.st_mtime == self.mtime:
+            return True
+        if self._file_digest(self.filename) != self.digest:
+            return False
+        # Only touched; no need to hash it again next time.
+        self.mtime = st.st_mtime
+        return True
+
+    def save(self, index_filename=None):
+        """Write the index to index_filename (atomically)"""
+        if index_filename is None:
+            index_filename = self._default_index_filename(self.filename)
+        data = {
+            'format': self.FORMAT_VERSION,
+            'size': self.size,
+            'mtime': self.mtime,
+            'sha256': self.digest,
+            'paragraphs': self.entries,
+        }
+        # Processes rebuilding the same index each write their own
+        # temporary file
+        fd, tmp_filename = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(index_filename)))
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.rename(tmp_filename, index_filename)
+        except Exception:
+            os.remove(tmp_filename)
+            raise
+
+    @classmethod
+    def load(cls, filename, index_filename=None):
+        """Load the saved index of filename
+
+        Returns None if there is no usable index for filename, i.e. if the
+        sidecar file is missing, unreadable or stale.
+        """
+        if index_filename is None:
+            index_filename = cls._default_index_filename(filename)
+        try:
+            with open(index_filename) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if data.get('format') != cls.FORMAT_VERSION:
+            return None
+        index = cls(filename, [tuple(e) for e in data['paragraphs']],
+                    data['size'], data['mtime'], data['sha256'])
+        if not index.is_current():
+            return None
+        return index
+
+    @classmethod
+    def open(cls, filename, index_filename=None, encoding="utf-8"):
+        """Return an up-to-date index for filename
+
+        The index is taken from this process's cache or the sidecar file if
+        they are current; otherwise the file is indexed again and the
+        sidecar file rewritten (if it can be).
+        """
+        cache_key = (filename, index_filename)
+        index = cls.__cache.get(cache_key)
+        if index is None or not index.is_current():
+            index = cls.load(filename, index_filename)
+        if index is None:
+            index = cls.build(filename, encoding)
+            try:
+                index.save(index_filename)
+            except (IOError, OSError):
+                # A read-only mirror can still be looked up; we'll just have
+                # to scan it again next time.
+                pass
+        cls.__cache.put(cache_key, index)
+        return index
+
+    def find(self, package, version=None, architecture=None):
+        """Return (offset, length) of each matching paragraph, in file order"""
+        return [(e[3], e[4]) for e in self.__by_name.get(package, [])
+                if (version is None or e[1] == version) and
+                   (architecture is None or e[2] == architecture)]
+
+
+class _IndexedLookupMixin(object):
+    """Mixin giving Deb822 subclasses indexed access to Packages/Sources files
+
+    See ParagraphIndex.
+    """
+
+    @classmethod
+    def lookup(cls, filename, package, version=None, architecture=None,
+               index_filename=None, encoding="utf-8"):
+        """Return the paragraphs of filename for the given package
+
+        Only the matching paragraphs are read and parsed, using a byte-offset
+        index of the file (see ParagraphIndex) that is created or refreshed
+        as needed.
+
+        :param filename: name of the Packages or Sources file
+        :param package: value of the Package field to look for
+        :param version: if given, only return paragraphs with that Version
+        :param architecture: if given, only return paragraphs with that
+            Architecture
+        :param index_filename: name of the sidecar file holding the index
+            (default: filename with ".idx" appended)
+        :param encoding: encoding of the file
+        :returns: a (possibly empty) list of objects of this class
+        """
+        index = ParagraphIndex.open(filename, index_filename, encoding)
+        paragraphs = []
+        with open(filename, 'rb') as f:
+            for offset, length in index.find(package, version, architecture):
+                f.seek(offset)
+                paragraphs.append(cls(
+                    _parsed=_BufferSection(f.read(length), encoding),
+                    encoding=encoding))
+        return paragraphs
+
+
+class Sources(Dsc, _PkgRelationMixin, _IndexedLookupMixin):
     """Represent an APT source package list"""
 
     _relationship_fields = [ 'build-depends', 'build-depends-indep',
@@ -1401,7 +3354,9 @@ class Sources(Dsc, _PkgRelationMixin):
 
     @classmethod
     def iter_paragraphs(cls, sequence, fields=None, use_apt_pkg=True,
-                        shared_storage=False, encoding="utf-8"):
+                        shared_storage=False, encoding="utf-8",
+                        use_mmap=False, threaded_decompression=False,
+                        query=None, keep_raw=False):
         """Generator that yields a Deb822 object for each paragraph in Sources.
 
         Note that this overloaded form of the generator uses apt_pkg (a strict
@@ -1410,10 +3365,12 @@ class Sources(Dsc, _PkgRelationMixin):
         See the Deb822.iter_paragraphs function for details.
         """
         return super(Sources, cls).iter_paragraphs(sequence, fields,
-                                    use_apt_pkg, shared_storage, encoding)
+                                    use_apt_pkg, shared_storage, encoding,
+                                    use_mmap, threaded_decompression, query,
+                                    keep_raw)
 
 
-class Packages(Deb822, _PkgRelationMixin):
+class Packages(Deb822, _PkgRelationMixin, _IndexedLookupMixin):
     """Represent an APT binary package list"""
 
     _relationship_fields = [ 'depends', 'pre-depends', 'recommends',
@@ -1426,7 +3383,9 @@ class Packages(Deb822, _PkgRelationMixin):
 
     @classmethod
     def iter_paragraphs(cls, sequence, fields=None, use_apt_pkg=True,
-                        shared_storage=False, encoding="utf-8"):
+                        shared_storage=False, encoding="utf-8",
+                        use_mmap=False, threaded_decompression=False,
+                        query=None, keep_raw=False):
         """Generator that yields a Deb822 object for each paragraph in Packages.
 
         Note that this overloaded form of the generator uses apt_pkg (a strict
@@ -1435,7 +3394,13 @@ class Packages(Deb822, _PkgRelationMixin):
         See the Deb822.iter_paragraphs function for details.
         """
         return super(Packages, cls).iter_paragraphs(sequence, fields,
-                                    use_apt_pkg, shared_storage, encoding)
+                                    use_apt_pkg, shared_storage, encoding,
+                                    use_mmap, threaded_decompression, query,
+                                    keep_raw)
+
+
+Sources._add_relation_properties()
+Packages._add_relation_properties()
 
 
 class _ClassInitMeta(type):
@@ -1727,6 +3692,9 @@ class _CaseInsensitiveString(str):
     """
 
     def __new__(cls, str_):
+        if type(str_) is cls:
+            # Immutable, so there's no need for a copy
+            return str_
         s = str.__new__(cls, str_)
         s.str_lower = str_.lower()
         s.str_lower_hash = hash(s.str_lower)
@@ -1735,6 +3703,11 @@ class _CaseInsensitiveString(str):
     def __hash__(self):
         return self.str_lower_hash
 
+    def __reduce__(self):
+        # The cached hash must not be pickled: it isn't the same in another
+        # interpreter (e.g. a worker of iter_paragraphs_parallel).
+        return (self.__class__, (str(self),))
+
     def __eq__(self, other):
         return self.str_lower == other.lower()
 
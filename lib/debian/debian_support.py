@@ -20,10 +20,21 @@
 
 from __future__ import absolute_import, print_function
 
+import array
+import bisect
+import io
 import os
 import re
+import struct
+import threading
 import types
 
+try:
+    import queue
+except ImportError:
+    # Python 2.x
+    import Queue as queue
+
 from debian.deprecation import function_deprecated_by
 
 try:
@@ -110,19 +121,27 @@ class BaseVersion(object):
     def __init__(self, version):
         self.full_version = version
 
-    def _set_full_version(self, version):
-        m = self.re_valid_version.match(version)
+    @classmethod
+    def _split(cls, version):
+        """Return the epoch, upstream_version and debian_revision of the
+        version string version, or raise ValueError if it is invalid
+        """
+        m = cls.re_valid_version.match(version)
         if not m:
             raise ValueError("Invalid version string %r" % version)
         # If there no epoch ("1:..."), then the upstream version can not
         # contain a :.
         if (m.group("epoch") is None and ":" in m.group("upstream_version")):
             raise ValueError("Invalid version string %r" % version)
+        return m.group("epoch", "upstream_version", "debian_revision")
 
+    def _set_full_version(self, version):
+        epoch, upstream_version, debian_revision = self._split(version)
         self.__full_version = version
-        self.__epoch = m.group("epoch")
-        self.__upstream_version = m.group("upstream_version")
-        self.__debian_revision = m.group("debian_revision")
+        self.__epoch = epoch
+        self.__upstream_version = upstream_version
+        self.__debian_revision = debian_revision
+        self.__sort_key = None
 
     def __setattr__(self, attr, value):
         if attr not in self.magic_attrs:
@@ -176,6 +195,18 @@ class BaseVersion(object):
     def __repr__(self):
         return "%s('%s')" % (self.__class__.__name__, self)
 
+    @property
+    def sort_key(self):
+        """A tuple that orders versions the way dpkg does
+
+        It is computed once, so sorting versions, or comparing them over
+        and over, only compares tuples (see also version_sort_key).
+        """
+        if self.__sort_key is None:
+            self.__sort_key = _version_sort_key(
+                self.__epoch, self.__upstream_version, self.__debian_revision)
+        return self.__sort_key
+
     def _compare(self, other):
         raise NotImplementedError
 
@@ -230,25 +261,16 @@ class NativeVersion(BaseVersion):
         # (All we need is epoch, upstream_version, and debian_revision
         # attributes, which BaseVersion gives us.) Requires other's string
         # representation to be the raw version.
-        if not isinstance(other, BaseVersion):
+        if not isinstance(other, (BaseVersion, FrozenVersion)):
             try:
                 other = BaseVersion(str(other))
             except ValueError as e:
                 raise ValueError("Couldn't convert %r to BaseVersion: %s"
                                  % (other, e))
 
-        lepoch = int(self.epoch or "0")
-        repoch = int(other.epoch or "0")
-        if lepoch < repoch:
-            return -1
-        elif lepoch > repoch:
-            return 1
-        res = self._version_cmp_part(self.upstream_version,
-                                     other.upstream_version)
-        if res != 0:
-            return res
-        return self._version_cmp_part(self.debian_revision or "0",
-                                      other.debian_revision or "0")
+        a = self.sort_key
+        b = other.sort_key
+        return (a > b) - (a < b)
 
     @classmethod
     def _order(cls, x):
@@ -264,44 +286,15 @@ class NativeVersion(BaseVersion):
 
     @classmethod
     def _version_cmp_string(cls, va, vb):
-        la = [cls._order(x) for x in va]
-        lb = [cls._order(x) for x in vb]
-        while la or lb:
-            a = 0
-            b = 0
-            if la:
-                a = la.pop(0)
-            if lb:
-                b = lb.pop(0)
-            if a < b:
-                return -1
-            elif a > b:
-                return 1
-        return 0
+        la = _version_string_key(va)
+        lb = _version_string_key(vb)
+        return (la > lb) - (la < lb)
 
     @classmethod
     def _version_cmp_part(cls, va, vb):
-        la = cls.re_all_digits_or_not.findall(va)
-        lb = cls.re_all_digits_or_not.findall(vb)
-        while la or lb:
-            a = "0"
-            b = "0"
-            if la:
-                a = la.pop(0)
-            if lb:
-                b = lb.pop(0)
-            if cls.re_digits.match(a) and cls.re_digits.match(b):
-                a = int(a)
-                b = int(b)
-                if a < b:
-                    return -1
-                elif a > b:
-                    return 1
-            else:
-                res = cls._version_cmp_string(a, b)
-                if res != 0:
-                    return res
-        return 0
+        la = _version_part_key(va)
+        lb = _version_part_key(vb)
+        return (la > lb) - (la < lb)
 
 if _have_apt_pkg:
     class Version(AptPkgVersion):
@@ -310,15 +303,639 @@ else:
     class Version(NativeVersion):
         pass
 
+
+class FrozenVersion(object):
+    """An immutable Debian version, shared by equal version strings
+
+    FrozenVersion("2.36-9") only parses the version string the first time
+    it is given, and then returns the same object, as long as it stays in a
+    global bounded cache (see set_cache_size).  The attributes are those of
+    Version, as plain slots, but they can't be changed.  Comparisons (with
+    FrozenVersion and Version objects, or version strings) follow the order
+    of dpkg, using sort_key.
+    """
+
+    __slots__ = ('full_version', 'epoch', 'upstream_version',
+                 'debian_revision', '_sort_key')
+
+    __cache = {}
+    __cache_size = 65536
+
+    def __new__(cls, version):
+        if isinstance(version, FrozenVersion):
+            return version
+        version = str(version)
+        cache = FrozenVersion.__cache
+        try:
+            return cache[version]
+        except KeyError:
+            pass
+        self = super(FrozenVersion, cls).__new__(cls)
+        init = super(FrozenVersion, self).__setattr__
+        init('full_version', version)
+        for attr, value in zip(('epoch', 'upstream_version',
+                                'debian_revision'),
+                               BaseVersion._split(version)):
+            init(attr, value)
+        init('_sort_key', None)
+        size = FrozenVersion.__cache_size
+        if size:
+            if len(cache) >= size:
+                cache.clear()
+            cache[version] = self
+        return self
+
+    @classmethod
+    def set_cache_size(cls, maxsize):
+        """Set the number of versions kept in the cache
+
+        The cache is emptied when it is full.  A size of 0 disables it.
+        """
+        FrozenVersion.__cache_size = maxsize
+        FrozenVersion.__cache.clear()
+
+    @classmethod
+    def cache_clear(cls):
+        """Empty the cache of versions"""
+        FrozenVersion.__cache.clear()
+
+    def __setattr__(self, attr, value):
+        raise AttributeError("FrozenVersion objects are immutable")
+
+    __delattr__ = __setattr__
+
+    def __reduce__(self):
+        return (FrozenVersion, (self.full_version,))
+
+    @property
+    def debian_version(self):
+        # For compatibility with the old changelog.Version class
+        return self.debian_revision
+
+    @property
+    def sort_key(self):
+        """A tuple that orders versions the way dpkg does"""
+        key = self._sort_key
+        if key is None:
+            key = _version_sort_key(self.epoch, self.upstream_version,
+                                    self.debian_revision)
+            super(FrozenVersion, self).__setattr__('_sort_key', key)
+        return key
+
+    def __str__(self):
+        return self.full_version
+
+    def __repr__(self):
+        return "%s('%s')" % (self.__class__.__name__, self)
+
+    def __lt__(self, other):
+        return self.sort_key < version_sort_key(other)
+
+    def __le__(self, other):
+        return self.sort_key <= version_sort_key(other)
+
+    def __eq__(self, other):
+        return self is other or self.sort_key == version_sort_key(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __ge__(self, other):
+        return self.sort_key >= version_sort_key(other)
+
+    def __gt__(self, other):
+        return self.sort_key > version_sort_key(other)
+
+    def __hash__(self):
+        return hash(self.full_version)
+
+
+class _VersionCharOrders(dict):
+    """The order of the characters of versions, as given by
+    NativeVersion._order, computed once for each character
+    """
+
+    def __missing__(self, c):
+        order = self[c] = NativeVersion._order(c)
+        return order
+
+_version_char_orders = _VersionCharOrders()
+
+_re_version_part = re.compile(r"(\D*)(\d*)")
+
+def _version_string_key(s):
+    """Return the sort key of a string of non-digits of a version
+
+    Characters are ordered as in dpkg, and the key ends with a 0, which
+    sorts like the end of the string: after "~" and before anything else.
+    """
+    orders = _version_char_orders
+    return tuple([orders[c] for c in s] + [0])
+
+def _version_part_key(part):
+    """Return the sort key of an upstream version or debian revision
+
+    The key alternates the keys of the runs of non-digits and the values of
+    the runs of digits, like dpkg does when comparing them, and ends with
+    the key of an empty run of non-digits, so that a version sorts before
+    its own extensions unless they start with "~".
+    """
+    key = []
+    for nondigits, digits in _re_version_part.findall(part):
+        if nondigits or digits:
+            key.append(_version_string_key(nondigits))
+            key.append(int(digits or 0))
+    key.append((0,))
+    return tuple(key)
+
+def _version_sort_key(epoch, upstream_version, debian_revision):
+    return (int(epoch or 0), _version_part_key(upstream_version),
+            _version_part_key(debian_revision or "0"))
+
+def version_sort_key(version):
+    """Return a tuple that orders Debian versions the way dpkg does
+
+    version may be a version string, or a Version or FrozenVersion object.
+    For instance, sorted(versions, key=version_sort_key) sorts a list of
+    version strings without creating Version objects.  ValueError is raised
+    for invalid versions.
+    """
+    if isinstance(version, (FrozenVersion, BaseVersion)):
+        return version.sort_key
+    return _version_sort_key(*BaseVersion._split(str(version)))
+
+# Translation of the non-digits of versions into bytes that sort like
+# them: "~" first, then letters, then the other characters, leaving 2 to
+# mark the end of the non-digits (see _version_part_key).
+_version_bytes_table = bytearray(range(256))
+for _c in range(128):
+    if not chr(_c).isalpha():
+        _version_bytes_table[_c] = _c + 128
+_version_bytes_table[ord('~')] = 1
+_version_bytes_table = bytes(_version_bytes_table)
+del _c
+
+def _version_number_bytes(digits):
+    digits = digits.lstrip('0')
+    return struct.pack('>H', len(digits)) + digits.encode('ascii')
+
+def _version_part_bytes(part):
+    chunks = []
+    for nondigits, digits in _re_version_part.findall(part):
+        if nondigits or digits:
+            chunks.append(nondigits.encode('ascii').translate(
+                _version_bytes_table))
+            chunks.append(b'\x02')
+            chunks.append(_version_number_bytes(digits))
+    chunks.append(b'\x02')
+    return b''.join(chunks)
+
+def _version_bytes(version):
+    """Return sort_key encoded as bytes which compare the same way
+
+    Numbers are written with their length first, and the non-digits end
+    with a byte lower than all the characters but "~", so that comparing
+    the bytes compares the versions.
+    """
+    epoch, upstream_version, debian_revision = BaseVersion._split(
+        str(version))
+    return (_version_number_bytes(epoch or '') +
+            _version_part_bytes(upstream_version) +
+            _version_part_bytes(debian_revision or '0'))
+
+def _version_bytes_of(versions):
+    """Return the keys of versions as given by _version_bytes, encoding
+    each distinct version once
+    """
+    cache = {}
+    keys = []
+    for version in versions:
+        version = str(version)
+        try:
+            key = cache[version]
+        except KeyError:
+            key = cache[version] = _version_bytes(version)
+        keys.append(key)
+    return keys
+
+def compare_versions(a, b):
+    """Compare the versions of two sequences, pair by pair
+
+    Return an array of -1, 0 or 1, like version_compare(a[i], b[i]) for each
+    i, but much faster on long sequences: each distinct version is only
+    parsed once, into bytes that are then compared directly.
+    """
+    keys_a = _version_bytes_of(a)
+    keys_b = _version_bytes_of(b)
+    if len(keys_a) != len(keys_b):
+        raise ValueError("sequences of different lengths: %d and %d"
+                         % (len(keys_a), len(keys_b)))
+    return array.array('b', [(ka > kb) - (ka < kb)
+                             for ka, kb in zip(keys_a, keys_b)])
+
+def argsort_versions(versions):
+    """Return the list of the indices of versions, in the order that sorts
+    them (from the oldest version to the newest)
+
+    Equal versions keep their order.
+    """
+    keys = _version_bytes_of(versions)
+    return sorted(range(len(keys)), key=keys.__getitem__)
+
 def version_compare(a, b):
-    va = Version(a)
-    vb = Version(b)
-    if va < vb:
-        return -1
-    elif va > vb:
-        return 1
+    if _have_apt_pkg:
+        va = Version(a)
+        vb = Version(b)
+        if va < vb:
+            return -1
+        elif va > vb:
+            return 1
+        else:
+            return 0
+    ka = version_sort_key(a)
+    kb = version_sort_key(b)
+    return (ka > kb) - (ka < kb)
+
+class VersionIndex(object):
+    """A set of (package name, version) pairs, indexed for version queries
+
+    The versions of each package are kept sorted in the order of dpkg, as
+    FrozenVersion objects, so that the versions of a package in a range, or
+    the closest version below or above a given one, are found with binary
+    searches.  Pairs can be added and removed at any time, e.g. as Packages
+    files are updated:
+
+        index = VersionIndex((p['Package'], p['Version']) for p in packages)
+        vulnerable = index.range('openssl', high=fixed_version)
+
+    Versions that are equal for dpkg (e.g. "1.0" and "1.0-0") are the same
+    version for the index.
+    """
+
+    def __init__(self, pairs=()):
+        by_name = {}
+        for name, version in pairs:
+            by_name.setdefault(name, []).append(FrozenVersion(version))
+        self.__keys = {}
+        self.__versions = {}
+        self.__len = 0
+        for name, versions in by_name.items():
+            versions.sort(key=version_sort_key)
+            keys = []
+            unique = []
+            for version in versions:
+                key = version.sort_key
+                if not keys or keys[-1] != key:
+                    keys.append(key)
+                    unique.append(version)
+            self.__keys[name] = keys
+            self.__versions[name] = unique
+            self.__len += len(unique)
+
+    def __len__(self):
+        return self.__len
+
+    def __iter__(self):
+        for name, versions in self.__versions.items():
+            for version in versions:
+                yield name, version
+
+    def __contains__(self, pair):
+        name, version = pair
+        keys = self.__keys.get(name)
+        if not keys:
+            return False
+        key = version_sort_key(version)
+        i = bisect.bisect_left(keys, key)
+        return i < len(keys) and keys[i] == key
+
+    def names(self):
+        """Return the names of the packages having versions in the index"""
+        return list(self.__versions)
+
+    def add(self, name, version):
+        """Add a version of package name, unless it is already there"""
+        version = FrozenVersion(version)
+        key = version.sort_key
+        keys = self.__keys.setdefault(name, [])
+        versions = self.__versions.setdefault(name, [])
+        i = bisect.bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            return
+        keys.insert(i, key)
+        versions.insert(i, version)
+        self.__len += 1
+
+    def discard(self, name, version):
+        """Remove a version of package name, if it is there"""
+        keys = self.__keys.get(name)
+        if not keys:
+            return
+        key = version_sort_key(version)
+        i = bisect.bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            del keys[i]
+            del self.__versions[name][i]
+            self.__len -= 1
+            if not keys:
+                del self.__keys[name]
+                del self.__versions[name]
+
+    def remove(self, name, version):
+        """Remove a version of package name, raising KeyError if it isn't
+        there
+        """
+        if (name, version) not in self:
+            raise KeyError((name, version))
+        self.discard(name, version)
+
+    def versions(self, name):
+        """Return the versions of package name, from the oldest"""
+        return list(self.__versions.get(name, ()))
+
+    def range(self, name, low=None, high=None, include_low=True,
+              include_high=False):
+        """Return the versions of package name between low and high
+
+        The range is [low, high) by default: include_low and include_high
+        tell whether the bounds themselves are included.  A bound of None
+        means no bound.  Versions are returned from the oldest.
+        """
+        keys = self.__keys.get(name)
+        if not keys:
+            return []
+        start = 0
+        end = len(keys)
+        if low is not None:
+            key = version_sort_key(low)
+            if include_low:
+                start = bisect.bisect_left(keys, key)
+            else:
+                start = bisect.bisect_right(keys, key)
+        if high is not None:
+            key = version_sort_key(high)
+            if include_high:
+                end = bisect.bisect_right(keys, key)
+            else:
+                end = bisect.bisect_left(keys, key)
+        return self.__versions[name][start:end]
+
+    def floor(self, name, version):
+        """Return the newest version of package name that is not newer than
+        version, or None if there is none
+        """
+        keys = self.__keys.get(name)
+        if not keys:
+            return None
+        i = bisect.bisect_right(keys, version_sort_key(version))
+        return self.__versions[name][i - 1] if i else None
+
+    def ceiling(self, name, version):
+        """Return the oldest version of package name that is not older than
+        version, or None if there is none
+        """
+        keys = self.__keys.get(name)
+        if not keys:
+            return None
+        i = bisect.bisect_left(keys, version_sort_key(version))
+        return self.__versions[name][i] if i < len(keys) else None
+
+# Magic numbers of the compression formats used for archive index files
+_compression_magic = [
+    (b'\x1f\x8b', 'gz'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'BZh', 'bz2'),
+    (b'\x28\xb5\x2f\xfd', 'zst'),
+    (b'\x5d\x00\x00', 'lzma'),
+]
+
+def detect_compression(data):
+    """Return the compression format of data, judging by its first bytes.
+
+    The result is one of 'gz', 'xz', 'bz2', 'zst' and 'lzma', or None if
+    data doesn't look compressed.
+    """
+    for magic, compression in _compression_magic:
+        if data.startswith(magic):
+            return compression
+    return None
+
+def _new_decompressor(compression):
+    """Return a decompressor object (with a decompress method) for
+    compression, a format name as returned by detect_compression."""
+    if compression == 'gz':
+        import zlib
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif compression == 'bz2':
+        import bz2
+        return bz2.BZ2Decompressor()
+    elif compression in ('xz', 'lzma'):
+        import lzma
+        return lzma.LZMADecompressor()
+    elif compression == 'zst':
+        try:
+            import zstandard
+        except ImportError:
+            raise NotImplementedError("zstandard not available; install the "
+                                      "python3-zstandard package")
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise ValueError("unknown compression format %r" % compression)
+
+class _DecompressingReader(io.RawIOBase):
+    """Raw binary stream decompressing another stream on the fly
+
+    The source is read, and decompressed, in blocks of block_size bytes, so
+    memory use only depends on the block size, never on the size of the
+    file.  (Decompressors which can't limit the size of their output, like
+    zstandard's or Python 2's bz2, give blocks as large as the compression
+    ratio makes them.)  With threaded=True, reading and decompressing happen
+    in a background thread, a few blocks ahead of the consumer; the
+    compression modules release the GIL while they work, so this overlaps
+    decompression with whatever the consumer does with the data.
+    """
+
+    # Number of decompressed blocks the background thread may get ahead
+    max_queued_blocks = 4
+
+    def __init__(self, fileobj, compression, head=b'', block_size=256 * 1024,
+                 threaded=False, close_source=False):
+        super(_DecompressingReader, self).__init__()
+        self.__fileobj = fileobj
+        self.__compression = compression
+        self.__head = head
+        self.__block_size = block_size
+        self.__close_source = close_source
+        self.__pending = memoryview(b'')
+        self.__thread = None
+        if threaded:
+            self.__queue = queue.Queue(self.max_queued_blocks)
+            self.__stop = threading.Event()
+            self.__thread = threading.Thread(target=self.__produce)
+            self.__thread.daemon = True
+            self.__thread.start()
+        else:
+            self.__blocks = self.__decompressed_blocks()
+
+    def __decompressed_blocks(self):
+        compression = self.__compression
+        decompressor = None
+        data = self.__head
+        while True:
+            if not data:
+                data = self.__fileobj.read(self.__block_size)
+                if not data:
+                    break
+            if compression is None:
+                yield data
+                data = b''
+                continue
+            if decompressor is None:
+                decompressor = _new_decompressor(compression)
+            for out in self.__decompress(decompressor, data):
+                yield out
+            data = b''
+            if getattr(decompressor, 'eof', False):
+                # Files may consist of several concatenated streams.
+                data = decompressor.unused_data
+                decompressor = None
+        if decompressor is not None and not getattr(decompressor, 'eof', True):
+            # Not EOFError: Deb822 takes that to mean there's no more data.
+            raise IOError("compressed file ended before the end-of-stream "
+                          "marker was reached")
+
+    def __decompress(self, decompressor, data):
+        """Yield the output of decompressor for data, in blocks of at most
+        block_size bytes if decompressor can be told so
+        """
+        size = self.__block_size
+        if hasattr(decompressor, 'unconsumed_tail'):
+            # zlib keeps the input it hasn't used yet aside for us, until
+            # the end of the stream (where the rest goes to unused_data).
+            while data:
+                out = decompressor.decompress(data, size)
+                data = decompressor.unconsumed_tail
+                if out:
+                    yield out
+                if (getattr(decompressor, 'eof', False)
+                        or decompressor.unused_data):
+                    break
+        elif hasattr(decompressor, 'needs_input'):
+            # bz2 and lzma, in Python >= 3.5, keep it themselves.
+            out = decompressor.decompress(data, size)
+            while True:
+                if out:
+                    yield out
+                if decompressor.needs_input or decompressor.eof:
+                    break
+                out = decompressor.decompress(b'', size)
+        else:
+            out = decompressor.decompress(data)
+            if out:
+                yield out
+
+    def __produce(self):
+        try:
+            for block in self.__decompressed_blocks():
+                if not self.__put(block):
+                    return
+            self.__put(None)
+        except Exception as e:
+            self.__put(e)
+
+    def __put(self, item):
+        while not self.__stop.is_set():
+            try:
+                self.__queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __next_block(self):
+        if self.__thread is None:
+            return next(self.__blocks, None)
+        if self.__queue is None:
+            return None
+        block = self.__queue.get()
+        if block is None:
+            self.__queue = None
+        elif isinstance(block, Exception):
+            self.__queue = None
+            raise block
+        return block
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not len(self.__pending):
+            block = self.__next_block()
+            if block is None:
+                return 0
+            self.__pending = memoryview(block)
+        n = min(len(b), len(self.__pending))
+        b[:n] = self.__pending[:n]
+        self.__pending = self.__pending[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            if self.__thread is not None:
+                self.__stop.set()
+                self.__thread.join()
+            if self.__close_source:
+                self.__fileobj.close()
+        super(_DecompressingReader, self).close()
+
+def _seekable(fileobj):
+    """Tell whether fileobj can seek"""
+    try:
+        return fileobj.seekable()
+    except AttributeError:
+        pass
+    # Python 2's file objects have no seekable method
+    try:
+        fileobj.seek(fileobj.tell())
+    except (AttributeError, IOError, OSError):
+        return False
+    return True
+
+def open_compressed(source, threaded=False, block_size=256 * 1024):
+    """Open a file that may be compressed, for reading.
+
+    The compression format (gzip, xz, lzma, bzip2 or zstd) is detected from
+    the data, which is decompressed on the fly: see _DecompressingReader for
+    the meaning of threaded and block_size.
+
+    source - the name of a file, or a file object opened in binary mode.
+             Uncompressed file objects are returned as they are (unless the
+             data had to be consumed to find out it isn't compressed).
+
+    Returns a binary file object, which also iterates over lines.
+    """
+    if not hasattr(source, 'read'):
+        fileobj = io.open(source, 'rb')
+        close_source = True
     else:
-        return 0
+        fileobj = source
+        close_source = False
+
+    consumed = b''
+    if hasattr(fileobj, 'peek'):
+        head = fileobj.peek(8)[:8]
+    elif _seekable(fileobj):
+        pos = fileobj.tell()
+        head = fileobj.read(8)
+        fileobj.seek(pos)
+    else:
+        head = consumed = fileobj.read(8)
+
+    compression = detect_compression(head)
+    if compression is None and not consumed:
+        return fileobj
+    reader = _DecompressingReader(fileobj, compression, consumed, block_size,
+                                  threaded, close_source)
+    return io.BufferedReader(reader, 64 * 1024)
 
 class PackageFile:
     """A Debian package file.
@@ -329,15 +946,20 @@ class PackageFile:
     re_field = re.compile(r'^([A-Za-z][A-Za-z0-9-]+):(?:\s*(.*?))?\s*$')
     re_continuation = re.compile(r'^\s+(?:\.|(\S.*?)\s*)$')
 
-    def __init__(self, name, file_obj=None):
+    def __init__(self, name, file_obj=None, threaded=False):
         """Creates a new package file object.
 
         name - the name of the file the data comes from
         file_obj - an alternate data source; the default is to open the
                   file with the indicated name.
+        threaded - decompress in a background thread (see open_compressed)
+
+        Compressed files and binary file objects are decompressed on the fly.
         """
         if file_obj is None:
-            file_obj = open(name)
+            file_obj = io.TextIOWrapper(open_compressed(name, threaded))
+        elif isinstance(file_obj, (io.BufferedIOBase, io.RawIOBase)):
+            file_obj = io.TextIOWrapper(open_compressed(file_obj, threaded))
         self.name = name
         self.file = file_obj
         self.lineno = 0
@@ -0,0 +1,665 @@
+# depgraph.py -- Dependency graphs of Debian binary packages
+# Copyright (C) 2026 Debian python-debian Maintainers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Dependency graphs of the packages found in Packages files
+
+A DependencyGraph has a node for each binary package it is given, and an
+arc from a package to each package that can satisfy one of its
+dependencies.  Packages are identified by integers (node ids), from 0 to
+len(graph) - 1, in the order in which they were given.  For example:
+
+    graph = DependencyGraph.from_file('Packages', architecture='amd64')
+    for node in graph.find('python3'):
+        print([graph.name(n) for n in graph.reverse_dependencies(node)])
+
+An InstallabilityChecker indexes the versions of the packages (real or
+provided) once, to tell quickly whether relations can be satisfied, and
+which packages of a suite have dependencies that can't be:
+
+    checker = InstallabilityChecker.from_file('Packages', 'amd64')
+    checker.satisfiable('python3 (>= 3.5) | python2')
+    for broken in checker.broken():
+        print(broken.name, deb822.PkgRelation.str(broken.unsatisfied))
+"""
+
+from __future__ import absolute_import, print_function
+
+import array
+import bisect
+import collections
+
+import six
+
+from debian import deb822
+from debian.archtable import ArchTable
+from debian.debian_support import FrozenVersion, version_compare
+
+
+# Relation operators, as functions of the result of version_compare
+_relops = {
+    '<<': lambda c: c < 0,
+    '<=': lambda c: c <= 0,
+    '=': lambda c: c == 0,
+    '>=': lambda c: c >= 0,
+    '>>': lambda c: c > 0,
+    # Obsolete forms of <= and >=
+    '<': lambda c: c <= 0,
+    '>': lambda c: c >= 0,
+}
+
+
+_arch_table = ArchTable()
+
+
+def relation_applies(rel, architecture=None, profiles=None):
+    """Tell whether a relation (as returned by PkgRelation.parse_relations
+    or parse_relations_compact) applies on architecture, when building with
+    the given build profiles
+
+    Architecture restrictions are ignored if architecture is None, and build
+    profile restrictions if profiles is None.  See ArchTable.relation_applies.
+    """
+    return _arch_table.relation_applies(rel, architecture, profiles)
+
+
+def _iter_packages(f, fields, encoding):
+    """Iterate over the paragraphs of the Packages file f, with only the
+    fields needed to resolve the relations in fields
+    """
+    wanted = ['Package', 'Version', 'Architecture', 'Provides']
+    wanted.extend(fields)
+    return deb822.Packages.iter_paragraphs(
+        f, wanted, use_apt_pkg=False, encoding=encoding, use_mmap=True)
+
+
+def _csr(lists, typecode='i'):
+    """Flatten a list of lists of integers into (starts, items) arrays
+
+    The items of lists[i] are items[starts[i]:starts[i + 1]].
+    """
+    starts = array.array('l', [0])
+    items = array.array(typecode)
+    for l in lists:
+        items.extend(l)
+        starts.append(len(items))
+    return starts, items
+
+
+class DependencyGraph(object):
+    """Dependency graph of a set of binary packages
+
+    The dependencies of each package (by default, the contents of its
+    Depends and Pre-Depends fields) are resolved against all the packages
+    of the graph, real or virtual (through Provides), taking versions into
+    account.  Dependencies that don't apply to architecture, or when
+    building with the given build profiles, are left out.
+
+    Both the dependencies of each package, kept as a conjunction of clauses
+    (themselves lists of alternatives), and the arcs of the graph are stored
+    in flat integer arrays, so that graphs of whole archives stay small.
+    """
+
+    def __init__(self, packages, architecture=None, profiles=None,
+                 fields=('Depends', 'Pre-Depends')):
+        """Build the graph of packages
+
+        :param packages: an iterable of Packages (or Deb822) objects.
+        :param architecture: the architecture to compute the dependencies
+            for.  If it is given, packages that are neither of this
+            architecture nor "all" are ignored.
+        :param profiles: a collection of active build profiles names.  If
+            None, build profile restrictions are ignored.
+        :param fields: the fields holding dependencies.
+        """
+        self.architecture = architecture
+        self.profiles = profiles
+        self.fields = tuple(fields)
+
+        names = []
+        versions = []
+        archs = []
+        relations = []      # of each package
+        self.__by_name = collections.defaultdict(list)
+        # Virtual package name -> [(node, provided version or None)]
+        self.__providers = collections.defaultdict(list)
+
+        for pkg in packages:
+            arch = pkg.get('Architecture')
+            if (architecture is not None and arch is not None
+                    and arch not in ('all', architecture)):
+                continue
+            node = len(names)
+            name = pkg['Package']
+            names.append(name)
+            versions.append(pkg.get('Version'))
+            archs.append(arch)
+            self.__by_name[name].append(node)
+            if 'Provides' in pkg:
+                for or_deps in deb822.PkgRelation.parse_relations_compact(
+                        pkg['Provides']):
+                    provided = or_deps[0]
+                    version = provided.version[1] if provided.version else None
+                    self.__providers[provided.name].append((node, version))
+            relations.append([
+                deb822.PkgRelation.parse_relations_compact(pkg[field])
+                for field in self.fields if field in pkg])
+
+        self.__names = names
+        self.__versions = versions
+        self.__archs = archs
+        self.__resolved = {}
+
+        clauses = []        # lists of alternatives, for all packages
+        clause_counts = []  # number of clauses of each package
+        arcs = []
+        for rels in relations:
+            count = len(clauses)
+            targets = set()
+            for field_rels in rels:
+                for or_deps in field_rels:
+                    clause = self.__resolve_clause(or_deps)
+                    if clause is not None:
+                        clauses.append(clause)
+                        targets.update(clause)
+            clause_counts.append(len(clauses) - count)
+            arcs.append(sorted(targets))
+        self.__resolved = None
+
+        self.__clause_starts, self.__clause_items = _csr(clauses)
+        self.__package_clauses = array.array('l', [0])
+        for count in clause_counts:
+            self.__package_clauses.append(self.__package_clauses[-1] + count)
+        self.__starts, self.__targets = _csr(arcs)
+
+        # Reverse arcs, with a counting sort of the arcs by target
+        rstarts = array.array('l', [0]) * (len(names) + 1)
+        for target in self.__targets:
+            rstarts[target + 1] += 1
+        for node in range(len(names)):
+            rstarts[node + 1] += rstarts[node]
+        sources = array.array('i', [0]) * len(self.__targets)
+        fill = array.array('l', rstarts)
+        for node in range(len(names)):
+            for i in range(self.__starts[node], self.__starts[node + 1]):
+                target = self.__targets[i]
+                sources[fill[target]] = node
+                fill[target] += 1
+        self.__rstarts, self.__sources = rstarts, sources
+
+    @classmethod
+    def from_file(cls, filename, architecture=None, profiles=None,
+                  fields=('Depends', 'Pre-Depends'), encoding='utf-8'):
+        """Build the graph of the packages listed in a Packages file
+
+        Only the fields needed by the graph are parsed.
+        """
+        with open(filename, 'rb') as f:
+            return cls(_iter_packages(f, fields, encoding),
+                       architecture, profiles, fields)
+
+    def __resolve_clause(self, or_deps):
+        """Return the nodes satisfying one of the relations in or_deps
+
+        None is returned if none of the relations apply.
+        """
+        clause = []
+        applies = False
+        for rel in or_deps:
+            if not relation_applies(rel, self.architecture, self.profiles):
+                continue
+            applies = True
+            for node in self.__resolve(rel):
+                if node not in clause:
+                    clause.append(node)
+        return clause if applies else None
+
+    def __resolve(self, rel):
+        """Return the nodes satisfying the relation rel"""
+        key = (rel.name, rel.version)
+        try:
+            return self.__resolved[key]
+        except KeyError:
+            pass
+        if rel.version is None:
+            nodes = list(self.__by_name.get(rel.name, ()))
+            nodes.extend(node for node, _ in
+                         self.__providers.get(rel.name, ()))
+        else:
+            relop, version = rel.version
+            check = _relops.get(relop)
+            nodes = []
+            if check is not None:
+                candidates = [(node, self.__versions[node])
+                              for node in self.__by_name.get(rel.name, ())]
+                # Only versioned Provides satisfy versioned relations
+                candidates.extend(self.__providers.get(rel.name, ()))
+                for node, candidate in candidates:
+                    try:
+                        if (candidate is not None and
+                                check(version_compare(candidate, version))):
+                            nodes.append(node)
+                    except ValueError:
+                        # Invalid version: can't satisfy anything
+                        pass
+        self.__resolved[key] = nodes
+        return nodes
+
+    ###
+
+    def __len__(self):
+        return len(self.__names)
+
+    def name(self, node):
+        """Return the name of the package of a node"""
+        return self.__names[node]
+
+    def version(self, node):
+        """Return the version of the package of a node (or None)"""
+        return self.__versions[node]
+
+    def architecture_of(self, node):
+        """Return the architecture of the package of a node (or None)"""
+        return self.__archs[node]
+
+    def find(self, name):
+        """Return the nodes of the real packages called name"""
+        return list(self.__by_name.get(name, ()))
+
+    def providers(self, name):
+        """Return the nodes of the packages providing the virtual package
+        called name, and the version they provide (or None), as pairs
+        """
+        return list(self.__providers.get(name, ()))
+
+    def clauses(self, node):
+        """Return the dependencies of a node, as a list of clauses
+
+        Each clause is a tuple of the nodes that can satisfy it.  An empty
+        tuple stands for a dependency that nothing can satisfy.
+        """
+        starts = self.__clause_starts
+        items = self.__clause_items
+        return [tuple(items[starts[c]:starts[c + 1]])
+                for c in range(self.__package_clauses[node],
+                               self.__package_clauses[node + 1])]
+
+    def dependencies(self, node):
+        """Return the nodes that node has an arc to"""
+        return list(
+            self.__targets[self.__starts[node]:self.__starts[node + 1]])
+
+    def reverse_dependencies(self, node):
+        """Return the nodes having an arc to node"""
+        return list(
+            self.__sources[self.__rstarts[node]:self.__rstarts[node + 1]])
+
+    def closure(self, nodes, reverse=False):
+        """Return the set of nodes reachable from nodes (included)
+
+        If reverse is True, follow arcs backwards, i.e. return the nodes
+        that depend (directly or not) on nodes.
+        """
+        if reverse:
+            starts, targets = self.__rstarts, self.__sources
+        else:
+            starts, targets = self.__starts, self.__targets
+        seen = bytearray(len(self.__names))
+        todo = []
+        for node in nodes:
+            if not seen[node]:
+                seen[node] = 1
+                todo.append(node)
+        result = set(todo)
+        while todo:
+            node = todo.pop()
+            for i in range(starts[node], starts[node + 1]):
+                target = targets[i]
+                if not seen[target]:
+                    seen[target] = 1
+                    result.add(target)
+                    todo.append(target)
+        return result
+
+    def strongly_connected_components(self):
+        """Return the strongly connected components of the graph
+
+        Each component is a list of nodes.  Components come in reverse
+        topological order: no node depends on nodes of later components.
+        """
+        # Tarjan's algorithm, without recursion so that long dependency
+        # chains don't hit the recursion limit.
+        starts, targets = self.__starts, self.__targets
+        n = len(self.__names)
+        index = array.array('l', [-1]) * n
+        lowlink = array.array('l', [0]) * n
+        on_stack = bytearray(n)
+        stack = []
+        components = []
+        counter = 0
+        for root in range(n):
+            if index[root] != -1:
+                continue
+            work = [(root, starts[root])]
+            index[root] = lowlink[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            while work:
+                node, i = work[-1]
+                if i < starts[node + 1]:
+                    work[-1] = (node, i + 1)
+                    target = targets[i]
+                    if index[target] == -1:
+                        index[target] = lowlink[target] = counter
+                        counter += 1
+                        stack.append(target)
+                        on_stack[target] = 1
+                        work.append((target, starts[target]))
+                    elif on_stack[target]:
+                        lowlink[node] = min(lowlink[node], index[target])
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = 0
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+        return components
+
+
+# Relation operators, as the bounds of the slice of the sorted candidate
+# versions that satisfy them, given the bounds lo and hi of the slice of
+# the candidate versions equal to the version of the relation
+_relbounds = {
+    '<<': lambda lo, hi: (0, lo),
+    '<=': lambda lo, hi: (0, hi),
+    '=': lambda lo, hi: (lo, hi),
+    '>=': lambda lo, hi: (lo, None),
+    '>>': lambda lo, hi: (hi, None),
+    # Obsolete forms of <= and >=
+    '<': lambda lo, hi: (0, hi),
+    '>': lambda lo, hi: (lo, None),
+}
+
+
+# The candidates for relations on a package name: nodes are sorted by
+# version (versions[i] being the version of nodes[i]), and all_nodes also
+# has the candidates without a version, which only satisfy relations
+# without a version
+_Candidates = collections.namedtuple('_Candidates',
+                                     'versions nodes all_nodes')
+
+
+class BrokenPackage(collections.namedtuple(
+        'BrokenPackage', 'node name version unsatisfied')):
+    """A package whose dependencies can't be satisfied
+
+    unsatisfied is the list of the clauses (lists of alternative relations,
+    as returned by PkgRelation.parse_relations_compact) that can't be
+    satisfied.
+    """
+
+    __slots__ = ()
+
+
+class InstallabilityChecker(object):
+    """Tell whether relations can be satisfied by a set of binary packages
+
+    Each package name, real or virtual, is indexed once with the sorted
+    versions (FrozenVersion objects) that can satisfy relations on it:
+    those of the real packages of this name, and those given by versioned
+    Provides.  A relation is then checked with a binary search on these
+    versions, and the result is cached, so that checking the dependencies
+    of a whole suite is fast.
+
+    Like in DependencyGraph, packages are identified by node ids, and
+    relations that don't apply to architecture or to the given build
+    profiles are ignored.  Conflicts between packages are not taken into
+    account: all the dependencies of a package may be satisfiable while
+    it still can't be installed.
+    """
+
+    def __init__(self, packages, architecture=None, profiles=None,
+                 fields=('Depends', 'Pre-Depends')):
+        """Index packages
+
+        The arguments are the same as those of DependencyGraph.
+        """
+        self.architecture = architecture
+        self.profiles = profiles
+        self.fields = tuple(fields)
+
+        names = []
+        versions = []
+        relations = []      # of each package, as a tuple of clauses
+        # Name -> [(FrozenVersion, node)], and name -> [node]
+        versioned = collections.defaultdict(list)
+        unversioned = collections.defaultdict(list)
+
+        def add_candidate(name, version, node):
+            if version is not None:
+                try:
+                    versioned[name].append((FrozenVersion(version), node))
+                    return
+                except ValueError:
+                    pass
+            unversioned[name].append(node)
+
+        for pkg in packages:
+            arch = pkg.get('Architecture')
+            if (architecture is not None and arch is not None
+                    and arch not in ('all', architecture)):
+                continue
+            node = len(names)
+            name = pkg['Package']
+            version = pkg.get('Version')
+            names.append(name)
+            versions.append(version)
+            add_candidate(name, version, node)
+            if 'Provides' in pkg:
+                for or_deps in deb822.PkgRelation.parse_relations_compact(
+                        pkg['Provides']):
+                    provided = or_deps[0]
+                    add_candidate(
+                        provided.name,
+                        provided.version[1] if provided.version else None,
+                        node)
+            relations.append(tuple(
+                clause for field in self.fields if field in pkg
+                for clause in deb822.PkgRelation.parse_relations_compact(
+                    pkg[field])))
+
+        self.__names = names
+        self.__versions = versions
+        self.__relations = relations
+        self.__by_name = collections.defaultdict(list)
+        for node, name in enumerate(names):
+            self.__by_name[name].append(node)
+        self.__index = {}
+        for name in set(versioned) | set(unversioned):
+            entries = sorted(versioned.get(name, ()), key=lambda e: e[0])
+            nodes = tuple(node for _, node in entries)
+            self.__index[name] = _Candidates(
+                [version for version, _ in entries], nodes,
+                nodes + tuple(unversioned.get(name, ())))
+        self.__cache = {}
+
+    @classmethod
+    def from_file(cls, filename, architecture=None, profiles=None,
+                  fields=('Depends', 'Pre-Depends'), encoding='utf-8'):
+        """Index the packages listed in a Packages file
+
+        Only the fields needed by the checker are parsed.
+        """
+        with open(filename, 'rb') as f:
+            return cls(_iter_packages(f, fields, encoding),
+                       architecture, profiles, fields)
+
+    def __len__(self):
+        return len(self.__names)
+
+    def name(self, node):
+        """Return the name of the package of a node"""
+        return self.__names[node]
+
+    def version(self, node):
+        """Return the version of the package of a node (or None)"""
+        return self.__versions[node]
+
+    def find(self, name):
+        """Return the nodes of the real packages called name"""
+        return list(self.__by_name.get(name, ()))
+
+    def __lookup(self, name, version):
+        """Return the nodes satisfying a relation on name, with the
+        (operator, version) constraint version (or None)
+        """
+        key = (name, version)
+        try:
+            return self.__cache[key]
+        except KeyError:
+            pass
+        entry = self.__index.get(name)
+        nodes = ()
+        if entry is not None:
+            if version is None:
+                nodes = entry.all_nodes
+            else:
+                relop, version = version
+                bounds = _relbounds.get(relop)
+                try:
+                    version = FrozenVersion(version)
+                except ValueError:
+                    # Invalid version: nothing satisfies the relation
+                    bounds = None
+                if bounds is not None:
+                    start, end = bounds(
+                        bisect.bisect_left(entry.versions, version),
+                        bisect.bisect_right(entry.versions, version))
+                    nodes = entry.nodes[start:end]
+        self.__cache[key] = nodes
+        return nodes
+
+    def candidates(self, relation):
+        """Return the nodes of the packages satisfying a relation
+
+        relation is either a string like "foo (>= 1.0)", or a relation as
+        returned by PkgRelation.parse_relations or parse_relations_compact.
+        Its architecture and build profile restrictions are ignored.
+        """
+        if isinstance(relation, six.string_types):
+            relation = deb822.PkgRelation.parse_relations_compact(
+                relation)[0][0]
+        return list(self.__lookup(relation['name'], relation['version']))
+
+    def __clause_candidates(self, clause):
+        """Return the nodes satisfying one of the relations of clause, or
+        None if none of them apply
+        """
+        nodes = None
+        for rel in clause:
+            if relation_applies(rel, self.architecture, self.profiles):
+                if nodes is None:
+                    nodes = []
+                nodes.extend(self.__lookup(rel['name'], rel['version']))
+        return nodes
+
+    def clause_satisfiable(self, clause):
+        """Tell whether a clause (a list of alternative relations) can be
+        satisfied
+
+        A clause none of whose relations apply is satisfied.
+        """
+        nodes = self.__clause_candidates(clause)
+        return nodes is None or len(nodes) > 0
+
+    def unsatisfied(self, relations):
+        """Return the clauses of relations that can't be satisfied
+
+        relations is either the value of a relationship field, like
+        "foo (>= 1.0) | bar, baz", or a list of clauses as returned by
+        PkgRelation.parse_relations or parse_relations_compact.
+        """
+        if isinstance(relations, six.string_types):
+            relations = deb822.PkgRelation.parse_relations_compact(relations)
+        return [clause for clause in relations
+                if not self.clause_satisfiable(clause)]
+
+    def satisfiable(self, relations):
+        """Tell whether all the clauses of relations can be satisfied
+
+        relations is as for unsatisfied.
+        """
+        return not self.unsatisfied(relations)
+
+    def broken(self, recursive=True):
+        """Return the packages whose dependencies can't be satisfied
+
+        Packages are returned as BrokenPackage tuples, in the order in
+        which they were given.  If recursive is True, a dependency is only
+        satisfied by packages that aren't broken themselves, so that all
+        the packages that can't be installed for lack of dependencies are
+        found, and not only those directly depending on missing packages.
+        """
+        n = len(self.__names)
+        owners = array.array('i')   # the package of each clause
+        clauses = []                # the applying clauses of all packages
+        live = array.array('l')     # their numbers of usable candidates
+        users = [[] for _ in range(n)] if recursive else None
+        broken = bytearray(n)
+        todo = []
+        for node, rels in enumerate(self.__relations):
+            for clause in rels:
+                nodes = self.__clause_candidates(clause)
+                if nodes is None:
+                    continue
+                nodes = set(nodes)
+                if recursive:
+                    for target in nodes:
+                        users[target].append(len(clauses))
+                owners.append(node)
+                clauses.append(clause)
+                live.append(len(nodes))
+                if not nodes and not broken[node]:
+                    broken[node] = 1
+                    todo.append(node)
+
+        # Propagate breakage to the packages that need broken ones
+        while recursive and todo:
+            target = todo.pop()
+            for c in users[target]:
+                live[c] -= 1
+                if live[c] == 0:
+                    node = owners[c]
+                    if not broken[node]:
+                        broken[node] = 1
+                        todo.append(node)
+
+        unsatisfied = collections.defaultdict(list)
+        for c, clause in enumerate(clauses):
+            if live[c] == 0:
+                unsatisfied[owners[c]].append(clause)
+        return [BrokenPackage(node, self.__names[node], self.__versions[node],
+                              unsatisfied[node])
+                for node in range(n) if broken[node]]
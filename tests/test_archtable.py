@@ -0,0 +1,157 @@
+#! /usr/bin/python
+
+# Copyright (C) 2026 Debian python-debian Maintainers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from __future__ import absolute_import
+
+import os
+import sys
+import unittest
+import warnings
+
+sys.path.insert(0, '../lib/')
+
+from debian import archtable
+from debian import deb822
+
+
+SOURCES = '''\
+Package: foo
+Build-Depends: debhelper (>= 10), libfoo-dev [linux-any], python3 <!nopython>
+Build-Depends-Indep: doxygen <!nodoc>
+
+Package: bar
+Build-Depends: debhelper (>= 10), libfoo-dev [linux-any], python3 <!nopython>
+
+Package: baz
+Build-Depends: libkvm-dev [kfreebsd-any] | libbsd-dev [!linux-any]
+'''
+
+
+class TestArchTable(unittest.TestCase):
+
+    def setUp(self):
+        self.table = archtable.ArchTable()
+
+    def test_debtuple(self):
+        self.assertEqual(('base', 'gnu', 'linux', 'amd64'),
+                         self.table.debtuple('amd64'))
+        self.assertEqual(('eabihf', 'gnu', 'linux', 'arm'),
+                         self.table.debtuple('armhf'))
+        self.assertEqual(('base', 'gnu', 'kfreebsd', 'i386'),
+                         self.table.debtuple('kfreebsd-i386'))
+        self.assertEqual(('base', 'musl', 'linux', 'arm64'),
+                         self.table.debtuple('musl-linux-arm64'))
+        self.assertRaises(ValueError, self.table.debtuple, 'foo')
+        self.assertTrue('x32' in self.table.architectures())
+
+    def test_matches(self):
+        matches = self.table.matches
+        self.assertTrue(matches('amd64', 'amd64'))
+        self.assertTrue(matches('amd64', 'any'))
+        self.assertTrue(matches('amd64', 'linux-any'))
+        self.assertTrue(matches('amd64', 'any-amd64'))
+        self.assertTrue(matches('amd64', 'gnu-any-any'))
+        self.assertTrue(matches('amd64', 'base-any-any-any'))
+        self.assertFalse(matches('amd64', 'i386'))
+        self.assertFalse(matches('amd64', 'kfreebsd-any'))
+        self.assertTrue(matches('armhf', 'any-arm'))
+        self.assertTrue(matches('armhf', 'eabihf-any-any-any'))
+        self.assertFalse(matches('armhf', 'arm'))
+        self.assertTrue(matches('x32', 'any-amd64'))
+        self.assertTrue(matches('hurd-i386', 'any-i386'))
+        self.assertFalse(matches('hurd-i386', 'linux-any'))
+        self.assertTrue(matches('musl-linux-amd64', 'linux-any'))
+        self.assertFalse(matches('musl-linux-amd64', 'gnu-any-any'))
+        self.assertFalse(matches('foo', 'linux-any'))
+        self.assertFalse(matches('amd64', 'any-any-any-any-any'))
+
+    def test_relation_applies(self):
+        rels = deb822.PkgRelation.parse_relations_compact(
+            'pa [linux-any], pb [!any-i386], pc <stage1 !cross> <nocheck>')
+        applies = self.table.relation_applies
+        self.assertTrue(applies(rels[0][0], 'armel'))
+        self.assertFalse(applies(rels[0][0], 'kfreebsd-amd64'))
+        self.assertTrue(applies(rels[1][0], 'kfreebsd-amd64'))
+        self.assertFalse(applies(rels[1][0], 'hurd-i386'))
+        self.assertTrue(applies(rels[2][0], None, ['stage1']))
+        self.assertFalse(applies(rels[2][0], None, ['stage1', 'cross']))
+        self.assertTrue(applies(rels[2][0], None, ['cross', 'nocheck']))
+        self.assertFalse(applies(rels[2][0], None, []))
+        self.assertTrue(applies(rels[2][0]))
+
+    def test_reduce_relations(self):
+        raw = ('libc6-dev [!hurd-any] | libc0.3-dev [hurd-any], '
+               'libsystemd-dev [linux-any], check <!nocheck>')
+        rels = deb822.PkgRelation.parse_relations(raw)
+        self.assertEqual('libc0.3-dev, check',
+                         deb822.PkgRelation.str(self.table.reduce_relations(
+                             rels, 'hurd-i386', ())))
+        self.assertEqual('libc6-dev, libsystemd-dev',
+                         deb822.PkgRelation.str(self.table.reduce_relations(
+                             rels, 'amd64', ['nocheck'])))
+        # Unchecked restrictions are kept
+        reduced = self.table.reduce_relations(rels, 'amd64')
+        self.assertEqual('libc6-dev, libsystemd-dev, check <!nocheck>',
+                         deb822.PkgRelation.str(reduced))
+        self.assertEqual(None, reduced[0][0]['arch'])
+        # The relations given are not changed
+        self.assertEqual(raw, deb822.PkgRelation.str(rels))
+
+        # Relationships that can't be parsed have no restrictions to check
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            rels = deb822.PkgRelation.parse_relations('pa [amd64], (pb')
+        self.assertEqual('pa, (pb', deb822.PkgRelation.str(
+            self.table.reduce_relations(rels, 'amd64', ())))
+
+        compact = deb822.PkgRelation.parse_relations_compact(raw)
+        reduced = self.table.reduce_relations(compact, 'amd64', ())
+        self.assertTrue(isinstance(reduced[0][0],
+                                   deb822.PkgRelation.Relation))
+        self.assertEqual('libc6-dev, libsystemd-dev, check',
+                         deb822.PkgRelation.str(reduced))
+
+    def test_specialize(self):
+        specialized = list(self.table.specialize(
+            deb822.Sources.iter_paragraphs(SOURCES.splitlines()),
+            'kfreebsd-amd64', ['nodoc']))
+        self.assertEqual(['foo', 'bar', 'baz'],
+                         [src['Package'] for src, _ in specialized])
+        foo = specialized[0][1]
+        self.assertEqual(['Build-Depends', 'Build-Depends-Indep'],
+                         sorted(foo))
+        self.assertEqual('debhelper (>= 10), python3',
+                         deb822.PkgRelation.str(foo['Build-Depends']))
+        self.assertEqual((), foo['Build-Depends-Indep'])
+        # Identical fields are only reduced once
+        self.assertTrue(foo['Build-Depends'] is
+                        specialized[1][1]['Build-Depends'])
+        self.assertEqual('libkvm-dev | libbsd-dev', deb822.PkgRelation.str(
+            specialized[2][1]['Build-Depends']))
+
+    def test_from_dpkg(self):
+        if not os.path.exists('/usr/share/dpkg/tupletable'):
+            return
+        table = archtable.ArchTable.from_dpkg()
+        self.assertEqual(('base', 'gnu', 'linux', 'amd64'),
+                         table.debtuple('amd64'))
+        self.assertTrue(table.matches('armhf', 'any-arm'))
+
+
+if __name__ == "__main__":
+    unittest.main()
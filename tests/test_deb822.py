@@ -20,9 +20,12 @@
 from __future__ import absolute_import
 
 import email.utils
+import hashlib
 import io
 import os
+import pickle
 import re
+import shutil
 import sys
 import tempfile
 import unittest
@@ -36,6 +39,12 @@ except ImportError:
 import apt_pkg
 import six
 
+try:
+    # Python 2 needs the futures backport for iter_paragraphs_parallel
+    from concurrent import futures
+except ImportError:
+    futures = None
+
 sys.path.insert(0, '../lib')
 
 from debian import deb822
@@ -300,6 +309,14 @@ def open_utf8(filename, mode='r'):
         return open(filename, mode=mode, encoding='UTF-8')
 
 
+def utf8(s):
+    """Encode s in UTF-8, unless it's bytes already (like the str literals
+    of Python 2)"""
+    if isinstance(s, bytes):
+        return s
+    return s.encode('utf-8')
+
+
 class TestDeb822Dict(unittest.TestCase):
     def make_dict(self):
         d = deb822.Deb822Dict()
@@ -442,6 +459,61 @@ class TestDeb822(unittest.TestCase):
             self.assertTrue(i.valid())
             self.assertEqual('at', dsc['Source'])
 
+    def test_gpg_payload_spans(self):
+        signed = (SIGNED_CHECKSUM_CHANGES_FILE % CHECKSUM_CHANGES_FILE)
+        inputs = [
+            signed, '\n \n' + signed + '\nFoo: bar\n',
+            UNPARSED_PACKAGE, '\n\n' + UNPARSED_PACKAGE + '\n\nFoo: bar\n',
+            UNPARSED_PACKAGE.rstrip('\n'),
+        ]
+        for text in inputs:
+            data = utf8(text)
+            payload, signed_span = deb822._gpg_payload_spans(data)
+            pre, lines, post = deb822.Deb822.split_gpg_and_payload(
+                data.splitlines())
+            self.assertEqual(b'\n'.join(lines),
+                             data[payload[0]:payload[1]].rstrip(b'\n'))
+            if signed_span is None:
+                self.assertEqual([], pre)
+            else:
+                self.assertEqual(utf8(signed),
+                                 data[signed_span[0]:signed_span[1]])
+        # Input with comments, carriage returns or blank lines in signed
+        # paragraphs is left to split_gpg_and_payload
+        for text in ['# comment\n' + UNPARSED_PACKAGE,
+                     UNPARSED_PACKAGE.replace('\n', '\r\n'),
+                     signed.replace('Files:', '\nFiles:')]:
+            self.assertEqual(None,
+                             deb822._gpg_payload_spans(utf8(text)))
+        self.assertRaises(EOFError, deb822._gpg_payload_spans, b'\n \n')
+
+    def test_signed_bytes(self):
+        # Trailing whitespace is part of what was signed
+        data = utf8(SIGNED_CHECKSUM_CHANGES_FILE % CHECKSUM_CHANGES_FILE)
+        data = data.replace(b'Hash: SHA1\n', b'Hash: SHA1 \n')
+        expected = deb822.Changes(data.splitlines())
+        for changes in [deb822.Changes(data), deb822.Changes(io.BytesIO(data))]:
+            self.assertEqual(data, changes.raw_text)
+            self.assertEqual(expected, changes)
+            self.assertEqual(expected.dump(), changes.dump())
+            self.assertEqual(expected['Files'], changes['Files'])
+            copy = pickle.loads(pickle.dumps(changes))
+            self.assertEqual(expected, copy)
+
+        # Unsigned paragraphs are still read one at a time from files
+        f = io.BytesIO(b'\nSource: foo\n\nSource: bar\n')
+        self.assertEqual('foo', deb822.Changes(f)['Source'])
+        self.assertEqual('bar', deb822.Changes(f)['Source'])
+
+        # and so are the paragraphs after a signed one
+        f = io.BytesIO(data + b'\nSource: bar\n')
+        changes = deb822.Changes(f)
+        self.assertEqual(data, changes.raw_text)
+        self.assertEqual('bar', deb822.Changes(f)['Source'])
+        with open('test_Dsc.badsig', 'rb') as f:
+            self.assertEqual(['at', 'gnupg'], [
+                p['Source'] for p in deb822.Dsc.iter_paragraphs(f)])
+
     def test_iter_paragraphs_array(self):
         text = (UNPARSED_PACKAGE + '\n\n\n' + UNPARSED_PACKAGE).splitlines()
 
@@ -566,6 +638,230 @@ class TestDeb822(unittest.TestCase):
         self._test_iter_paragraphs("test_Sources", deb822.Sources,
                                    use_apt_pkg=False, shared_storage=False)
 
+    def test_iter_paragraphs_mmap_packages(self):
+        self._test_iter_paragraphs("test_Packages", deb822.Packages,
+                                   use_mmap=True, shared_storage=False)
+
+    def test_iter_paragraphs_mmap_sources(self):
+        self._test_iter_paragraphs("test_Sources", deb822.Sources,
+                                   use_mmap=True, shared_storage=False)
+
+    def test_iter_paragraphs_keep_raw(self):
+        for filename, cls in (("test_Packages", deb822.Packages),
+                              ("test_Sources", deb822.Sources)):
+            with open(filename, 'rb') as f:
+                content = f.read()
+            for kwargs in ({'use_apt_pkg': False}, {'use_mmap': True}):
+                s = BytesIO()
+                with open(filename, 'rb') as f:
+                    for p in cls.iter_paragraphs(f, keep_raw=True, **kwargs):
+                        p.dump(s)
+                        s.write(b"\n")
+                self.assertEqual(content, s.getvalue())
+
+    def test_dump_normalized_by_default(self):
+        data = b'Package:foo\r\nVersion:   1.0  \r\n'
+        for kwargs in ({}, {'use_mmap': True}):
+            p = next(deb822.Deb822.iter_paragraphs(io.BytesIO(data),
+                                                   **kwargs))
+            self.assertEqual('Package: foo\nVersion: 1.0\n', p.dump())
+        p = next(deb822.Deb822.iter_paragraphs(io.BytesIO(data),
+                                               use_mmap=True, keep_raw=True))
+        self.assertEqual(data.decode('utf-8'), p.dump())
+
+    def test_iter_paragraphs_mmap_same_as_native(self):
+        for text in (UNPARSED_PARAGRAPHS_WITH_COMMENTS,
+                     UNPARSED_PACKAGE + ' \n\n' + UNPARSED_PACKAGE,
+                     '\n\n' + UNPARSED_PACKAGE + '\t\n',
+                     GPG_SIGNED[0] % UNPARSED_PACKAGE):
+            native = list(deb822.Deb822.iter_paragraphs(text.splitlines(),
+                                                        use_apt_pkg=False))
+            with tempfile.TemporaryFile() as fh:
+                fh.write(utf8(text))
+                fh.seek(0)
+                mapped = list(deb822.Deb822.iter_paragraphs(fh,
+                                                            use_mmap=True))
+            self.assertEqual(native, mapped)
+
+    def test_iter_paragraphs_mmap_empty_file(self):
+        with tempfile.TemporaryFile() as fh:
+            self.assertEqual(
+                [], list(deb822.Deb822.iter_paragraphs(fh, use_mmap=True)))
+
+    @unittest.skipIf(futures is None, "needs concurrent.futures")
+    def test_iter_paragraphs_parallel(self):
+        for filename, cls in (("test_Packages", deb822.Packages),
+                              ("test_Sources", deb822.Sources)):
+            with open_utf8(filename) as f:
+                expected = list(cls.iter_paragraphs(f))
+
+            # A tiny chunk size makes every paragraph a chunk of its own.
+            parsed = list(cls.iter_paragraphs_parallel(
+                filename, max_workers=2, chunk_size=1))
+            self.assertEqual(expected, parsed)
+            for p in parsed:
+                self.assertTrue(isinstance(p, cls))
+
+            parsed = list(cls.iter_paragraphs_parallel(
+                filename, max_workers=2, chunk_size=1, ordered=False,
+                as_dict=True))
+            self.assertEqual(sorted(p['Package'] for p in expected),
+                             sorted(p['Package'] for p in parsed))
+            for p in parsed:
+                self.assertEqual(dict, type(p))
+
+    @unittest.skipIf(futures is None, "needs concurrent.futures")
+    def test_iter_paragraphs_parallel_signed(self):
+        fd, filename = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(utf8(GPG_SIGNED[0] % UNPARSED_PACKAGE))
+        try:
+            parsed = list(deb822.Deb822.iter_paragraphs_parallel(filename))
+        finally:
+            os.remove(filename)
+        self.assertEqual(1, len(parsed))
+        self.assertWellParsed(parsed[0], PARSED_PACKAGE)
+
+    def test_iter_paragraphs_compressed(self):
+        import gzip
+        with open_utf8('test_Packages') as f:
+            expected = list(deb822.Packages.iter_paragraphs(f))
+        fd, filename = tempfile.mkstemp(suffix='.gz')
+        os.close(fd)
+        try:
+            with gzip.open(filename, 'wb') as f:
+                with open('test_Packages', 'rb') as data:
+                    f.write(data.read())
+            for threaded in (False, True):
+                with open(filename, 'rb') as f:
+                    self.assertEqual(expected, list(
+                        deb822.Packages.iter_paragraphs(
+                            f, threaded_decompression=threaded)))
+                for kwargs in ({'use_apt_pkg': False}, {'use_mmap': True}):
+                    with open(filename, 'rb') as f:
+                        self.assertEqual(expected, list(
+                            deb822.Deb822.iter_paragraphs(
+                                f, threaded_decompression=threaded,
+                                **kwargs)))
+            if sys.version_info >= (3, 6):
+                import pathlib
+                self.assertEqual(expected, list(
+                    deb822.Packages.iter_paragraphs(pathlib.Path(filename))))
+        finally:
+            os.remove(filename)
+
+    @staticmethod
+    def _large_packages_file(count=300):
+        """Return count paragraphs of about 11 kB each, as bytes"""
+        padding = 'X-Padding:\n' + (' ' + 'x' * 99 + '\n') * 100
+        return utf8((UNPARSED_PACKAGE + padding + '\n') * count)
+
+    def test_iter_paragraphs_compressed_bounded(self):
+        try:
+            import tracemalloc
+        except ImportError:
+            raise unittest.SkipTest('needs tracemalloc')
+        import gzip
+        data = self._large_packages_file()
+        compressed = io.BytesIO()
+        with gzip.GzipFile(fileobj=compressed, mode='wb') as f:
+            f.write(data)
+        # Memory use only depends on the sizes of the blocks decompressed
+        # and of the chunks scanned at a time
+        for cls, kwargs in ((deb822.Packages, {}),
+                            (deb822.Deb822, {'use_apt_pkg': False}),
+                            (deb822.Deb822, {'use_mmap': True})):
+            compressed.seek(0)
+            tracemalloc.start()
+            try:
+                count = 0
+                for paragraph in cls.iter_paragraphs(compressed, **kwargs):
+                    paragraph['Description']
+                    count += 1
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            self.assertEqual(300, count)
+            self.assertTrue(peak < len(data) // 2,
+                            '%d bytes used to parse %d with %r' %
+                            (peak, len(data), kwargs))
+
+    def test_iter_paragraphs_in_memory(self):
+        for filename, cls in (("test_Packages", deb822.Packages),
+                              ("test_Sources", deb822.Sources)):
+            with open_utf8(filename) as f:
+                expected = list(cls.iter_paragraphs(f, use_apt_pkg=False))
+            with open(filename, 'rb') as f:
+                data = f.read()
+            for sequence in (data, memoryview(data), bytearray(data)):
+                self.assertEqual(expected, list(cls.iter_paragraphs(
+                    sequence, use_apt_pkg=False)))
+            self.assertEqual(expected, list(cls.iter_paragraphs(
+                io.BytesIO(data), use_apt_pkg=True)))
+            self.assertEqual(expected, list(cls.iter_paragraphs(
+                io.BytesIO(data), use_apt_pkg=False, use_mmap=True)))
+
+    def test_iter_paragraphs_stream_bounded(self):
+        data = self._large_packages_file()
+        # Streams are neither read whole nor kept until the end
+        stream = io.BytesIO(data)
+        paragraphs = deb822.Packages.iter_paragraphs(stream)
+        self.assertEqual('mutt', next(paragraphs)['Package'])
+        self.assertTrue(0 < stream.tell() < len(data) // 2)
+        self.assertEqual(299, len(list(paragraphs)))
+        # Chunks are only cut between paragraphs, whatever their size
+        text = (UNPARSED_PACKAGE + ' \n\n' + UNPARSED_PACKAGE + '\n\n\n'
+                + UNPARSED_PACKAGE.replace('\n', '\r\n') + '\r\n'
+                + GPG_SIGNED[0] % UNPARSED_PACKAGE + '\n' + UNPARSED_PACKAGE)
+        expected = list(deb822.Deb822.iter_paragraphs(text.splitlines()))
+        self.assertEqual(5, len(expected))
+        for chunk_size in (1, 7, 100, 10000):
+            self.assertEqual(expected, list(
+                deb822.Deb822._iter_paragraphs_stream(
+                    io.BytesIO(utf8(text)), None, 'utf-8',
+                    chunk_size=chunk_size)))
+        try:
+            import tracemalloc
+        except ImportError:
+            return
+        tracemalloc.start()
+        try:
+            for paragraph in deb822.Packages.iter_paragraphs(
+                    io.BytesIO(data)):
+                paragraph['Description']
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertTrue(peak < len(data) // 2,
+                        '%d bytes used to parse %d' % (peak, len(data)))
+
+    def test_iter_paragraphs_in_memory_signed(self):
+        data = (GPG_SIGNED[0] % UNPARSED_PACKAGE) + '\n' + UNPARSED_PACKAGE
+        expected = list(deb822.Deb822.iter_paragraphs(data.splitlines()))
+        self.assertEqual(2, len(expected))
+        self.assertEqual(expected, list(
+            deb822.Deb822.iter_paragraphs(utf8(data))))
+        self.assertEqual(expected, list(deb822.Deb822.iter_paragraphs(
+            io.BytesIO(utf8(data)), use_mmap=True)))
+
+    def test_values_decoded_lazily(self):
+        text = (b'Package: foo\n'
+                b'Description: caf\xe9\n'
+                b' na\xefve\n')
+        # Python 2 doesn't warn again from where it already has, whatever
+        # the filters
+        getattr(deb822, '__warningregistry__', {}).clear()
+        with warnings.catch_warnings(record=True) as warning_list:
+            warnings.simplefilter('always')
+            d = deb822.Deb822(text.splitlines())
+            self.assertEqual('foo', d['Package'])
+            # Description isn't valid UTF-8, but it's not been decoded yet.
+            self.assertEqual([], warning_list)
+
+            description = d['Description']
+            self.assertEqual(1, len(warning_list))
+        self.assertTrue(d['Description'] is description)
+
     def test_parser_empty_input(self):
         self.assertEqual({}, deb822.Deb822([]))
 
@@ -593,6 +889,139 @@ class TestDeb822(unittest.TestCase):
             for key in wanted_fields:
                 self.assertEqual(PARSED_PACKAGE[key], deb822_[key])
 
+    def test_iter_paragraphs_mmap_limit_fields(self):
+        wanted_fields = ['Description', 'Package', 'version']
+        with open_utf8('test_Packages') as f:
+            expected = [dict((k, p[k]) for k in p if k.lower() in
+                             [w.lower() for w in wanted_fields])
+                        for p in deb822.Packages.iter_paragraphs(f)]
+        with open('test_Packages', 'rb') as f:
+            paragraphs = list(deb822.Packages.iter_paragraphs(
+                f, wanted_fields, use_mmap=True))
+        self.assertEqual(expected, paragraphs)
+        # Fields are in the order of the file, not of wanted_fields
+        self.assertEqual(['Package', 'Version', 'Description'],
+                         list(paragraphs[0].keys()))
+        # A continuation line that looks like a wanted field isn't one
+        paragraph = deb822.Deb822(
+            b'Package: foo\nDescription: bar\n Version: 1\n'.splitlines(),
+            ['Version'])
+        self.assertEqual({}, paragraph)
+
+    def test_iter_paragraphs_mmap_same_as_lines(self):
+        text = ('Package: foo\n'
+                'Description: short\n'
+                'not a field\n'
+                ' long\n'
+                ' .\n'
+                'Version: 1.0\n'
+                'Depends: bar,\n'
+                ':odd\n'
+                '  baz\n')
+        expected = [('Package', 'foo'), ('Description', 'short\n long\n .'),
+                    ('Version', '1.0'), ('Depends', 'bar,\n  baz')]
+        for fields in (None, ['Depends', 'Version', 'Description']):
+            native = list(deb822.Deb822.iter_paragraphs(text.splitlines(),
+                                                        fields))
+            with tempfile.TemporaryFile() as fh:
+                fh.write(utf8(text + '\n' + text))
+                fh.seek(0)
+                mapped = list(deb822.Deb822.iter_paragraphs(fh, fields,
+                                                            use_mmap=True))
+            self.assertEqual(1, len(native))
+            self.assertEqual(2, len(mapped))
+            for paragraph in native + mapped:
+                # Fields are in the order of the file, and continuation
+                # lines after a malformed line are kept
+                self.assertEqual(
+                    [(k, v) for k, v in expected
+                     if fields is None or k in fields],
+                    list(paragraph.items()))
+
+    def _query_names(self, query, **kwargs):
+        with open('test_Packages', 'rb') as f:
+            return [p['Package'] for p in deb822.Packages.iter_paragraphs(
+                f, query=query, use_apt_pkg=False, **kwargs)]
+
+    def test_iter_paragraphs_query(self):
+        queries = [
+            (deb822.FieldEquals('Package', 'zssh'), ['zssh']),
+            (deb822.FieldEquals('package', 'ZSSH', ignore_case=True),
+             ['zssh']),
+            (deb822.FieldMatches('Maintainer', r'@debian\.org>$'),
+             ['a2ps', 'dummy-package']),
+            (deb822.FieldMatches('Maintainer', re.compile('WONG', re.I)),
+             ['zssh']),
+            (deb822.FieldVersion('Version', '>>', '1.2'), ['a2ps', 'zssh']),
+            (deb822.FieldVersion('Version', '<=', '1.0'), ['dummy-package']),
+            (deb822.FieldExists('Essential'), []),
+            (~deb822.FieldEquals('Package', 'zssh')
+             & deb822.FieldMatches('Description', 'GNU'), ['a2ps']),
+            (deb822.FieldEquals('Package', 'zssh')
+             | deb822.FieldEquals('Package', 'a2ps'), ['a2ps', 'zssh']),
+        ]
+        for query, expected in queries:
+            self.assertEqual(expected, self._query_names(query))
+            self.assertEqual(expected,
+                             self._query_names(query, use_mmap=True))
+            with open_utf8('test_Packages') as f:
+                self.assertEqual(expected, [
+                    p['Package'] for p in deb822.Packages.iter_paragraphs(
+                        f, use_apt_pkg=False) if query(p)])
+        self.assertRaises(ValueError, deb822.FieldVersion, 'Version', '<',
+                          '1.0')
+
+    def test_iter_paragraphs_query_text(self):
+        # Text patterns and values apply to the decoded value of the field
+        data = utf8(UNPARSED_PACKAGE)
+        queries = [
+            deb822.FieldMatches('Maintainer', six.u('SIM\xd3'),
+                                re.IGNORECASE | re.UNICODE),
+            deb822.FieldMatches('Maintainer',
+                                re.compile(six.u(r'Sim\w <'), re.UNICODE)),
+            deb822.FieldEquals('Maintainer',
+                               six.u('ADEODATO SIM\xd3 <DATO@NET.COM.ORG.ES>'),
+                               ignore_case=True),
+        ]
+        for query in queries:
+            self.assertEqual(['mutt'], [
+                p['Package'] for p in deb822.Deb822.iter_paragraphs(
+                    data, query=query)])
+            self.assertTrue(query(deb822.Deb822(data)))
+        # Bytes patterns apply to the raw value
+        self.assertEqual(['mutt'], [
+            p['Package'] for p in deb822.Deb822.iter_paragraphs(
+                data, query=deb822.FieldMatches('Maintainer',
+                                                utf8(six.u('Sim\xf3'))))])
+
+    def test_iter_paragraphs_query_signed(self):
+        # Paragraphs are the same as without a query, signature included
+        data = utf8(SIGNED_CHECKSUM_CHANGES_FILE % CHECKSUM_CHANGES_FILE)
+        for sequence in (data, data.splitlines()):
+            expected = list(deb822.Changes.iter_paragraphs(sequence))
+            changes = list(deb822.Changes.iter_paragraphs(
+                sequence, query=deb822.FieldExists('Files')))
+            self.assertEqual(1, len(changes))
+            self.assertEqual(expected, changes)
+            self.assertEqual(expected[0].raw_text, changes[0].raw_text)
+            self.assertTrue(b'-----BEGIN PGP SIGNATURE-----'
+                            in changes[0].raw_text)
+            self.assertEqual([], list(deb822.Changes.iter_paragraphs(
+                sequence, query=deb822.FieldExists('Package'))))
+
+    def test_iter_paragraphs_query_fields(self):
+        # The query may look at fields that aren't yielded
+        query = deb822.FieldMatches('Maintainer', 'zack')
+        with open('test_Packages', 'rb') as f:
+            paragraphs = list(deb822.Packages.iter_paragraphs(
+                f, ['Package'], query=query, use_apt_pkg=False))
+        self.assertEqual([{'Package': 'dummy-package'}], paragraphs)
+        if futures is not None:
+            self.assertEqual(paragraphs, list(
+                deb822.Packages.iter_paragraphs_parallel(
+                    'test_Packages', ['Package'], max_workers=2,
+                    chunk_size=1, query=query)))
+
     def test_dont_assume_trailing_newline(self):
         deb822a = deb822.Deb822(['Package: foo'])
         deb822b = deb822.Deb822(['Package: foo\n'])
@@ -868,6 +1297,55 @@ Description: python modules to work with Debian-related data formats
         d.dump(fd=buf, text_mode=True)
         self.assertEqual(CHANGES_FILE, buf.getvalue())
 
+    def test_write_paragraphs(self):
+        for filename, cls in (("test_Packages", deb822.Packages),
+                              ("test_Sources", deb822.Sources)):
+            with open(filename, 'rb') as f:
+                paragraphs = list(cls.iter_paragraphs(f, use_apt_pkg=False))
+            paragraphs.append(deb822.Deb822({'Package': 'new'}))
+            paragraphs[0]['Priority'] = 'extra'
+            out = io.BytesIO()
+            deb822.write_paragraphs(paragraphs, out, buffer_size=100)
+            self.assertEqual(
+                b'\n'.join(p.dump().encode('utf-8') for p in paragraphs),
+                out.getvalue())
+
+    def test_write_paragraphs_unmodified(self):
+        # Unmodified paragraphs are written back verbatim, others are dumped
+        data = (b'Package:foo\n# comment\nVersion:   1.0\n\n'
+                b'Package:bar\nVersion: 2.0\n')
+        paragraphs = list(deb822.Deb822.iter_paragraphs(data, keep_raw=True))
+        out = io.BytesIO()
+        deb822.write_paragraphs(paragraphs, out)
+        self.assertEqual(b'Package:foo\nVersion:   1.0\n\n'
+                         b'Package:bar\nVersion: 2.0\n', out.getvalue())
+
+        paragraphs[1]['Version'] = '2.1'
+        del paragraphs[0]['Version']
+        out = io.BytesIO()
+        deb822.write_paragraphs(paragraphs, out, encoding='latin-1')
+        self.assertEqual(b'Package: foo\n\nPackage: bar\nVersion: 2.1\n',
+                         out.getvalue())
+
+    def test_dump_unmodified_multivalued(self):
+        with open('test_Sources', 'rb') as f:
+            content = f.read()
+        with open('test_Sources', 'rb') as f:
+            paragraphs = list(deb822.Sources.iter_paragraphs(
+                f, use_apt_pkg=False, keep_raw=True))
+        out = io.BytesIO()
+        deb822.write_paragraphs(paragraphs, out)
+        out.write(b'\n')
+        self.assertEqual(content, out.getvalue())
+        self.assertEqual(content.decode('utf-8').split('\n\n')[0] + '\n',
+                         paragraphs[0].dump())
+
+        # Once handed out, multivalued fields may be modified in place
+        paragraphs[0]['Checksums-Sha1'][0]['size'] = '1'
+        self.assertTrue(b'Checksums-Sha1: \n' in content)
+        self.assertFalse('Checksums-Sha1: \n' in paragraphs[0].dump())
+        self.assertTrue(' 1 apache2-mpm-itk_2.2.6-01.orig.tar.gz\n'
+                        in paragraphs[0].dump())
 
     def test_bug597249_colon_as_first_value_character(self):
         """Colon should be allowed as the first value character. See #597249.
@@ -950,6 +1428,58 @@ Description: python modules to work with Debian-related data formats
         self.assertEqual(len(release['SHA512']), 61)
         self.assertEqual(release['SHA512'][0]['size'], '113433')
 
+    def test_checksum_table(self):
+        with open('test_Release', 'rb') as f:
+            content = f.read()
+        release = deb822.Release(content)
+        table = release.checksum_table('sha256')
+        self.assertEqual(('sha256', 'size', 'name'), table.fields)
+        self.assertEqual(61, len(table))
+        self.assertTrue(table is release.checksum_table('SHA256'))
+        row = table.index('Contents-amd64.bz2')
+        self.assertEqual('Contents-amd64.bz2', table[row][2])
+        self.assertEqual(table[row][1], table.column('Size')[row])
+        self.assertRaises(ValueError, table.index, 'missing')
+        self.assertRaises(KeyError, release.checksum_table, 'Codename')
+
+        # Writing the fields out doesn't split them into Deb822Dicts
+        release['Codename'] = 'sid'
+        self.assertEqual(content.decode('utf-8'), release.dump())
+        self.assertTrue(isinstance(
+            deb822.Deb822Dict.__getitem__(release, 'SHA256'), six.text_type))
+        release.size_field_behavior = 'dak'
+        width = max(len(size) for size in table.column('size'))
+        self.assertTrue((' %*s Contents-amd64.bz2' % (width, '113433'))
+                        in release.get_as_string('SHA256'))
+
+        # The list view is the same, and is what the table follows from then
+        self.assertEqual(table.to_list(), release['SHA256'])
+        release['SHA256'][row]['size'] = '1'
+        self.assertEqual('1', release.checksum_table('sha256')[row][1])
+
+    def test_checksums_for(self):
+        with open('test_Release', 'rb') as f:
+            release = deb822.Release(f.read())
+        checksums = release.checksums_for('Contents-amd64.bz2')
+        self.assertEqual('113433', checksums['size'])
+        self.assertEqual('b56371ab637642cc4e1e3808fc294c6cbe684b0f',
+                         checksums['sha1'])
+        self.assertEqual(['name', 'sha1', 'sha256', 'sha512', 'size'],
+                         sorted(checksums))
+        self.assertRaises(KeyError, release.checksums_for, 'missing')
+        # Fields that have been split follow their changes
+        release['SHA1'][0]['sha1'] = 'deadbeef'
+        self.assertEqual('deadbeef',
+                         release.checksums_for('Contents-amd64.bz2')['sha1'])
+
+        with open('test_Changes', 'rb') as f:
+            changes = deb822.Changes(f)
+        name = changes['Files'][0]['name']
+        checksums = changes.checksums_for(name)
+        self.assertEqual(changes['Files'][0]['md5sum'], checksums['md5sum'])
+        self.assertEqual(changes['Files'][0]['section'], checksums['section'])
+        self.assertTrue('sha256' in checksums)
+
     def test_changes_binary_mode(self):
         """Trivial parse test for a signed file in binary mode"""
         with io.open('test_Changes', 'rb') as f:
@@ -987,6 +1517,142 @@ Description: python modules to work with Debian-related data formats
                                   'sparc']))
 
 
+class TestParagraphIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.packages = os.path.join(self.tmpdir, 'Packages')
+        self.sources = os.path.join(self.tmpdir, 'Sources')
+        for src, dest in (('test_Packages', self.packages),
+                          ('test_Sources', self.sources)):
+            with open(src, 'rb') as fin, open(dest, 'wb') as fout:
+                fout.write(fin.read())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_lookup_packages(self):
+        with open_utf8('test_Packages') as f:
+            expected = [p for p in deb822.Packages.iter_paragraphs(f)
+                        if p['Package'] == 'zssh']
+        found = deb822.Packages.lookup(self.packages, 'zssh')
+        self.assertEqual(expected, found)
+        self.assertTrue(isinstance(found[0], deb822.Packages))
+        self.assertTrue(os.path.exists(self.packages + '.idx'))
+
+        self.assertEqual([], deb822.Packages.lookup(self.packages, 'zssh',
+                                                    version='0.1'))
+        self.assertEqual(1, len(deb822.Packages.lookup(
+            self.packages, 'zssh', '1.5c.debian.1-3', 'i386')))
+        self.assertEqual([], deb822.Packages.lookup(self.packages, 'nothere'))
+
+    def test_lookup_sources(self):
+        found = deb822.Sources.lookup(self.sources, 'python-debian')
+        self.assertEqual(1, len(found))
+        self.assertEqual('0.1.14', found[0]['Version'])
+        self.assertEqual('python-debian_0.1.14.dsc',
+                         found[0]['Files'][0]['name'])
+
+    def test_saved_index(self):
+        index = deb822.ParagraphIndex.build(self.packages)
+        index.save()
+        self.assertEqual(['Packages', 'Packages.idx', 'Sources'],
+                         sorted(os.listdir(self.tmpdir)))
+        loaded = deb822.ParagraphIndex.load(self.packages)
+        self.assertEqual(index.entries, loaded.entries)
+        self.assertEqual(index.digest, loaded.digest)
+
+        # Touching the file doesn't invalidate the index...
+        st = os.stat(self.packages)
+        os.utime(self.packages, (st.st_atime, st.st_mtime + 10))
+        self.assertTrue(deb822.ParagraphIndex.load(self.packages) is not None)
+
+        # ...but changing its contents does, even if the size is unchanged.
+        with open(self.packages, 'r+b') as f:
+            f.write(b'X')
+        os.utime(self.packages, (st.st_atime, st.st_mtime + 20))
+        self.assertTrue(deb822.ParagraphIndex.load(self.packages) is None)
+
+    def test_index_refreshed(self):
+        self.assertEqual(1, len(deb822.Packages.lookup(self.packages, 'a2ps')))
+        with open(self.packages, 'ab') as f:
+            f.write(b'\nPackage: extra\nVersion: 1\nArchitecture: all\n')
+        found = deb822.Packages.lookup(self.packages, 'extra')
+        self.assertEqual(1, len(found))
+        self.assertEqual('all', found[0]['Architecture'])
+
+
+class TestChecksumVerifier(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, data):
+        with open(os.path.join(self.tmpdir, name), 'wb') as f:
+            f.write(data)
+        return '%s %d %s' % (hashlib.md5(data).hexdigest(), len(data), name)
+
+    def test_verify(self):
+        data = b'x' * 100000
+        ok = self.write('ok.tar.gz', data)
+        self.write('short.diff.gz', b'short')
+        bad = self.write('bad.dsc', b'contents')
+        sha256 = lambda d: hashlib.sha256(d).hexdigest()
+        dsc = deb822.Dsc('\n'.join([
+            'Source: foo',
+            'Files:',
+            ' ' + ok,
+            ' %s 6 short.diff.gz' % hashlib.md5(b'short').hexdigest(),
+            ' ' + bad,
+            ' %s 4 missing.tar.xz' % hashlib.md5(b'miss').hexdigest(),
+            'Checksums-Sha256:',
+            ' %s %d ok.tar.gz' % (sha256(data), len(data)),
+            ' %s 8 bad.dsc' % sha256(b'other!!!'),
+        ]))
+        verifier = deb822.ChecksumVerifier(workers=2, buffer_size=4096)
+        results = verifier.verify(dsc, self.tmpdir)
+        self.assertEqual(
+            [('ok.tar.gz', 'ok', 100000, ()),
+             ('short.diff.gz', 'size', 5, ()),
+             ('bad.dsc', 'checksum', 8, ('sha256',)),
+             ('missing.tar.xz', 'missing', None, ())],
+            [(r.name, r.status, r.size, r.mismatched) for r in results])
+        self.assertEqual(os.path.join(self.tmpdir, 'ok.tar.gz'),
+                         results[0].path)
+
+        path = os.path.join(self.tmpdir, 'ok.tar.gz')
+        self.assertEqual('ok', verifier.check_file(path, {
+            'size': '100000', 'sha1': hashlib.sha1(data).hexdigest(),
+            'sha512': hashlib.sha512(data).hexdigest()}).status)
+        self.assertEqual(('md5sum',), verifier.check_file(
+            path, {'md5sum': '0' * 32}).mismatched)
+
+    def test_verify_unreadable(self):
+        os.mkdir(os.path.join(self.tmpdir, 'dir.tar.gz'))
+        unreadable = self.write('unreadable.dsc', b'contents')
+        os.chmod(os.path.join(self.tmpdir, 'unreadable.dsc'), 0)
+        dsc = deb822.Dsc('\n'.join([
+            'Source: foo',
+            'Files:',
+            ' %s 4 dir.tar.gz' % hashlib.md5(b'dir!').hexdigest(),
+            ' ' + unreadable,
+        ]))
+        verifier = deb822.ChecksumVerifier()
+        results = verifier.verify(dsc, self.tmpdir)
+        self.assertEqual(('dir.tar.gz', 'error', None, ()),
+                         (results[0].name, results[0].status,
+                          results[0].size, results[0].mismatched))
+        self.assertTrue('Is a directory' in results[0].error)
+        if os.geteuid() != 0:
+            self.assertEqual('error', results[1].status)
+            self.assertTrue('Permission denied' in results[1].error)
+        self.assertEqual(None, verifier.check_file(
+            os.path.join(self.tmpdir, 'missing'), {}).error)
+
+
 class TestPkgRelations(unittest.TestCase):
     # TODO(jsw): Stop overriding this for Python versions that actually include
     # assertWarns.  Unfortunately, that's not possible right now because for
@@ -1123,6 +1789,29 @@ class TestPkgRelations(unittest.TestCase):
         self.assertWarns(UserWarning, deb822.PkgRelation.parse_relations,
                     "foo bar")
 
+    def test_relations_lazy(self):
+        with open_utf8('test_Packages') as f:
+            pkg = next(deb822.Packages.iter_paragraphs(f))
+        deb822.PkgRelation.cache_clear()
+        self.assertEqual(
+            deb822.PkgRelation.parse_relations(pkg['Depends']), pkg.depends)
+        self.assertTrue(pkg.relations['Depends'] is pkg.depends)
+        self.assertTrue(pkg.relations['depends'] is pkg.depends)
+        # Only Depends was parsed
+        self.assertEqual(1, deb822.PkgRelation.cache_info().currsize)
+
+        self.assertEqual([], pkg.enhances)
+        self.assertEqual([], pkg.pre_depends)
+        self.assertEqual(
+            sorted(['depends', 'pre-depends', 'recommends', 'suggests',
+                    'breaks', 'conflicts', 'provides', 'replaces',
+                    'enhances']), sorted(pkg.relations))
+
+        with open_utf8('test_Sources') as f:
+            src = next(deb822.Sources.iter_paragraphs(f))
+        self.assertEqual(src.relations['build-depends'], src.build_depends)
+        self.assertEqual([], src.build_depends_indep)
+
     def test_sources(self):
         # make the syntax a bit more compact
         rel = TestPkgRelations.rel
@@ -1210,9 +1899,92 @@ class TestPkgRelations(unittest.TestCase):
         self.assertEqual(term.profile, 'cross')
         self.assertEqual(term[1], 'cross')
 
+    def test_parse_relations_cache(self):
+        r = "foo (>= 1.0) [amd64 !i386] <!stage1>, bar | baz"
+        deb822.PkgRelation.cache_clear()
+        first = deb822.PkgRelation.parse_relations(r)
+        info = deb822.PkgRelation.cache_info()
+        self.assertEqual((0, 1, 1), (info.hits, info.misses, info.currsize))
+
+        # Cached results are equal, but not shared
+        first[0][0]['name'] = 'modified'
+        first[0][0]['arch'].append(None)
+        second = deb822.PkgRelation.parse_relations(r)
+        self.assertEqual('foo', second[0][0]['name'])
+        self.assertEqual([(True, 'amd64'), (False, 'i386')],
+                         second[0][0]['arch'])
+        self.assertEqual(1, deb822.PkgRelation.cache_info().hits)
+        self.assertEqual(
+            r, deb822.PkgRelation.str(deb822.PkgRelation.parse_relations(r)))
+
+        # Unparsable relationships warn every time
+        for i in range(2):
+            self.assertWarns(UserWarning, deb822.PkgRelation.parse_relations,
+                             "foo (>= 1.0")
 
-@unittest.skipUnless(os.path.exists('/usr/bin/gpgv'), "gpgv not installed")
-class TestGpgInfo(unittest.TestCase):
+        try:
+            deb822.PkgRelation.set_cache_size(2)
+            for name in ('a1', 'a2', 'a3'):
+                deb822.PkgRelation.parse_relations(name)
+            self.assertEqual(2, deb822.PkgRelation.cache_info().currsize)
+            deb822.PkgRelation.set_cache_size(0)
+            self.assertEqual(0, deb822.PkgRelation.cache_info().currsize)
+            deb822.PkgRelation.parse_relations(r)
+            self.assertEqual(0, deb822.PkgRelation.cache_info().currsize)
+        finally:
+            deb822.PkgRelation.set_cache_size(8192)
+
+    def test_parse_relations_compact(self):
+        r = ("foo:any (>= 1.0) [amd64 !i386] <!stage1> <cross>, bar | baz, "
+             "foo:any (>= 1.0) [amd64 !i386] <!stage1> <cross>")
+        rels = deb822.PkgRelation.parse_relations_compact(r)
+        self.assertEqual(
+            deb822.PkgRelation.parse_relations(r),
+            [[rel.as_dict() for rel in or_deps] for or_deps in rels])
+        self.assertTrue(rels is deb822.PkgRelation.parse_relations_compact(r))
+
+        foo = rels[0][0]
+        self.assertTrue(foo is rels[2][0])
+        self.assertEqual(1, len(set([foo, rels[2][0]])))
+        self.assertEqual('foo', foo.name)
+        self.assertEqual('foo', foo['name'])
+        self.assertEqual('any', foo.get('archqual'))
+        self.assertEqual(('>=', '1.0'), foo['version'])
+        self.assertEqual((True, 'amd64'), foo['arch'][0])
+        self.assertEqual(((False, 'stage1'),), foo.restrictions[0])
+        self.assertEqual(None, rels[1][1]['version'])
+        self.assertRaises(KeyError, foo.__getitem__, 'count')
+        self.assertEqual(None, foo.get('nothing'))
+        self.assertEqual(['name', 'archqual', 'version', 'arch',
+                          'restrictions'], foo.keys())
+        self.assertEqual(
+            "bar | baz", deb822.PkgRelation.str(rels[1:2]))
+
+    def test_relation_as_mapping(self):
+        r = "foo:any (>= 1.0) [amd64 !i386] <!stage1> <cross>, bar"
+        dicts = deb822.PkgRelation.parse_relations(r)
+        rels = deb822.PkgRelation.parse_relations_compact(r)
+        foo = rels[0][0]
+        self.assertTrue('version' in foo)
+        self.assertFalse('count' in foo)
+        self.assertEqual(sorted(dicts[0][0]), sorted(foo))
+        self.assertEqual(len(dicts[0][0]), len(foo))
+        self.assertEqual(dicts[0][0], foo)
+        self.assertEqual(foo, dicts[0][0])
+        self.assertEqual(dicts, [list(or_deps) for or_deps in rels])
+        self.assertNotEqual(dicts[1][0], foo)
+
+        # The namedtuple methods still work on the values
+        bar = foo._replace(name='bar', archqual=None, version=None,
+                           arch=None, restrictions=None)
+        self.assertEqual(rels[1][0], bar)
+        self.assertEqual(hash(rels[1][0]), hash(bar))
+        self.assertEqual(['bar', None, None, None, None], bar.values())
+        self.assertEqual(foo.items(), list(foo._asdict().items()))
+        self.assertRaises(ValueError, foo._replace, count=1)
+
+
+class _GpgTestMixin(object):
 
     def setUp(self):
         self.data = SIGNED_CHECKSUM_CHANGES_FILE % CHECKSUM_CHANGES_FILE
@@ -1238,6 +2010,10 @@ class TestGpgInfo(unittest.TestCase):
         self.assertEqual(gpg_info['VALIDSIG'], self.valid['VALIDSIG'])
         self.assertEqual(gpg_info['SIG_ID'][1:], self.valid['SIG_ID'][1:])
 
+
+@unittest.skipUnless(os.path.exists('/usr/bin/gpgv'), "gpgv not installed")
+class TestGpgInfo(_GpgTestMixin, unittest.TestCase):
+
     def test_from_sequence_string(self):
         gpg_info = deb822.GpgInfo.from_sequence(self.data, keyrings=[KEYRING])
         self._validate_gpg_info(gpg_info)
@@ -1266,6 +2042,72 @@ class TestGpgInfo(unittest.TestCase):
         self._validate_gpg_info(gpg_info)
 
 
+@unittest.skipUnless(os.path.exists('/usr/bin/gpgv'), "gpgv not installed")
+class TestGpgVerifier(_GpgTestMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(TestGpgVerifier, self).setUp()
+        self.verifier = deb822.GpgVerifier(keyrings=[KEYRING], workers=2)
+        self.unsigned = CHECKSUM_CHANGES_FILE.encode()
+
+    def test_verify(self):
+        self._validate_gpg_info(self.verifier.verify(self.data))
+        self.assertEqual((0, 1), self.verifier.cache_info()[:2])
+        # The same data, given in other forms, is found in the cache
+        self._validate_gpg_info(self.verifier.verify(BytesIO(self.data)))
+        changes = deb822.Changes(self.data)
+        self._validate_gpg_info(changes.get_gpg_info(verifier=self.verifier))
+        self.assertEqual((2, 1), self.verifier.cache_info()[:2])
+        self.assertFalse(self.verifier.verify(self.unsigned).valid())
+
+        self.verifier.cache_clear()
+        self.assertEqual((0, 0, 4096, 0), self.verifier.cache_info())
+
+    def test_verify_many(self):
+        results = self.verifier.verify_many(
+            [self.data, self.unsigned, BytesIO(self.data), self.data])
+        self.assertEqual(4, len(results))
+        for i in (0, 2, 3):
+            self._validate_gpg_info(results[i])
+        self.assertFalse(results[1].valid())
+        # gpgv only ran once for each distinct input
+        self.assertEqual(2, self.verifier.cache_info().currsize)
+        results = self.verifier.verify_many([self.unsigned, self.data])
+        self._validate_gpg_info(results[1])
+        self.assertEqual(2, self.verifier.cache_info().hits)
+
+    def test_keyring_change(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            keyring = os.path.join(tmpdir, 'keyring.gpg')
+            shutil.copy(KEYRING, keyring)
+            verifier = deb822.GpgVerifier(keyrings=[keyring])
+            self._validate_gpg_info(verifier.verify(self.data))
+            open(keyring, 'wb').close()
+            os.utime(keyring, (0, 0))
+            self.assertFalse(verifier.verify(self.data).valid())
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_cache_file(self):
+        fd, filename = tempfile.mkstemp()
+        os.close(fd)
+        os.remove(filename)
+        try:
+            verifier = deb822.GpgVerifier(keyrings=[KEYRING],
+                                          cache_file=filename)
+            verifier.verify(self.data)
+            verifier.save()
+            # gpgv is not run for the results found in the file
+            verifier = deb822.GpgVerifier(keyrings=[KEYRING],
+                                          executable=['/bin/false'],
+                                          cache_file=filename)
+            self._validate_gpg_info(verifier.verify(self.data))
+            self.assertFalse(verifier.verify(self.unsigned).valid())
+        finally:
+            os.remove(filename)
+
+
 def _no_space(s):
     """Returns s.  Raises ValueError if s contains any whitespace."""
     if re.search(r'\s', s):
@@ -20,7 +20,12 @@
 
 from __future__ import absolute_import
 
+import io
+import os
+import pickle
+import shutil
 import sys
+import tempfile
 import unittest
 
 sys.path.insert(0, '../lib/')
@@ -145,6 +150,13 @@ class VersionTests(unittest.TestCase):
             truth_fn = self._get_truth_fn(cmp_oper)
             self.assertTrue(truth_fn(v1, v2) == True,
                             "%r %s %r != True" % (v1, cmp_oper, v2))
+        self.assertTrue(truth_fn(version_sort_key(v1_str),
+                                 version_sort_key(v2_str)),
+                        "sort keys of %r %s %r" % (v1_str, cmp_oper, v2_str))
+        result = compare_versions([v1_str], [v2_str])[0]
+        self.assertTrue(truth_fn(result, 0),
+                        "compare_versions(%r, %r) == %d"
+                        % (v1_str, v2_str, result))
 
     def test_comparisons(self):
         """Test comparison against all combinations of Version classes"""
@@ -170,6 +182,169 @@ class VersionTests(unittest.TestCase):
         self._test_comparison('1.5~rc1', '<', '1.5+b1')
         self._test_comparison('1.5~rc1', '<', '1.5~rc2')
         self._test_comparison('1.5~rc1', '>', '1.5~dev0')
+        self._test_comparison('1.0', '==', '1.0-0')
+        self._test_comparison('1.0', '==', '0:1.00')
+        self._test_comparison('1.0', '<', '1.0.0')
+        self._test_comparison('1.0~', '<', '1.0')
+        self._test_comparison('1.0~~', '<', '1.0~')
+        self._test_comparison('1.0~~a', '<', '1.0~')
+        self._test_comparison('1.0a', '<', '1.0+')
+        self._test_comparison('1.0-1~bpo1', '<', '1.0-1')
+        self._test_comparison('1.0-1', '<', '1.0-1+b1')
+        self._test_comparison('2:0.1', '>', '1:99')
+
+    def test_sort_key(self):
+        versions = ['1.0-1', '1:0.1', '1.0~rc1-1', '1.0-1+b1', '0.9', '1.0',
+                    '1.0-0.1', '1.0.1~', '1.0a', '1.0-1~bpo1', '1.0-10']
+        expected = ['0.9', '1.0~rc1-1', '1.0', '1.0-0.1', '1.0-1~bpo1',
+                    '1.0-1', '1.0-1+b1', '1.0-10', '1.0a', '1.0.1~', '1:0.1']
+        self.assertEqual(expected, sorted(versions, key=version_sort_key))
+        for cls in self.test_classes:
+            objects = sorted(cls(v) for v in versions)
+            self.assertEqual(expected, [str(v) for v in objects])
+            self.assertEqual('1:0.1', str(max(objects)))
+            self.assertEqual(version_sort_key('1.0-1'),
+                             cls('1.0-1').sort_key)
+
+            # The key follows changes of the version
+            v = cls('1.0-1')
+            v.debian_revision = '2'
+            self.assertEqual(version_sort_key('1.0-2'), v.sort_key)
+        self.assertRaises(ValueError, version_sort_key, 'a1:1.0')
+        self.assertEqual(-1, version_compare('1.0~', '1.0'))
+        self.assertEqual(0, version_compare('1.0', '1.0-0'))
+        self.assertEqual(1, version_compare('1.0.1', '1.0'))
+
+    def test_batch_comparisons(self):
+        a = ['1.0', '1.0~rc1', '2:1', '1.0-1', '1.10', '1.0a', Version('1.0')]
+        b = ['1.0-0', '1.0', '1:2', '1.0-1+b1', '1.9', '1.0+', '1.0~']
+        self.assertEqual([version_compare(va, vb) for va, vb in zip(a, b)],
+                         list(compare_versions(a, b)))
+        self.assertEqual([], list(compare_versions([], [])))
+        self.assertRaises(ValueError, compare_versions, a, b[1:])
+        self.assertRaises(ValueError, compare_versions, ['1.0'], ['a1:1'])
+
+        versions = ['1.0-1', '1:0.1', '1.0~rc1-1', '1.0', '0.9', '1.0-0',
+                    '1.0a']
+        self.assertEqual([4, 2, 3, 5, 0, 6, 1], argsort_versions(versions))
+        self.assertEqual([], argsort_versions([]))
+
+
+class FrozenVersionTests(unittest.TestCase):
+    """Tests for debian_support.FrozenVersion"""
+
+    def tearDown(self):
+        FrozenVersion.set_cache_size(65536)
+
+    def test_attributes(self):
+        v = FrozenVersion('2:1.0.4~rc2-1')
+        self.assertEqual('2:1.0.4~rc2-1', v.full_version)
+        self.assertEqual('2', v.epoch)
+        self.assertEqual('1.0.4~rc2', v.upstream_version)
+        self.assertEqual('1', v.debian_revision)
+        self.assertEqual('1', v.debian_version)
+        self.assertEqual('2:1.0.4~rc2-1', str(v))
+        self.assertEqual(None, FrozenVersion('1.0').debian_revision)
+        self.assertRaises(AttributeError, setattr, v, 'epoch', '3')
+        self.assertRaises(AttributeError, setattr, v, 'foo', '3')
+        self.assertRaises(ValueError, FrozenVersion, 'a1:1.8.8-070403-1')
+
+    def test_shared(self):
+        v = FrozenVersion('2.36-9')
+        self.assertTrue(FrozenVersion('2.36-9') is v)
+        self.assertTrue(FrozenVersion(Version('2.36-9')) is v)
+        self.assertTrue(FrozenVersion(v) is v)
+        self.assertTrue(pickle.loads(pickle.dumps(v)) is v)
+        FrozenVersion.cache_clear()
+        self.assertFalse(FrozenVersion('2.36-9') is v)
+        self.assertEqual(v, FrozenVersion('2.36-9'))
+        FrozenVersion.set_cache_size(0)
+        self.assertFalse(FrozenVersion('2.36-9') is FrozenVersion('2.36-9'))
+
+    def test_comparisons(self):
+        self.assertTrue(FrozenVersion('1.0~rc1') < FrozenVersion('1.0'))
+        self.assertTrue(FrozenVersion('1.0') == FrozenVersion('1.0-0'))
+        self.assertTrue(FrozenVersion('1.0') != FrozenVersion('1.0-1'))
+        self.assertTrue(FrozenVersion('1:0.1') > '1.0')
+        self.assertTrue(FrozenVersion('1.0') >= Version('1.0'))
+        self.assertTrue(Version('1.0') <= FrozenVersion('1.0'))
+        self.assertTrue(Version('1.0+b1') > FrozenVersion('1.0'))
+        self.assertEqual(['1.0~', '1.0', '1.0-1', '1:0.1'],
+                         [str(v) for v in sorted(
+                             FrozenVersion(v)
+                             for v in ['1:0.1', '1.0-1', '1.0~', '1.0'])])
+        self.assertEqual(version_sort_key('1.0-1'),
+                         FrozenVersion('1.0-1').sort_key)
+        self.assertEqual(hash(FrozenVersion('1.0')), hash(Version('1.0')))
+
+
+class VersionIndexTests(unittest.TestCase):
+    """Tests for debian_support.VersionIndex"""
+
+    def setUp(self):
+        self.index = VersionIndex([
+            ('openssl', '1.1.0f-3'), ('openssl', '1.0.2l-2'),
+            ('openssl', '1.1.0f-3+deb9u1'), ('openssl', '1.1.0g-1'),
+            ('openssl', '1.1.0f-3'), ('libc6', '2.24-11'),
+            ('libc6', '2.24-11+deb9u1'), ('libc6', '2.28~0experimental0'),
+        ])
+
+    def strs(self, versions):
+        return [str(v) for v in versions]
+
+    def test_contents(self):
+        self.assertEqual(7, len(self.index))
+        self.assertEqual(['libc6', 'openssl'], sorted(self.index.names()))
+        self.assertEqual(['1.0.2l-2', '1.1.0f-3', '1.1.0f-3+deb9u1',
+                          '1.1.0g-1'],
+                         self.strs(self.index.versions('openssl')))
+        self.assertEqual([], self.index.versions('missing'))
+        self.assertTrue(('libc6', '2.24-11') in self.index)
+        self.assertTrue(('libc6', FrozenVersion('2.24-11')) in self.index)
+        self.assertFalse(('libc6', '2.24-12') in self.index)
+        self.assertFalse(('missing', '2.24-11') in self.index)
+        self.assertEqual(7, len(list(self.index)))
+
+    def test_queries(self):
+        index = self.index
+        self.assertEqual(['1.0.2l-2', '1.1.0f-3'],
+                         self.strs(index.range('openssl',
+                                               high='1.1.0f-3+deb9u1')))
+        self.assertEqual(['1.1.0f-3', '1.1.0f-3+deb9u1'],
+                         self.strs(index.range('openssl', '1.1.0f-3',
+                                               '1.1.0g-1')))
+        self.assertEqual(['1.1.0f-3+deb9u1', '1.1.0g-1'],
+                         self.strs(index.range('openssl', '1.1.0f-3',
+                                               '1.1.0g-1', False, True)))
+        self.assertEqual(['2.24-11', '2.24-11+deb9u1', '2.28~0experimental0'],
+                         self.strs(index.range('libc6', high='2.28')))
+        self.assertEqual(['2.24-11', '2.24-11+deb9u1'],
+                         self.strs(index.range('libc6', high='2.28~')))
+        self.assertEqual([], index.range('missing', '1.0'))
+        self.assertEqual('2.24-11+deb9u1', str(index.floor('libc6', '2.27')))
+        self.assertEqual('2.24-11', str(index.floor('libc6', '2.24-11')))
+        self.assertEqual(None, index.floor('libc6', '2.24'))
+        self.assertEqual('2.28~0experimental0',
+                         str(index.ceiling('libc6', '2.25')))
+        self.assertEqual('2.24-11', str(index.ceiling('libc6', '2.24-11')))
+        self.assertEqual(None, index.ceiling('libc6', '2.28'))
+        self.assertEqual(None, index.ceiling('missing', '2.28'))
+
+    def test_updates(self):
+        index = self.index
+        index.add('libc6', '2.24-12')
+        index.add('libc6', '2.24-12')
+        index.add('zlib1g', '1:1.2.8.dfsg-5')
+        self.assertEqual(9, len(index))
+        self.assertEqual('2.24-12', str(index.floor('libc6', '2.27')))
+        index.remove('libc6', '2.24-11+deb9u1')
+        self.assertRaises(KeyError, index.remove, 'libc6', '2.24-11+deb9u1')
+        index.discard('libc6', '2.24-11+deb9u1')
+        index.discard('zlib1g', '1:1.2.8.dfsg-5')
+        self.assertEqual(['2.24-11', '2.24-12', '2.28~0experimental0'],
+                         self.strs(index.versions('libc6')))
+        self.assertEqual(['libc6', 'openssl'], sorted(index.names()))
+        self.assertEqual(7, len(index))
 
 
 class ReleaseTests(unittest.TestCase):
@@ -181,6 +356,72 @@ class ReleaseTests(unittest.TestCase):
         self.assertLess(intern_release('lenny'), intern_release('squeeze'))
 
 
+class CompressionTests(unittest.TestCase):
+    """Tests for debian_support.open_compressed and PackageFile"""
+
+    def setUp(self):
+        with open('test_Packages', 'rb') as f:
+            self.data = f.read()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _compressed_files(self):
+        import bz2
+        import gzip
+        import lzma
+        half = len(self.data) // 2
+        for ext, compress in (('gz', gzip.compress), ('bz2', bz2.compress),
+                              ('xz', lzma.compress)):
+            filename = os.path.join(self.tmpdir, 'Packages.' + ext)
+            with open(filename, 'wb') as f:
+                # Two concatenated streams, as produced by e.g. "cat a.gz b.gz"
+                f.write(compress(self.data[:half]))
+                f.write(compress(self.data[half:]))
+            yield ext, filename
+
+    def test_detect_compression(self):
+        self.assertEqual('gz', detect_compression(b'\x1f\x8b\x08\x00'))
+        self.assertEqual('xz', detect_compression(b'\xfd7zXZ\x00\x00'))
+        self.assertEqual(None, detect_compression(b'Package: foo'))
+
+    @unittest.skipIf(sys.version_info < (3, 3), "needs lzma module")
+    def test_open_compressed(self):
+        for ext, filename in self._compressed_files():
+            for threaded in (False, True):
+                with open_compressed(filename, threaded) as f:
+                    self.assertEqual(self.data, f.read(), ext)
+                with open(filename, 'rb') as raw:
+                    with open_compressed(raw, threaded, block_size=100) as f:
+                        self.assertEqual(self.data.splitlines(True), list(f))
+
+    @unittest.skipIf(sys.version_info < (3, 3), "needs lzma module")
+    def test_open_compressed_truncated(self):
+        for ext, filename in self._compressed_files():
+            with open(filename, 'rb') as f:
+                data = f.read()[:-20]
+            for threaded in (False, True):
+                with open_compressed(io.BytesIO(data), threaded) as f:
+                    self.assertRaises(IOError, f.read)
+
+    def test_open_uncompressed(self):
+        with open('test_Packages', 'rb') as raw:
+            self.assertTrue(open_compressed(raw) is raw)
+        with open_compressed('test_Packages') as f:
+            self.assertEqual(self.data, f.read())
+
+    @unittest.skipIf(sys.version_info < (3, 3), "needs lzma module")
+    def test_package_file(self):
+        expected = list(PackageFile('test_Packages'))
+        self.assertEqual(3, len(expected))
+        for ext, filename in self._compressed_files():
+            self.assertEqual(expected, list(PackageFile(filename)))
+            with open(filename, 'rb') as f:
+                self.assertEqual(expected,
+                                 list(PackageFile(filename, f, threaded=True)))
+
+
 class HelperRoutineTests(unittest.TestCase):
     """Tests for various debian_support helper routines"""
 
@@ -0,0 +1,245 @@
+#! /usr/bin/python
+
+# Copyright (C) 2026 Debian python-debian Maintainers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from __future__ import absolute_import
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, '../lib/')
+
+from debian import deb822
+from debian import depgraph
+
+
+PACKAGES = b'''\
+Package: pa
+Version: 1.0
+Architecture: amd64
+Depends: pb (>= 2), pc | pv
+Pre-Depends: libc6
+
+Package: pb
+Version: 2.0
+Architecture: amd64
+Depends: pa
+
+Package: pc
+Version: 1
+Architecture: all
+Provides: pv (= 1.0), pw
+
+Package: pd
+Version: 1
+Architecture: amd64
+Depends: missing, pb [i386], pe <!nocheck>, pw (>= 1) | pc [linux-any]
+
+Package: pe
+Version: 1
+Architecture: amd64
+Depends: pb (<< 2)
+
+Package: pb
+Version: 1.5
+Architecture: i386
+
+Package: libc6
+Version: 2.24-11
+Architecture: amd64
+'''
+
+
+class TestDependencyGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = depgraph.DependencyGraph(
+            deb822.Packages.iter_paragraphs(PACKAGES),
+            architecture='amd64', profiles=['nocheck'])
+
+    def node(self, name):
+        nodes = self.graph.find(name)
+        self.assertEqual(1, len(nodes))
+        return nodes[0]
+
+    def names(self, nodes):
+        return sorted(self.graph.name(n) for n in nodes)
+
+    def test_nodes(self):
+        # The i386 package is left out
+        self.assertEqual(6, len(self.graph))
+        self.assertEqual('2.0', self.graph.version(self.node('pb')))
+        self.assertEqual('all', self.graph.architecture_of(self.node('pc')))
+        self.assertEqual([(self.node('pc'), '1.0')],
+                         self.graph.providers('pv'))
+        self.assertEqual([(self.node('pc'), None)], self.graph.providers('pw'))
+        self.assertEqual([], self.graph.find('pv'))
+
+    def test_clauses(self):
+        pa, pb, pc, libc6 = [self.node(n)
+                             for n in ('pa', 'pb', 'pc', 'libc6')]
+        self.assertEqual([(pb,), (pc,), (libc6,)], self.graph.clauses(pa))
+        self.assertEqual(['libc6', 'pb', 'pc'],
+                         self.names(self.graph.dependencies(pa)))
+        # "missing" can't be satisfied, "pb [i386]", "pe <!nocheck>" don't
+        # apply, and only versioned Provides satisfy versioned dependencies
+        self.assertEqual([(), (pc,)], self.graph.clauses(self.node('pd')))
+        # pb 1.5 is for i386
+        self.assertEqual([()], self.graph.clauses(self.node('pe')))
+        self.assertEqual([], self.graph.clauses(pc))
+
+    def test_no_filtering(self):
+        graph = depgraph.DependencyGraph(
+            deb822.Packages.iter_paragraphs(PACKAGES))
+        self.assertEqual(7, len(graph))
+        pd = graph.find('pd')[0]
+        self.assertEqual(['pb', 'pb', 'pc', 'pe'],
+                         sorted(graph.name(n) for n in graph.dependencies(pd)))
+        pe = graph.find('pe')[0]
+        self.assertEqual([(graph.find('pb')[1],)], graph.clauses(pe))
+
+    def test_reverse_dependencies(self):
+        self.assertEqual(['pa', 'pd'], self.names(
+            self.graph.reverse_dependencies(self.node('pc'))))
+        self.assertEqual(['pa'], self.names(
+            self.graph.reverse_dependencies(self.node('pb'))))
+        self.assertEqual([], self.graph.reverse_dependencies(self.node('pd')))
+
+    def test_closure(self):
+        self.assertEqual(['pc', 'pd'], self.names(
+            self.graph.closure([self.node('pd')])))
+        self.assertEqual(['libc6', 'pa', 'pb'], self.names(
+            self.graph.closure([self.node('libc6')], reverse=True)))
+
+    def test_strongly_connected_components(self):
+        components = self.graph.strongly_connected_components()
+        self.assertEqual(
+            sorted([['pa', 'pb'], ['pc'], ['pd'], ['pe'], ['libc6']]),
+            sorted(self.names(c) for c in components))
+        # Dependencies come first
+        position = {}
+        for i, component in enumerate(components):
+            for node in component:
+                position[node] = i
+        for node in range(len(self.graph)):
+            for target in self.graph.dependencies(node):
+                self.assertTrue(position[target] <= position[node])
+
+    def test_from_file(self):
+        fd, filename = tempfile.mkstemp()
+        try:
+            os.write(fd, PACKAGES)
+            os.close(fd)
+            graph = depgraph.DependencyGraph.from_file(
+                filename, architecture='amd64', profiles=['nocheck'])
+        finally:
+            os.remove(filename)
+        for node in range(len(graph)):
+            self.assertEqual(self.graph.clauses(node), graph.clauses(node))
+
+    def test_relation_applies(self):
+        rels = deb822.PkgRelation.parse_relations_compact(
+            'pa [linux-any], pb [!any-i386], pc <stage1 !cross> <nocheck>')
+        applies = lambda rel, *args: depgraph.relation_applies(rel, *args)
+        self.assertTrue(applies(rels[0][0], 'amd64'))
+        self.assertFalse(applies(rels[0][0], 'kfreebsd-amd64'))
+        self.assertTrue(applies(rels[1][0], 'kfreebsd-amd64'))
+        self.assertFalse(applies(rels[1][0], 'hurd-i386'))
+        self.assertTrue(applies(rels[2][0], None, ['stage1']))
+        self.assertFalse(applies(rels[2][0], None, ['stage1', 'cross']))
+        self.assertTrue(applies(rels[2][0], None, ['cross', 'nocheck']))
+        self.assertFalse(applies(rels[2][0], None, []))
+        self.assertTrue(applies(rels[2][0]))
+
+
+class TestInstallabilityChecker(unittest.TestCase):
+
+    def setUp(self):
+        self.checker = depgraph.InstallabilityChecker(
+            deb822.Packages.iter_paragraphs(PACKAGES + b'''
+Package: pf
+Version: 1
+Architecture: all
+Depends: pe | pd
+'''), architecture='amd64', profiles=['nocheck'])
+
+    def names(self, nodes):
+        return sorted(self.checker.name(n) for n in nodes)
+
+    def test_candidates(self):
+        self.assertEqual(7, len(self.checker))
+        self.assertEqual(['pb'], self.names(self.checker.candidates('pb')))
+        self.assertEqual(['pb'],
+                         self.names(self.checker.candidates('pb (>= 2)')))
+        self.assertEqual([], self.checker.candidates('pb (<< 2)'))
+        self.assertEqual(['pc'],
+                         self.names(self.checker.candidates('pv (>= 1.0)')))
+        # Unversioned Provides don't satisfy versioned relations
+        self.assertEqual(['pc'], self.names(self.checker.candidates('pw')))
+        self.assertEqual([], self.checker.candidates('pw (>= 1)'))
+        self.assertEqual([], self.checker.candidates('missing'))
+        rel = deb822.PkgRelation.parse_relations('libc6 (>> 2.24)')[0][0]
+        self.assertEqual(['libc6'], self.names(self.checker.candidates(rel)))
+
+    def test_sorted_versions(self):
+        checker = depgraph.InstallabilityChecker(
+            deb822.Packages.iter_paragraphs(PACKAGES))
+        candidates = lambda rel: [checker.version(n)
+                                  for n in checker.candidates(rel)]
+        self.assertEqual(['1.5', '2.0'], candidates('pb'))
+        self.assertEqual(['1.5'], candidates('pb (<< 2)'))
+        self.assertEqual(['1.5'], candidates('pb (= 1.5)'))
+        self.assertEqual(['1.5', '2.0'], candidates('pb (<= 2.0)'))
+        self.assertEqual(['2.0'], candidates('pb (>> 1.5)'))
+        self.assertEqual(['1.5', '2.0'], candidates('pb (>= 1.5~)'))
+        self.assertEqual([], candidates('pb (>= 2.0+b1)'))
+
+    def test_satisfiable(self):
+        self.assertTrue(self.checker.satisfiable('pa, pv (= 1.0) | missing'))
+        self.assertFalse(self.checker.satisfiable('missing | pb (>> 2.0)'))
+        # Relations that don't apply are satisfied
+        self.assertTrue(self.checker.satisfiable('missing [i386]'))
+        self.assertTrue(self.checker.satisfiable('missing <!nocheck>'))
+        unsatisfied = self.checker.unsatisfied(
+            'pa, missing [i386], missing2 (>= 1) | pb (<< 1)')
+        self.assertEqual('missing2 (>= 1) | pb (<< 1)',
+                         deb822.PkgRelation.str(unsatisfied))
+        clauses = deb822.PkgRelation.parse_relations('pa | missing, pw (>> 0)')
+        self.assertTrue(self.checker.clause_satisfiable(clauses[0]))
+        self.assertFalse(self.checker.clause_satisfiable(clauses[1]))
+
+    def test_broken(self):
+        broken = self.checker.broken()
+        self.assertEqual(['pd', 'pe', 'pf'], [b.name for b in broken])
+        self.assertEqual('missing',
+                         deb822.PkgRelation.str(broken[0].unsatisfied))
+        self.assertEqual('pb (<< 2)',
+                         deb822.PkgRelation.str(broken[1].unsatisfied))
+        # pf needs either pe or pd, which are both broken
+        self.assertEqual('pe | pd',
+                         deb822.PkgRelation.str(broken[2].unsatisfied))
+        self.assertEqual(('pf', '1'), (self.checker.name(broken[2].node),
+                                       broken[2].version))
+
+        broken = self.checker.broken(recursive=False)
+        self.assertEqual(['pd', 'pe'], [b.name for b in broken])
+
+
+if __name__ == "__main__":
+    unittest.main()